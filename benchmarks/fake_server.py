@@ -0,0 +1,249 @@
+"""OpenAI・gTTS・MyMemoryの代わりに応答するローカルHTTPサーバー（ベンチマーク用）
+
+サービスごとにレイテンシ（平均±ジッター）とレートリミット（超過時は429）を設定できる。
+応答内容は決定的（画像のハッシュから語彙を選ぶ）なので、同じ入力なら同じデッキになる。
+"""
+import io
+import os
+import json
+import time
+import wave
+import base64
+import random
+import hashlib
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+# 合成動画・画像表・フェイクOCR応答で共通に使う語彙 (タイ語, Paiboon, 日本語の意味, 英語)
+VOCAB = [
+    ("ขอบคุณ", "khòp khun", "ありがとう", "thank you"),
+    ("ขอโทษ", "khǎw thôot", "ごめんなさい", "sorry"),
+    ("ไม่เป็นไร", "mây pen ray", "大丈夫", "never mind"),
+    ("สวัสดี", "sà-wàt-dii", "こんにちは", "hello"),
+    ("ชื่ออะไร", "chûʉ aray", "名前は何ですか", "what is your name"),
+    ("อร่อย", "à-rɔ̀y", "おいしい", "delicious"),
+    ("เท่าไร", "thâw-rày", "いくら", "how much"),
+    ("ห้องน้ำ", "hɔ̂ŋ náam", "トイレ", "toilet"),
+    ("น้ำ", "náam", "水", "water"),
+    ("ข้าว", "khâaw", "ご飯", "rice"),
+    ("ร้อน", "rɔ́ɔn", "暑い", "hot"),
+    ("หนาว", "nǎaw", "寒い", "cold"),
+    ("ไป", "pay", "行く", "go"),
+    ("มา", "maa", "来る", "come"),
+    ("กิน", "kin", "食べる", "eat"),
+    ("ดื่ม", "dʉ̀ʉm", "飲む", "drink"),
+    ("พูด", "phûut", "話す", "speak"),
+    ("เข้าใจ", "khâw cay", "理解する", "understand"),
+    ("ช้า ๆ", "cháa cháa", "ゆっくり", "slowly"),
+    ("เรื่อย ๆ", "rʉ̂ay rʉ̂ay", "まあまあ", "so-so"),
+]
+
+def _silent_wav(seconds: float = 0.3, rate: int = 8000) -> bytes:
+    """TTS応答用の無音WAV"""
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(b"\x00\x00" * int(seconds * rate))
+    return buf.getvalue()
+
+class ServiceProfile:
+    """1サービス分のレイテンシとレートリミット（トークンバケット）"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, rate: float = 0.0, burst: int = 1):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def delay(self) -> None:
+        wait = self.latency + random.uniform(-self.jitter, self.jitter)
+        if wait > 0:
+            time.sleep(wait)
+
+class FakeApiServer:
+    """フェイクAPIサーバー（別スレッドで起動し、サービスごとのリクエスト数を集計する）"""
+
+    def __init__(self, profiles: Optional[Dict[str, ServiceProfile]] = None,
+                 host: str = "127.0.0.1", port: int = 0, rows_per_table: int = 8):
+        self.profiles = {"openai": ServiceProfile(), "tts": ServiceProfile(), "translate": ServiceProfile()}
+        self.profiles.update(profiles or {})
+        self.rows_per_table = rows_per_table
+        self.stats: Dict[str, int] = {}
+        self._stats_lock = threading.Lock()
+        self._audio = _silent_wav()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, key: str) -> None:
+        with self._stats_lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def reset_stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            stats, self.stats = self.stats, {}
+        return stats
+
+    def start(self) -> "FakeApiServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-api", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "FakeApiServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    # --- 応答の生成 ---
+
+    def _chat_completion(self, body: Dict) -> Tuple[int, Dict]:
+        messages = body.get("messages", [])
+        prompt_chars = len(json.dumps(messages, ensure_ascii=False))
+        image = None
+        text = ""
+        for m in messages:
+            if isinstance(m.get("content"), list):
+                for part in m["content"]:
+                    if part.get("type") == "image_url":
+                        image = part["image_url"]["url"]
+                    elif part.get("type") == "text":
+                        text += part.get("text", "")
+        message: Dict = {"role": "assistant", "content": None}
+        if body.get("tools"):
+            # Paiboon修正: 入力をそのまま返す
+            self.count("openai_correct")
+            args = messages[-1]["content"] if messages else "{}"
+            message["tool_calls"] = [{
+                "id": "call_fake", "type": "function",
+                "function": {"name": body["tools"][0]["function"]["name"], "arguments": args},
+            }]
+        elif image is not None:
+            self.count("openai_vision")
+            digest = int(hashlib.sha1(image.encode("ascii")).hexdigest(), 16)
+            # 画像表のプロンプト（english列を要求する）には複数行、動画フレームには1行を返す
+            n = self.rows_per_table if '"english"' in text else 1
+            rows = [VOCAB[(digest + i) % len(VOCAB)] for i in range(n)]
+            message["content"] = "```json\n" + json.dumps(
+                [{"thai": t, "paiboon": p, "meaning": m, "english": e} for t, p, m, e in rows],
+                ensure_ascii=False
+            ) + "\n```"
+        else:
+            self.count("openai_text")
+            message["content"] = "[]"
+        completion = len(json.dumps(message, ensure_ascii=False))
+        return 200, {
+            "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "message": message,
+                         "finish_reason": "tool_calls" if body.get("tools") else "stop"}],
+            "usage": {"prompt_tokens": prompt_chars // 4, "completion_tokens": completion // 4,
+                      "total_tokens": (prompt_chars + completion) // 4},
+        }
+
+    def _translate(self, query: Dict[str, list]) -> Tuple[int, Dict]:
+        self.count("translate")
+        text = (query.get("q") or [""])[0]
+        english = next((e for _, _, m, e in VOCAB if m == text), f"en:{text}")
+        return 200, {"responseData": {"translatedText": english, "match": 1}, "responseStatus": 200,
+                     "matches": [{"translation": english, "match": 1}]}
+
+    def _tts(self) -> bytes:
+        """gTTSのbatchexecute応答形式で音声を返す"""
+        self.count("tts")
+        audio = base64.b64encode(self._audio).decode("ascii")
+        return (')]}\'\n\n[["wrb.fr","jQ1olc","[\\"' + audio + '\\"]",null,null,null,"generic"]]\n').encode("utf-8")
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _service(self) -> str:
+                if self.path.startswith("/v1/"):
+                    return "openai"
+                if "batchexecute" in self.path:
+                    return "tts"
+                return "translate"
+
+            def _send(self, status: int, payload, content_type: str = "application/json") -> None:
+                data = payload if isinstance(payload, bytes) else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _limited(self, service: str) -> bool:
+                profile = server.profiles[service]
+                if not profile.allow():
+                    server.count(f"{service}_429")
+                    self._send(429, {"error": {"message": "rate limited", "type": "rate_limit"}})
+                    return True
+                profile.delay()
+                return False
+
+            def do_GET(self):
+                service = self._service()
+                if self._limited(service):
+                    return
+                query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+                self._send(*server._translate(query))
+
+            def do_POST(self):
+                service = self._service()
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                if self._limited(service):
+                    return
+                if service == "openai":
+                    self._send(*server._chat_completion(json.loads(raw or b"{}")))
+                else:
+                    self._send(200, server._tts(), "application/json; charset=utf-8")
+
+        return Handler
+
+def patch_clients(server_url: str) -> None:
+    """gTTS・MyMemoryの接続先をフェイクサーバーに向ける（ベンチマーク対象プロセス内で呼ぶ）"""
+    os.environ["OPENAI_BASE_URL"] = f"{server_url}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "sk-fake-benchmark")
+    try:
+        from deep_translator import constants
+        constants.BASE_URLS["MYMEMORY"] = f"{server_url}/get"
+    except ImportError:
+        pass
+    try:
+        import gtts.tts
+        gtts.tts._translate_url = lambda tld="com", path="": f"{server_url}/{path}"
+    except ImportError:
+        pass
@@ -0,0 +1,301 @@
+"""オフラインベンチマークの実行・結果保存・前回結果との比較
+
+    python -m benchmarks.run                       # 全ベンチマークを実行して benchmarks/results/ に保存
+    python -m benchmarks.run --only extract,dedupe --cards 40
+    python -m benchmarks.run --only startup           # CLIの起動時間と起動時に読み込まれる重い依存
+    python -m benchmarks.run --latency openai=0.8,tts=0.2 --rate openai=5 --compare benchmarks/results/baseline.json
+
+各ベンチマークは別プロセス（作業ディレクトリは一時ディレクトリ）で実行するため、
+ピークRSSはベンチマークごとに測られ、リポジトリの data/ も汚さない。
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import datetime
+import resource
+import tempfile
+import subprocess
+import multiprocessing
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .fake_server import FakeApiServer, ServiceProfile, patch_clients
+from . import synthetic
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = REPO_ROOT / "benchmarks" / "results"
+
+# 入力の規模を表す値（比較時に悪化判定しない）
+INPUT_KEYS = {"frames", "notes", "tables", "cards"}
+
+# 起動時に読み込まれていないことを確認する重い依存
+HEAVY_MODULES = ("yt_dlp", "moviepy", "cv2", "skimage", "openai", "deep_translator", "gtts", "genanki", "PIL", "numpy")
+
+# --- 各ベンチマーク（子プロセス内で実行され、計測値の辞書を返す） ---
+
+def bench_extract(work: Path, args: Dict[str, Any]) -> Dict[str, Any]:
+    """動画からのフレーム読み出し速度"""
+    from src.common.frames import FrameScanner
+    scanner = FrameScanner(work)
+    t0 = time.perf_counter()
+    frames = sum(1 for _ in scanner.iter_frames(Path(args["video"]), args["frame_interval"]))
+    elapsed = time.perf_counter() - t0
+    return {"frames": frames, "seconds": elapsed, "frames_per_sec": frames / elapsed if elapsed else 0.0}
+
+def bench_dedupe(work: Path, args: Dict[str, Any]) -> Dict[str, Any]:
+    """SSIM重複排除のスループット（読み出しを含まない）"""
+    from src.common.frames import FrameScanner
+    scanner = FrameScanner(work, ssim_threshold=args["ssim_threshold"])
+    frames = list(scanner.iter_frames(Path(args["video"]), args["frame_interval"]))
+    t0 = time.perf_counter()
+    unique = sum(1 for item in frames if scanner.dedupe(item) is not None)
+    elapsed = time.perf_counter() - t0
+    return {"frames": len(frames), "unique_frames": unique, "cards": args["cards"], "seconds": elapsed,
+            "frames_per_sec": len(frames) / elapsed if elapsed else 0.0}
+
+def bench_youtube_build(work: Path, args: Dict[str, Any]) -> Dict[str, Any]:
+    """動画1本のエンドツーエンドのデッキ生成（フェイクAPI経由）"""
+    from src.deck_builders.youtube import YouTubeDeckBuilder
+    builder = YouTubeDeckBuilder(output_dir=str(work / "decks"), deck_name="bench youtube",
+                                 ssim_threshold=args["ssim_threshold"])
+    t0 = time.perf_counter()
+    try:
+        output = builder.build(Path(args["video"]), args["frame_interval"])
+    finally:
+        builder.cleanup()
+    elapsed = time.perf_counter() - t0
+    return {"seconds": elapsed, "apkg_bytes": output.stat().st_size if output else 0}
+
+def bench_image_table(work: Path, args: Dict[str, Any]) -> Dict[str, Any]:
+    """画像表フォルダからのデッキ生成（フェイクAPI経由、音声生成あり）"""
+    from src.deck_builders.image_table import process_image_table, deck_output_path
+    t0 = time.perf_counter()
+    process_image_table(Path(args["tables"]), "bench tables", generate_media=True)
+    elapsed = time.perf_counter() - t0
+    output = deck_output_path("bench tables")
+    return {"tables": args["n_tables"], "seconds": elapsed,
+            "apkg_bytes": output.stat().st_size if output.exists() else 0}
+
+def bench_apkg_write(work: Path, args: Dict[str, Any]) -> Dict[str, Any]:
+    """ノート数N・音声N件のapkg書き出し時間"""
+    from genanki import Deck, Note
+    from src.common.apkg import write_apkg, thai_vocab_model, stable_deck_id, note_guid
+    notes, media = synthetic.synthetic_notes(args["notes"], work / "media")
+    model = thai_vocab_model()
+    deck = Deck(stable_deck_id("bench apkg"), "bench apkg")
+    for n in notes:
+        deck.add_note(Note(model, [n["Thai"], n["Phonetic"], n["English"], n["Audio"]], guid=note_guid(n["Thai"])))
+    t0 = time.perf_counter()
+    output = write_apkg(deck, work / "bench.apkg", media)
+    elapsed = time.perf_counter() - t0
+    return {"notes": len(notes), "seconds": elapsed, "apkg_bytes": output.stat().st_size,
+            "notes_per_sec": len(notes) / elapsed if elapsed else 0.0}
+
+def _importtime(module: str) -> Tuple[float, Dict[str, float]]:
+    """python -X importtime でモジュールを読み込み、(全体のms, パッケージごとの累積ms) を返す"""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=REPO_ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    packages: Dict[str, float] = {}
+    total = 0.0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        ms = int(cumulative) / 1000
+        name = name.strip()
+        if name == module:
+            total = ms
+        # パッケージ本体の行の累積値にサブモジュールの読み込み時間も含まれる
+        top = name.split(".")[0]
+        packages[top] = max(packages.get(top, 0.0), ms)
+    return total, packages
+
+def bench_startup(work: Path, args: Dict[str, Any]) -> Dict[str, Any]:
+    """CLIの起動時間（python -X importtime）と、起動時に読み込まれる重い依存"""
+    runs = []
+    for _ in range(args["startup_runs"]):
+        t0 = time.perf_counter()
+        total, packages = _importtime("src.cli.main")
+        runs.append((time.perf_counter() - t0, total, packages))
+    wall, total, packages = min(runs, key=lambda r: r[0])
+    heavy = sorted(m for m in HEAVY_MODULES if m in packages)
+    slowest = sorted(packages.items(), key=lambda kv: kv[1], reverse=True)[:10]
+    return {"process_start_seconds": wall, "import_ms": total, "heavy_modules_loaded": len(heavy),
+            "heavy_modules": heavy, "slowest_imports_ms": {k: round(v, 1) for k, v in slowest}}
+
+BENCHMARKS: Dict[str, Callable[[Path, Dict[str, Any]], Dict[str, Any]]] = {
+    "startup": bench_startup,
+    "extract": bench_extract,
+    "dedupe": bench_dedupe,
+    "youtube_build": bench_youtube_build,
+    "image_table": bench_image_table,
+    "apkg_write": bench_apkg_write,
+}
+
+def _child(name: str, server_url: str, args: Dict[str, Any], conn) -> None:
+    """子プロセス: 一時ディレクトリで1つのベンチマークを実行し、結果とピークRSSを返す"""
+    work = Path(tempfile.mkdtemp(prefix=f"bench_{name}_"))
+    try:
+        sys.path.insert(0, str(REPO_ROOT))
+        os.chdir(work)
+        patch_clients(server_url)
+        result = BENCHMARKS[name](work, args)
+        result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        conn.send({"ok": True, "result": result})
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        conn.send({"ok": False, "error": f"{type(e).__name__}: {e}"})
+    finally:
+        os.chdir(REPO_ROOT)
+        shutil.rmtree(work, ignore_errors=True)
+
+def run_benchmark(name: str, server: FakeApiServer, args: Dict[str, Any]) -> Dict[str, Any]:
+    ctx = multiprocessing.get_context("spawn")
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    server.reset_stats()
+    proc = ctx.Process(target=_child, args=(name, server.url, args, child_conn))
+    t0 = time.perf_counter()
+    proc.start()
+    proc.join()
+    wall = time.perf_counter() - t0
+    msg = parent_conn.recv() if parent_conn.poll() else {"ok": False, "error": f"exit code {proc.exitcode}"}
+    result = msg.get("result", {"error": msg.get("error")})
+    result["process_seconds"] = wall
+    # OCRリクエスト数などはフェイクサーバー側で数える
+    result["requests"] = server.reset_stats()
+    return result
+
+# --- 結果の保存と比較 ---
+
+def _flatten(results: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = float(value)
+    return flat
+
+def compare(old: Dict[str, Any], new: Dict[str, Any], tolerance: float = 0.10) -> List[str]:
+    """前回結果と比較して表示し、許容範囲を超えて悪化した項目を返す（*_per_secは大きいほど良い）"""
+    old_flat = _flatten(old["results"])
+    new_flat = _flatten(new["results"])
+    regressions = []
+    print(f"\n📊 比較: {old.get('timestamp')} → {new.get('timestamp')} (許容 {tolerance:.0%})")
+    for key in sorted(set(old_flat) & set(new_flat)):
+        a, b = old_flat[key], new_flat[key]
+        if a == 0:
+            continue
+        change = (b - a) / a
+        worse = -change if key.endswith("_per_sec") else change
+        if key.split(".")[-1] in INPUT_KEYS:
+            worse = 0.0
+        mark = "❌" if worse > tolerance else ("✅" if worse < -tolerance else "  ")
+        print(f"  {mark} {key:<40} {a:>12.3f} → {b:>12.3f} ({change:+.1%})")
+        if worse > tolerance:
+            regressions.append(key)
+    return regressions
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def _parse_kv(value: str) -> Dict[str, float]:
+    """'openai=0.8,tts=0.2' 形式を辞書に変換"""
+    result = {}
+    for part in (value or "").split(","):
+        if part.strip():
+            k, _, v = part.partition("=")
+            result[k.strip()] = float(v)
+    return result
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Anki OCR オフラインベンチマーク")
+    parser.add_argument("--only", default="", help=f"実行するベンチマーク（カンマ区切り: {','.join(BENCHMARKS)}）")
+    parser.add_argument("--cards", type=int, default=20, help="合成動画のカード枚数")
+    parser.add_argument("--fps", type=int, default=10, help="合成動画のFPS")
+    parser.add_argument("--frame-interval", type=int, default=5, help="フレーム抽出間隔（フレーム数）")
+    parser.add_argument("--ssim-threshold", type=float, default=0.95, help="SSIMしきい値")
+    parser.add_argument("--tables", type=int, default=5, help="合成画像表の枚数")
+    parser.add_argument("--notes", type=int, default=2000, help="apkg書き出しのノート数")
+    parser.add_argument("--startup-runs", type=int, default=5, help="起動時間の計測回数（最速の回を採用）")
+    parser.add_argument("--latency", default="openai=0.3,tts=0.05,translate=0.05", help="フェイクAPIの平均レイテンシ（秒）")
+    parser.add_argument("--rate", default="", help="フェイクAPIのレートリミット（1秒あたり、超過時は429）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=None, help="結果JSONの保存先")
+    parser.add_argument("--compare", type=Path, default=None, help="比較対象の過去の結果JSON")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="悪化とみなす変化率")
+    args = parser.parse_args(argv)
+
+    names = [n.strip() for n in args.only.split(",") if n.strip()] or list(BENCHMARKS)
+    latency = _parse_kv(args.latency)
+    rate = _parse_kv(args.rate)
+    profiles = {
+        s: ServiceProfile(latency=latency.get(s, 0.0), jitter=latency.get(s, 0.0) / 4,
+                          rate=rate.get(s, 0.0), burst=max(1, int(rate.get(s, 1))))
+        for s in ("openai", "tts", "translate")
+    }
+
+    data_dir = Path(tempfile.mkdtemp(prefix="bench_data_"))
+    try:
+        params: Dict[str, Any] = {
+            "cards": args.cards, "fps": args.fps, "frame_interval": args.frame_interval,
+            "ssim_threshold": args.ssim_threshold, "n_tables": args.tables, "notes": args.notes,
+            "seed": args.seed, "latency": latency, "rate": rate, "startup_runs": args.startup_runs,
+        }
+        if {"extract", "dedupe", "youtube_build"} & set(names):
+            print(f"🎞️ 合成動画を生成中: {args.cards}カード")
+            video, total = synthetic.generate_lesson_video(data_dir / "lesson.mp4", n_cards=args.cards,
+                                                           fps=args.fps, seed=args.seed)
+            params.update(video=str(video), video_frames=total)
+        if "image_table" in names:
+            print(f"🖼️ 合成画像表を生成中: {args.tables}枚")
+            synthetic.generate_image_tables(data_dir / "tables", n_tables=args.tables, seed=args.seed)
+            params["tables"] = str(data_dir / "tables")
+
+        results: Dict[str, Any] = {}
+        with FakeApiServer(profiles) as server:
+            for name in names:
+                print(f"\n⏱️ {name} ...")
+                results[name] = run_benchmark(name, server, params)
+                summary = {k: round(v, 3) if isinstance(v, float) else v for k, v in results[name].items()}
+                print(f"   {json.dumps(summary, ensure_ascii=False)}")
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    report = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "git_rev": _git_rev(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {k: v for k, v in params.items() if k not in ("video", "tables")},
+        "results": results,
+    }
+    output = args.output or RESULTS_DIR / f"bench_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n📝 結果: {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(json.load(f), report, args.tolerance)
+        if regressions:
+            print(f"❌ 悪化: {', '.join(regressions)}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
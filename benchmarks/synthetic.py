@@ -0,0 +1,104 @@
+"""ベンチマーク用の合成データ（レッスン動画・画像表）をローカルで生成する"""
+import random
+import pathlib
+from typing import List, Optional, Tuple
+from .fake_server import VOCAB
+
+# タイ文字を描画できるフォントの候補（見つからなければPILの既定フォントで代用）
+THAI_FONTS = [
+    "/usr/share/fonts/truetype/tlwg/Loma.ttf",
+    "/usr/share/fonts/truetype/tlwg/Garuda.ttf",
+    "/usr/share/fonts/opentype/noto/NotoSansThai-Regular.ttf",
+    "/usr/share/fonts/truetype/noto/NotoSansThai-Regular.ttf",
+    "/System/Library/Fonts/Supplemental/Thonburi.ttc",
+    "C:/Windows/Fonts/tahoma.ttf",
+]
+
+def _font(size: int):
+    from PIL import ImageFont
+    for path in THAI_FONTS:
+        if pathlib.Path(path).exists():
+            return ImageFont.truetype(path, size)
+    return ImageFont.load_default()
+
+def render_card(entry: Tuple[str, str, str, str], size: Tuple[int, int] = (640, 360)):
+    """語彙カード1枚分の画像（BGRのnumpy配列）"""
+    import numpy as np
+    from PIL import Image, ImageDraw
+    thai, paiboon, meaning, _ = entry
+    img = Image.new("RGB", size, (250, 250, 245))
+    draw = ImageDraw.Draw(img)
+    draw.text((40, 60), thai, fill=(20, 20, 20), font=_font(56))
+    draw.text((40, 160), paiboon, fill=(30, 60, 160), font=_font(36))
+    draw.text((40, 230), meaning, fill=(90, 90, 90), font=_font(30))
+    return np.array(img)[:, :, ::-1].copy()
+
+def generate_lesson_video(path: pathlib.Path, n_cards: int = 20, fps: int = 10,
+                          min_seconds: float = 2.0, max_seconds: float = 6.0,
+                          noise: float = 4.0, seed: int = 0,
+                          size: Tuple[int, int] = (640, 360)) -> Tuple[pathlib.Path, int]:
+    """N枚の語彙カードをランダムな長さで切り替える動画を生成（(パス, 総フレーム数) を返す）
+
+    各フレームにガウスノイズを加え、実際の動画の圧縮ノイズに近い状態でSSIM重複排除を測れるようにする。
+    """
+    import cv2
+    import numpy as np
+    rng = random.Random(seed)
+    nrng = np.random.default_rng(seed)
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    total = 0
+    try:
+        for i in range(n_cards):
+            card = render_card(VOCAB[i % len(VOCAB)], size).astype(np.int16)
+            for _ in range(int(rng.uniform(min_seconds, max_seconds) * fps)):
+                frame = card + nrng.normal(0, noise, card.shape).astype(np.int16) if noise else card
+                writer.write(np.clip(frame, 0, 255).astype(np.uint8))
+                total += 1
+    finally:
+        writer.release()
+    return path, total
+
+def generate_image_tables(out_dir: pathlib.Path, n_tables: int = 5, rows: int = 8, seed: int = 0,
+                          size: Tuple[int, int] = (1600, 2200)) -> List[pathlib.Path]:
+    """罫線付きの語彙表（タイ語・Paiboon・意味）のPNG画像を生成"""
+    from PIL import Image, ImageDraw
+    rng = random.Random(seed)
+    out_dir = pathlib.Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    font = _font(44)
+    paths = []
+    row_h = size[1] // (rows + 1)
+    for t in range(n_tables):
+        img = Image.new("RGB", size, (255, 255, 255))
+        draw = ImageDraw.Draw(img)
+        for c, header in enumerate(("Thai", "Paiboon", "Meaning")):
+            draw.text((40 + c * size[0] // 3, 30), header, fill=(0, 0, 0), font=font)
+        for r in range(rows):
+            thai, paiboon, _, english = VOCAB[rng.randrange(len(VOCAB))]
+            y = (r + 1) * row_h
+            draw.line([(20, y), (size[0] - 20, y)], fill=(0, 0, 0), width=3)
+            for c, text in enumerate((thai, paiboon, english)):
+                draw.text((40 + c * size[0] // 3, y + 30), text, fill=(0, 0, 0), font=font)
+        path = out_dir / f"table_{t:03d}.png"
+        img.save(path)
+        paths.append(path)
+    return paths
+
+def synthetic_notes(n: int, media_dir: Optional[pathlib.Path] = None, audio_bytes: int = 8000):
+    """apkg書き出し計測用のノートと（指定時は）ダミー音声ファイル"""
+    notes = []
+    media = []
+    for i in range(n):
+        thai, paiboon, _, english = VOCAB[i % len(VOCAB)]
+        thai = f"{thai} {i}"
+        audio = ""
+        if media_dir is not None:
+            media_dir.mkdir(parents=True, exist_ok=True)
+            p = media_dir / f"bench_{i:06d}.mp3"
+            p.write_bytes(bytes(random.getrandbits(8) for _ in range(64)) * (audio_bytes // 64))
+            media.append(str(p))
+            audio = f"[sound:{p.name}]"
+        notes.append({"Thai": thai, "Phonetic": paiboon, "English": english, "Audio": audio})
+    return notes, media
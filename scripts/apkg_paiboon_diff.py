@@ -1,46 +1,54 @@
-import zipfile
-import sqlite3
+"""正解デッキと生成デッキのPaiboon表記を比較し、差分を例外パターンとして蓄積する
+
+    python scripts/apkg_paiboon_diff.py correct.apkg generated.apkg
+    python scripts/apkg_paiboon_diff.py gold1.apkg pred1.apkg gold2.apkg pred2.apkg --workers 4
+    python scripts/apkg_paiboon_diff.py --pairs pairs.tsv --report data/output/system/paiboon_match.tsv
+
+apkgはディスクに展開せず、collectionをメモリ上のSQLiteとして読む。
+差分は例外パターンストア（data/output/system/paiboon_exceptions.sqlite）に積み上げる。
+"""
 import csv
 import sys
+import argparse
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-import shutil
-
-def extract_apkg_to_csv(apkg_path, out_csv):
-    apkg_path = Path(apkg_path)
-    temp_dir = out_csv.parent / ('apkg_extract_' + apkg_path.stem)
-    temp_dir.mkdir(exist_ok=True)
-    with zipfile.ZipFile(apkg_path, 'r') as z:
-        z.extract('collection.anki2', temp_dir)
-    conn = sqlite3.connect(temp_dir / 'collection.anki2')
-    cur = conn.cursor()
-    cur.execute('PRAGMA table_info(notes)')
-    columns = [col[1] for col in cur.fetchall()]
-    cur.execute('SELECT flds FROM notes')
-    rows = cur.fetchall()
-    field_count = len(rows[0][0].split('\x1f')) if rows else 0
-    field_names = ['thai', 'paiboon', 'meaning'] + [f'field{i+4}' for i in range(field_count-3)]
-    with open(out_csv, 'w', encoding='utf-8', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(field_names[:field_count])
-        for (flds,) in rows:
-            fields = flds.split('\x1f')
-            writer.writerow(fields[:field_count])
-    print(f'✅ Extracted: {apkg_path} → {out_csv}')
-
-def load_vocab(path):
-    ext = Path(path).suffix.lower()
-    delimiter = '\t' if ext == '.tsv' else ','
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.common.apkg import open_apkg_collection, iter_apkg_notes
+from src.common.exception_store import ExceptionStore, EXCEPTION_STORE_PATH
+from src.common.dedupe import thai_vocab_key
+
+# (タイ語, 正解Paiboon, 生成Paiboon or None, 種別)
+Diff = Tuple[str, str, Optional[str], str]
+
+def load_vocab(path) -> Dict[str, str]:
+    """apkg（またはCSV/TSV）からタイ語→Paiboonの索引を作る"""
+    path = Path(path)
     vocab = {}
+    if path.suffix.lower() == '.apkg':
+        with zipfile.ZipFile(path) as z:
+            conn = open_apkg_collection(z)
+        try:
+            for _, fields in iter_apkg_notes(conn):
+                if len(fields) >= 2 and fields[0].strip() and fields[1].strip():
+                    vocab[thai_vocab_key(fields[0])] = fields[1].strip()
+        finally:
+            conn.close()
+        return vocab
+    delimiter = '\t' if path.suffix.lower() == '.tsv' else ','
     with open(path, encoding='utf-8') as f:
         reader = csv.DictReader(f, delimiter=delimiter)
         for row in reader:
             thai = row.get('thai') or row.get('タイ語')
             paiboon = row.get('paiboon') or row.get('Paiboon')
             if thai and paiboon:
-                vocab[thai.strip()] = paiboon.strip()
+                vocab[thai_vocab_key(thai)] = paiboon.strip()
     return vocab
 
-def compare_vocab(gold, pred):
+def compare_vocab(gold: Dict[str, str], pred: Dict[str, str]) -> Tuple[int, int, List[Diff]]:
     total = 0
     match = 0
     diffs = []
@@ -55,69 +63,101 @@ def compare_vocab(gold, pred):
         total += 1
     return match, total, diffs
 
-def merge_and_write_diffs_tsv(new_diffs, out_path):
-    # 既存データを読み込み（積み上げ式）
-    existing = []
-    if out_path.exists():
-        with open(out_path, encoding='utf-8') as f:
-            reader = csv.DictReader(f, delimiter='\t')
-            for row in reader:
-                existing.append(row)
-    # 新しいデータを追加（積み上げ）
-    for row in new_diffs:
-        existing.append({
-            'thai': row[0],
-            'gold_paiboon': row[1],
-            'generated_paiboon': row[2] if row[2] is not None else '',
-            'type': row[3]
-        })
-    # generated_paiboonが重複する例外定義を削除（新しいものを優先）
-    seen = {}
-    for row in reversed(existing):
-        key = row['generated_paiboon']
-        if key and key not in seen:
-            seen[key] = row
-    # generated_paiboonが空のものも残す
-    for row in reversed(existing):
-        key = row['generated_paiboon']
-        if not key:
-            seen[(row['thai'], row['gold_paiboon'])] = row
-    # 出力
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    with open(out_path, 'w', encoding='utf-8', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=['thai', 'gold_paiboon', 'generated_paiboon', 'type'], delimiter='\t')
-        writer.writeheader()
-        for row in reversed(list(seen.values())):
-            writer.writerow(row)
+def compare_pair(gold_path: str, pred_path: str) -> Dict:
+    """1組の正解/生成デッキを比較（プロセスプールで実行）"""
+    try:
+        match, total, diffs = compare_vocab(load_vocab(gold_path), load_vocab(pred_path))
+        return {'gold': gold_path, 'pred': pred_path, 'match': match, 'total': total, 'diffs': diffs}
+    except Exception as e:
+        return {'gold': gold_path, 'pred': pred_path, 'match': 0, 'total': 0, 'diffs': [],
+                'error': f'{type(e).__name__}: {e}'}
+
+def read_pairs(path: Path) -> List[Tuple[str, str]]:
+    """正解/生成のペア一覧（1行に 正解パス<TAB>生成パス、#始まりはコメント）"""
+    pairs = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            gold, _, pred = line.partition('\t')
+            pairs.append((gold.strip(), pred.strip()))
+    return pairs
+
+def write_report(results: List[Dict], path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f, delimiter='\t')
+        writer.writerow(['gold', 'pred', 'match', 'total', 'match_rate', 'mismatch', 'not_generated', 'error'])
+        for r in results:
+            kinds = [d[3] for d in r['diffs']]
+            rate = r['match'] / r['total'] if r['total'] else 0.0
+            writer.writerow([r['gold'], r['pred'], r['match'], r['total'], f'{rate:.4f}',
+                             kinds.count('mismatch'), kinds.count('not_generated'), r.get('error', '')])
 
 def main():
-    if len(sys.argv) != 3:
-        print('Usage: python apkg_paiboon_diff.py correct.apkg generated.apkg')
-        sys.exit(1)
-    apkg_gold, apkg_pred = sys.argv[1:3]
-    # 一時ディレクトリ
-    tmp_dir = Path('tmp/paiboon_diff_eval')
-    tmp_dir.mkdir(parents=True, exist_ok=True)
-    csv_gold = tmp_dir / 'correct.csv'
-    csv_pred = tmp_dir / 'generated.csv'
-    extract_apkg_to_csv(apkg_gold, csv_gold)
-    extract_apkg_to_csv(apkg_pred, csv_pred)
-    gold = load_vocab(csv_gold)
-    pred = load_vocab(csv_pred)
-    match, total, diffs = compare_vocab(gold, pred)
-    if total == 0:
+    parser = argparse.ArgumentParser(description='正解デッキと生成デッキのPaiboon表記を比較し、差分を例外パターンに積み上げる')
+    parser.add_argument('apkgs', nargs='*', help='正解.apkg 生成.apkg の組（複数組を続けて指定可）')
+    parser.add_argument('--pairs', type=Path, default=None, help='正解<TAB>生成 のペアを1行ずつ書いたファイル')
+    parser.add_argument('--workers', type=int, default=None, help='並列プロセス数（デフォルト: CPUコア数）')
+    parser.add_argument('--store', type=Path, default=EXCEPTION_STORE_PATH, help='例外パターンストア（SQLite）')
+    parser.add_argument('--export-tsv', type=Path, default=None, help='更新後の例外パターンをTSVにも書き出すパス')
+    parser.add_argument('--report', type=Path, default=None, help='ペアごとの一致率をTSVで書き出すパス')
+    parser.add_argument('--no-merge', action='store_true', help='比較結果の表示のみ行い、例外パターンは更新しない')
+    args = parser.parse_args()
+
+    if len(args.apkgs) % 2:
+        parser.error('正解と生成のapkgは2つ1組で指定してください')
+    pairs = list(zip(args.apkgs[0::2], args.apkgs[1::2]))
+    if args.pairs:
+        pairs += read_pairs(args.pairs)
+    if not pairs:
+        parser.error('比較するapkgの組を指定してください')
+
+    if len(pairs) == 1:
+        results = [compare_pair(*pairs[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            results = list(pool.map(compare_pair, *zip(*pairs)))
+
+    all_diffs = []
+    match_sum = total_sum = 0
+    for r in results:
+        name = f"{Path(r['gold']).name} ↔ {Path(r['pred']).name}"
+        if r.get('error'):
+            print(f"❌ {name}: {r['error']}")
+        elif r['total'] == 0:
+            print(f'❌ {name}: 正解デッキにデータがありません')
+        else:
+            print(f"✅ {name}: {r['match']}/{r['total']} ({r['match'] / r['total'] * 100:.1f}%), 差分 {len(r['diffs'])}件")
+        all_diffs.extend(r['diffs'])
+        match_sum += r['match']
+        total_sum += r['total']
+
+    if total_sum == 0:
         print('❌ No data found in the correct (gold) file. Please check the file contents.')
-        shutil.rmtree(tmp_dir)
         sys.exit(1)
-    out_path = Path('data/output/system/paiboon_diff.tsv')
-    merge_and_write_diffs_tsv(diffs, out_path)
-    print(f'✅ Paiboon match rate: {match}/{total} ({match/total*100:.1f}%)')
-    print(f'❗ Diff results written to: {out_path.resolve()}')
-    if diffs:
-        print(f'❌ {len(diffs)} differences found (see TSV file above)')
+    if len(results) > 1:
+        print(f'📊 Paiboon match rate (all pairs): {match_sum}/{total_sum} ({match_sum / total_sum * 100:.1f}%)')
+    if args.report:
+        write_report(results, args.report)
+        print(f'📝 ペアごとの一致率: {args.report}')
+    if not args.no_merge:
+        store = ExceptionStore(args.store)
+        try:
+            changed = store.merge(all_diffs)
+            print(f'❗ Diff results merged into: {args.store.resolve()} ({changed} new/updated)')
+            if args.export_tsv:
+                count = store.export_tsv(args.export_tsv)
+                print(f'📝 例外パターンをTSVに書き出しました: {count}件 → {args.export_tsv}')
+        finally:
+            store.close()
+    if all_diffs:
+        print(f'❌ {len(all_diffs)} differences found')
     else:
         print('All matched!')
-    shutil.rmtree(tmp_dir)
+    if any(r.get('error') for r in results):
+        sys.exit(1)
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    main()
@@ -8,21 +8,33 @@ python build_thai_deck.py --input-dir ./photos --deck-name "Name" --generate-med
 
 # ② 単一画像だけ（音声なし）
 python build_thai_deck.py --image IMG_4637.jpeg --deck-name "Name"
+
+# ③ フォルダを監視し、写真が追加されるたびに新しい画像だけOCRして作り直す
+python build_thai_deck.py --input-dir ./photos --deck-name "Name" --watch
 """
-import os, re, csv, uuid, argparse, tempfile, pathlib, requests, shutil, time
+import os, re, csv, argparse, tempfile, pathlib, requests, shutil
 from typing import List, Tuple, Optional
 from PIL import Image, UnidentifiedImageError, ImageOps
 from pythainlp.transliterate import romanize
 from genanki import Model, Note, Deck, Package
-from gtts import gTTS
 import eng_to_ipa as ipa
 import base64
 import openai
 from dotenv import load_dotenv
+# このスクリプトは src/ から直接実行されるため common パッケージを絶対importする
+from common.tts import TTS_BACKENDS, DEFAULT_TTS_BACKEND, get_tts_backend
+from common.apkg import stable_deck_id, note_guid
+from common.ingest_manifest import IngestManifest, watch_directory
+from common.dedupe import VocabDeduper
+from common.audio import gen_audio_batch, tts_limiter
+from common.ratelimit import RateLimiter
 
 # .envファイルを読み込む
 load_dotenv()
 
+# OpenAI Vision APIへの1秒あたりの最大リクエスト数（API対策、待ちは応答時間と重ねる）
+OCR_RATE = 0.4
+
 # ---------- OCR & PARSE -------------------------------------------------
 
 def load_and_convert_image(img_path: pathlib.Path) -> Optional[Image.Image]:
@@ -163,20 +175,6 @@ def sanitize_filename(name: str) -> str:
     # それ以外のファイル名に使えない文字をアンダースコアに置換
     return re.sub(r'[\\:*?"<>|]', '_', name)
 
-def gen_audio(word: str, thai: str, out_dir: pathlib.Path) -> str:
-    safe_word = sanitize_filename(word)
-    fname = f"{safe_word}_{uuid.uuid4().hex[:6]}.mp3"
-    out_path = out_dir / fname
-    try:
-        print(f"🎵 音声生成開始: {word} -> {out_path}")
-        gTTS(thai, lang="th").save(out_path)
-        print(f"✅ 音声生成成功: {out_path}")
-    except Exception as e:
-        print(f"❌ 音声生成に失敗しました: {word}")
-        print(f"エラー: {str(e)}")
-        return ""
-    return fname  # ファイル名のみ返す
-
 def fetch_image(keyword: str, out_dir: pathlib.Path) -> str:
     # 画像取得は行わない
     return ""
@@ -271,8 +269,8 @@ def build_deck(rows, deck_name, media_dir):
         }],
     )
 
-    # デッキIDを32ビット整数に収まるように生成
-    deck_id = abs(hash(deck_name)) % (2**31 - 1)
+    # デッキIDをデッキ名から決定的に生成（32ビット整数に収まる）
+    deck_id = stable_deck_id(deck_name)
     deck = Deck(deck_id, deck_name)
 
     for eng, thai, phonetic, audio, pic in rows:
@@ -286,7 +284,7 @@ def build_deck(rows, deck_name, media_dir):
                 "",             # Extra (空文字)
                 f"[sound:{audio}]" if audio else "",
                 f"<img src=\"{pic}\">" if pic else "",
-            ])
+            ], guid=note_guid(thai))
             deck.add_note(note)
         except Exception as e:
             print(f"❌ ノートの作成に失敗しました: {thai}")
@@ -333,58 +331,91 @@ def main():
     ap.add_argument("--deck-name", default="Thai Vocab")
     ap.add_argument("--generate-media", action="store_true",
                     help="音声(TTS)と画像(Unsplash)を自動取得")
+    ap.add_argument("--tts-backend", choices=list(TTS_BACKENDS), default=DEFAULT_TTS_BACKEND,
+                    help="音声生成バックエンド（gtts: オンライン, espeak: オフライン）")
+    ap.add_argument("--tts-workers", type=int, default=None,
+                    help="音声生成の並列数（デフォルト: バックエンドごとの既定値）")
+    ap.add_argument("--tts-rate", type=float, default=None,
+                    help="音声生成の1秒あたりの最大リクエスト数（デフォルト: バックエンドごとの既定値）")
+    ap.add_argument("--reprocess", action="store_true",
+                    help="処理済みマニフェストを使わず、すべての画像をOCRし直す")
+    ap.add_argument("--watch", action="store_true",
+                    help="--input-dirを監視し、画像が追加・変更されるたびにデッキを作り直す")
+    ap.add_argument("--watch-interval", type=float, default=10.0,
+                    help="--watch時にフォルダを調べる間隔（秒）")
     args = ap.parse_args()
+    if args.watch and not args.input_dir:
+        ap.error("--watch は --input-dir と一緒に指定してください")
 
-    image_files = []
     if args.image:
         if not args.image.exists():
             print(f"❌ 指定された画像が見つかりません: {args.image}")
             return
-        if not args.image.name.startswith("temp_"):
-            image_files = [args.image]
-    else:
-        if not args.input_dir.exists():
-            print(f"❌ 指定されたディレクトリが見つかりません: {args.input_dir}")
-            return
-        pats = (".jpg", ".jpeg", ".png", ".JPG", ".JPEG", ".PNG")
-        image_files = sorted([
-            p for p in args.input_dir.iterdir()
-            if p.suffix.lower() in pats and not p.name.startswith("temp_")
-        ])
+    elif not args.input_dir.exists():
+        print(f"❌ 指定されたディレクトリが見つかりません: {args.input_dir}")
+        return
+
+    build_from_images(args)
+    if args.watch:
+        watch_directory(lambda: list_images(args), lambda: build_from_images(args),
+                        interval=args.watch_interval)
 
+def list_images(args) -> List[pathlib.Path]:
+    if args.image:
+        return [] if args.image.name.startswith("temp_") else [args.image]
+    pats = (".jpg", ".jpeg", ".png", ".JPG", ".JPEG", ".PNG")
+    return sorted([
+        p for p in args.input_dir.iterdir()
+        if p.suffix.lower() in pats and not p.name.startswith("temp_")
+    ])
+
+def build_from_images(args):
+    """画像をOCRしてデッキを作る（マニフェストにある未変更の画像は前回の行を使う）"""
+    tts_backend = get_tts_backend(args.tts_backend)
+    image_files = list_images(args)
     if not image_files:
         print("❌ 処理対象の画像が見つかりません")
         return
 
+    manifest = None
+    cached, todo = {}, image_files
+    if not args.reprocess:
+        # process_image_tableとはOCRのプロンプトが違うので、同じディレクトリでもマニフェストを分ける
+        manifest = IngestManifest(args.input_dir or args.image.parent, variant="build_thai_deck")
+        cached, todo = manifest.plan(image_files)
+        if args.input_dir:
+            manifest.prune(image_files)
+        manifest.save()
+        print(f"🗂️ 処理済みマニフェスト: 再利用 {len(cached)}件 / 新規・変更 {len(todo)}件")
+
     media_dir = pathlib.Path(tempfile.mkdtemp())
     print(f"\n📂 メディアディレクトリ作成: {media_dir}")
-    all_rows = []
+    rows_by_file = dict(cached)
 
-    for img in image_files:
+    ocr_limiter = RateLimiter(OCR_RATE)
+    for img in todo:
         print(f"\n📝 処理中: {img.name}")
+        ocr_limiter.acquire()
         rows = ocr_and_process(img, media_dir)
-        all_rows.extend(rows)
-        time.sleep(2.5)  # OpenAI Vision API対策
-
-    # Paiboonで重複排除
-    unique_rows = []
-    seen_paiboon = set()
-    for eng, thai, paiboon in all_rows:
-        if not paiboon or paiboon in seen_paiboon:
-            continue
-        seen_paiboon.add(paiboon)
-        unique_rows.append((eng, thai, paiboon))
+        rows_by_file[img] = rows
+        if manifest is not None:
+            manifest.record(img, rows)
+            manifest.save()
+
+    # 表記揺れを正規化したタイ語で重複排除（音声生成の前に行う）
+    deduper = VocabDeduper()
+    unique_rows = deduper.filter_rows(
+        row for img in image_files for row in rows_by_file.get(img, []) if row[2]
+    )
+    deduper.report()
 
-    # 音声ファイル生成（重複排除後のみ）
+    # 音声ファイル生成（重複排除後のみ、レートリミット付きで並列実行）
+    audio_files = gen_audio_batch(
+        [(eng, thai) for eng, thai, _ in unique_rows], media_dir, backend=tts_backend,
+        workers=args.tts_workers, limiter=tts_limiter(tts_backend, args.tts_rate)
+    )
     final_rows = []
-    for eng, thai, paiboon in unique_rows:
-        audio_file = ""
-        try:
-            audio_file = gen_audio(eng, thai, media_dir)
-            time.sleep(0.7)  # gTTS対策
-        except Exception as e:
-            print(f"⚠️ 音声生成に失敗しました: {eng}")
-            print(f"エラー: {str(e)}")
+    for (eng, thai, paiboon), audio_file in zip(unique_rows, audio_files):
         pic_file = ""  # 画像は使わない
         final_rows.append((eng, thai, paiboon, audio_file, pic_file))
 
@@ -1,15 +1,70 @@
 #!/usr/bin/env python3
 import argparse
 import pathlib
-from ..deck_builders.image_table import process_image_table
-from ..deck_builders.youtube import process_youtube_video, YouTubeDeckBuilder, download_video
+# デッキビルダー（OpenCV・OpenAI・genankiなど重い依存を読み込む）は各コマンドの中でimportし、
+# 起動時間を短く保つ
+from ..common.workqueue import WorkQueue, WORKQUEUE_PATH, DEFAULT_LEASE_SECONDS
+from ..common.tts import TTS_BACKENDS, DEFAULT_TTS_BACKEND
+from ..common.audio_post import DEFAULT_AUDIO_BITRATE
+from ..common.journal import job_id_for
+from ..common.metrics import METRICS, LOG_LEVELS, setup_logging
+from ..common.cassette import use_cassette
+from ..common.known_vocab import load_known_vocab
+from ..common.text_gate import DEFAULT_MIN_TEXT_LINES
 import click
 from pathlib import Path
+from typing import Optional, Tuple
+
+def parse_stage_workers(value: str) -> dict:
+    """'ocr=4,tts=8' 形式の段ごとの並列数指定を辞書に変換"""
+    result = {}
+    for part in (value or "").split(","):
+        if not part.strip():
+            continue
+        name, _, count = part.partition("=")
+        result[name.strip()] = int(count)
+    return result
+
+def setup_cassette(record: Optional[Path], replay: Optional[Path], replay_latency: bool) -> None:
+    """--record/--replay の指定に応じて外部APIの記録・再生を有効にする"""
+    if record and replay:
+        raise click.UsageError("--record と --replay は同時に指定できません")
+    if record:
+        use_cassette(record, "record")
+    elif replay:
+        use_cassette(replay, "replay", replay_latency)
+
+def write_metrics(prom_path: Optional[Path] = None) -> None:
+    """実行の計測サマリーを表示・保存（指定時はPrometheus textfileも出力）
+
+    何も計測されなかったコマンド（merge・verify・queue-statusなど）では、--metrics-prom指定時以外は何も書き出さない。
+    """
+    use_cassette(None, "off")
+    if not METRICS.has_data() and not prom_path:
+        return
+    METRICS.report()
+    json_path = METRICS.write_json()
+    print(f"📝 計測結果: {json_path}")
+    if prom_path:
+        METRICS.write_prometheus(prom_path)
+        print(f"📝 Prometheus textfile: {prom_path}")
 
 @click.group()
-def cli():
+@click.option("--log-level", type=click.Choice(LOG_LEVELS, case_sensitive=False), default="INFO",
+              help="ログレベル（DEBUGでOpenAIの生応答やPaiboon修正の詳細を表示）")
+@click.option("--metrics-prom", type=click.Path(dir_okay=False, path_type=Path), default=None,
+              help="計測値をPrometheus textfile形式で書き出すパス")
+@click.option("--record", type=click.Path(dir_okay=False, path_type=Path), default=None,
+              help="外部API（OpenAI・MyMemory・TTS）の通信をこのカセットファイルに記録する")
+@click.option("--replay", type=click.Path(exists=True, dir_okay=False, path_type=Path), default=None,
+              help="記録済みカセットから応答を再生する（APIは呼ばない）")
+@click.option("--replay-latency", is_flag=True, help="再生時に記録時のレイテンシも再現する")
+@click.pass_context
+def cli(ctx, log_level: str, metrics_prom: Path, record: Path, replay: Path, replay_latency: bool):
     """Anki OCR - YouTube動画や画像からAnkiデッキを生成"""
-    pass
+    setup_logging(log_level)
+    setup_cassette(record, replay, replay_latency)
+    ctx.call_on_close(lambda: write_metrics(metrics_prom))
 
 @cli.command()
 @click.argument("url")
@@ -18,15 +73,43 @@ def cli():
 @click.option("--frame-interval", "-i", default=1, help="フレーム抽出間隔（秒）")
 @click.option("--ssim-threshold", "-s", default=0.95, help="SSIMしきい値（0-1）")
 @click.option("--no-paiboon-correction", is_flag=True, help="Paiboon最終修正（ChatGPT一括投げ）を行わない")
-def youtube(url: str, output_dir: str, deck_name: str, frame_interval: int, ssim_threshold: float, no_paiboon_correction: bool):
+@click.option("--tts-backend", type=click.Choice(list(TTS_BACKENDS)), default=DEFAULT_TTS_BACKEND, help="音声生成バックエンド")
+@click.option("--tts-workers", type=int, default=None, help="音声生成の並列数（デフォルト: バックエンドごとの既定値）")
+@click.option("--tts-rate", type=float, default=None, help="音声生成の1秒あたりの最大リクエスト数（デフォルト: バックエンドごとの既定値）")
+@click.option("--compress-audio", is_flag=True, help="音声の無音削除・モノラル化・低ビットレート再エンコードを行う")
+@click.option("--audio-bitrate", default=DEFAULT_AUDIO_BITRATE, help="--compress-audio時の目標ビットレート")
+@click.option("--incremental", is_flag=True, help="前回から新規・変更されたノートのみを書き出す")
+@click.option("--stage-workers", default="", help="段ごとの並列数（例: ocr=4,correct=4,translate=2）")
+@click.option("--resume", is_flag=True, help="前回中断したジョブを、ジャーナルに記録済みの結果を使って再開する")
+@click.option("--job-id", default=None, help="ジョブID（デフォルト: URLとデッキ名から生成）")
+@click.option("--dry-run", is_flag=True, help="抽出・重複除去だけを行い、API呼び出し数・トークン数・費用・所要時間の見積もりを表示する")
+@click.option("--budget", type=float, default=None, help="OCR・Paiboon修正の費用上限（USD）。超える場合は新規性の低いフレームから除外する")
+@click.option("--known-decks", multiple=True, type=click.Path(exists=True, dir_okay=False, path_type=Path),
+              help="既存デッキ（apkg/colpkg/collection.anki2/テキスト書き出し）。ここにある語はOCR直後に除外（複数指定可）")
+@click.option("--subtitles", is_flag=True, help="アップロードされた字幕（VTT/SRV）も取得し、字幕から語彙を取り出す（字幕のない時間帯だけOCR）")
+@click.option("--subtitle-file", multiple=True, type=click.Path(exists=True, dir_okay=False, path_type=Path),
+              help="手元の字幕ファイル（.vtt/.srv3など）を使う（複数指定可）")
+@click.option("--text-gate-lines", type=int, default=0,
+              help=f"テキスト行らしき領域がこの数未満のフレームはOCRしない（デフォルト0で無効、推奨{DEFAULT_MIN_TEXT_LINES}）")
+@click.option("--text-gate-tesseract", is_flag=True, help="テキスト判定（--text-gate-lines指定時）にTesseract（タイ語）も使い、タイ文字が読めないフレームはOCRしない")
+def youtube(url: str, output_dir: str, deck_name: str, frame_interval: int, ssim_threshold: float, no_paiboon_correction: bool,
+            tts_backend: str, tts_workers: int, tts_rate: float, compress_audio: bool, audio_bitrate: str, incremental: bool,
+            stage_workers: str, resume: bool, job_id: str, dry_run: bool, budget: float,
+            known_decks: Tuple[Path, ...], subtitles: bool, subtitle_file: Tuple[Path, ...],
+            text_gate_lines: int, text_gate_tesseract: bool):
     """YouTube動画からAnkiデッキを生成"""
+    from ..deck_builders.youtube import YouTubeDeckBuilder, download_video
+    from ..common.subtitles import find_subtitles
+    # ダウンロードや既存デッキの読み込みで失敗した場合はビルダーがまだない
+    builder = None
     try:
         # 出力ディレクトリを作成
         output_path = Path(output_dir)
         output_path.mkdir(parents=True, exist_ok=True)
         
         # 動画をダウンロード
-        video_path = download_video(url, output_path)
+        video_path = download_video(url, output_path, subtitles=subtitles)
+        subtitle_paths = list(subtitle_file) + (find_subtitles(video_path) if subtitles else [])
         
         # デッキ名が指定されていない場合は動画タイトルを使用
         if not deck_name:
@@ -37,11 +120,27 @@ def youtube(url: str, output_dir: str, deck_name: str, frame_interval: int, ssim
             output_dir=str(output_path),
             deck_name=deck_name,
             ssim_threshold=ssim_threshold,
-            use_paiboon_correction=not no_paiboon_correction
+            use_paiboon_correction=not no_paiboon_correction,
+            tts_workers=tts_workers,
+            tts_rate=tts_rate,
+            tts_backend=tts_backend,
+            audio_bitrate=audio_bitrate if compress_audio else None,
+            incremental=incremental,
+            stage_workers=parse_stage_workers(stage_workers),
+            # 見積もりのみの場合はジャーナルを使わない
+            job_id=None if dry_run else job_id or job_id_for(url, deck_name),
+            resume=resume,
+            known_vocab=load_known_vocab(known_decks),
+            text_gate_lines=text_gate_lines,
+            text_gate_tesseract=text_gate_tesseract
         )
         
+        if dry_run:
+            builder.dry_run(video_path, frame_interval, budget=budget, subtitles=subtitle_paths)
+            return
+
         # デッキをビルド
-        apkg_path = builder.build(video_path, frame_interval)
+        apkg_path = builder.build(video_path, frame_interval, budget=budget, subtitles=subtitle_paths)
         
         print(f"\n✅ 生成完了: {apkg_path}")
         
@@ -50,7 +149,149 @@ def youtube(url: str, output_dir: str, deck_name: str, frame_interval: int, ssim
         raise click.Abort()
     finally:
         # 一時ファイルを削除
-        builder.cleanup()
+        if builder:
+            builder.cleanup()
+
+@cli.command()
+@click.argument("inputs", nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.option("--deck-name", "-n", required=True, help="マージ後のデッキ名")
+@click.option("--output", "-o", type=click.Path(dir_okay=False, path_type=Path), default=None,
+              help="出力apkgパス（デフォルト: data/output/decks/<デッキ名>.apkg）")
+def merge(inputs, deck_name: str, output: Path):
+    """複数のapkg（または中間行TSV/CSV）を1つのデッキに統合（タイ語+Paiboonで重複排除、音声は内容ハッシュで共有）"""
+    from ..deck_builders.merge import merge_decks
+    apkg_path = merge_decks(inputs, deck_name, output)
+    if apkg_path is None:
+        raise click.Abort()
+
+@cli.command()
+@click.argument("manifest", type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.option("--workers", "-w", default=2, help="同時に実行するジョブ数")
+@click.option("--output-dir", "-o", default="data/output/decks", help="出力ディレクトリ")
+@click.option("--tts-backend", type=click.Choice(list(TTS_BACKENDS)), default=DEFAULT_TTS_BACKEND, help="音声生成バックエンド")
+@click.option("--tts-rate", type=float, default=None, help="全ジョブ合計での音声生成の1秒あたりの最大リクエスト数")
+@click.option("--resume", is_flag=True, help="中断したジョブをジャーナルから再開する")
+@click.option("--known-decks", multiple=True, type=click.Path(exists=True, dir_okay=False, path_type=Path),
+              help="既存デッキ（apkg/colpkg/collection.anki2/テキスト書き出し）。ここにある語はOCR直後に除外（複数指定可）")
+def batch(manifest: Path, workers: int, output_dir: str, tts_backend: str, tts_rate: float, resume: bool,
+          known_decks: Tuple[Path, ...]):
+    """マニフェスト（YAML/TSV/CSV）に列挙した複数の動画・画像フォルダをまとめて処理"""
+    from ..deck_builders.batch import BatchRunner, load_manifest
+    jobs = load_manifest(manifest)
+    print(f"📋 マニフェスト読み込み: {len(jobs)}ジョブ")
+    runner = BatchRunner(workers=workers, output_dir=output_dir, tts_backend=tts_backend,
+                         tts_rate=tts_rate, resume=resume, known_decks=list(known_decks))
+    runner.run(jobs)
+    if any(s["status"] == "failed" for s in runner.statuses):
+        raise click.Abort()
+
+@cli.command()
+@click.argument("url")
+@click.option("--deck-name", "-n", help="デッキ名（デフォルト: 動画タイトル）")
+@click.option("--output-dir", "-o", default="data/output/decks", help="出力ディレクトリ（パッケージ化するワーカーから見たパス）")
+@click.option("--frame-interval", "-i", default=1, help="フレーム抽出間隔（秒）")
+@click.option("--ssim-threshold", "-s", default=0.95, help="SSIMしきい値（0-1）")
+@click.option("--no-paiboon-correction", is_flag=True, help="Paiboon最終修正（ChatGPT一括投げ）を行わない")
+@click.option("--tts-backend", type=click.Choice(list(TTS_BACKENDS)), default=DEFAULT_TTS_BACKEND, help="音声生成バックエンド")
+@click.option("--tts-rate", type=float, default=None, help="ワーカーごとの音声生成の1秒あたりの最大リクエスト数")
+@click.option("--compress-audio", is_flag=True, help="音声の無音削除・モノラル化・低ビットレート再エンコードを行う")
+@click.option("--audio-bitrate", default=DEFAULT_AUDIO_BITRATE, help="--compress-audio時の目標ビットレート")
+@click.option("--incremental", is_flag=True, help="前回から新規・変更されたノートのみを書き出す")
+@click.option("--queue", "queue_path", type=click.Path(dir_okay=False, path_type=Path), default=WORKQUEUE_PATH,
+              help="共有キューのSQLiteファイル")
+@click.option("--job-id", default=None, help="ジョブID（デフォルト: URLとデッキ名から生成）")
+@click.option("--known-decks", multiple=True, type=click.Path(exists=True, dir_okay=False, path_type=Path),
+              help="既存デッキ（ワーカーから見える共有ストレージ上のパス）。ここにある語はOCR直後に除外（複数指定可）")
+@click.option("--text-gate-lines", type=int, default=0,
+              help=f"テキスト行らしき領域がこの数未満のフレームはキューに登録しない（デフォルト0で無効、推奨{DEFAULT_MIN_TEXT_LINES}）")
+def enqueue(url: str, deck_name: str, output_dir: str, frame_interval: int, ssim_threshold: float,
+            no_paiboon_correction: bool, tts_backend: str, tts_rate: float, compress_audio: bool,
+            audio_bitrate: str, incremental: bool, queue_path: Path, job_id: str, known_decks: Tuple[Path, ...],
+            text_gate_lines: int):
+    """動画のフレームを共有キューに登録（OCR以降は worker コマンドで複数マシンに分散）"""
+    from ..deck_builders.youtube import download_video
+    from ..deck_builders.worker import enqueue_video
+    queue = WorkQueue(queue_path)
+    try:
+        video_path = download_video(url, Path(output_dir))
+        deck_name = deck_name or video_path.stem
+        config = {
+            "output_dir": output_dir,
+            "use_paiboon_correction": not no_paiboon_correction,
+            "tts_backend": tts_backend,
+            "tts_rate": tts_rate,
+            "audio_bitrate": audio_bitrate if compress_audio else None,
+            "incremental": incremental,
+            "known_decks": [str(p.resolve()) for p in known_decks],
+        }
+        enqueue_video(queue, video_path, deck_name, job_id or job_id_for(url, deck_name),
+                      frame_interval=frame_interval, ssim_threshold=ssim_threshold, config=config,
+                      text_gate_lines=text_gate_lines)
+    finally:
+        queue.close()
+
+@cli.command()
+@click.option("--queue", "queue_path", type=click.Path(dir_okay=False, path_type=Path), default=WORKQUEUE_PATH,
+              help="共有キューのSQLiteファイル")
+@click.option("--threads", "-t", default=4, help="ワーカー1プロセスあたりの同時処理数")
+@click.option("--processes", "-p", default=1, help="このマシンで起動するワーカープロセス数")
+@click.option("--lease", default=DEFAULT_LEASE_SECONDS, help="アイテムのリース期限（秒）。切れると他のワーカーが取り直す")
+@click.option("--poll-interval", default=2.0, help="仕事がないときの再確認間隔（秒）")
+@click.option("--keep-running", is_flag=True, help="キューが空になっても終了せずに待ち続ける")
+def worker(queue_path: Path, threads: int, processes: int, lease: float, poll_interval: float, keep_running: bool):
+    """共有キューからフレームを取得して処理するワーカーを起動"""
+    from ..deck_builders.worker import run_local_workers
+    run_local_workers(processes, queue_path=queue_path, threads=threads, lease_seconds=lease,
+                      poll_interval=poll_interval, exit_when_idle=not keep_running)
+
+@cli.command("queue-status")
+@click.option("--queue", "queue_path", type=click.Path(dir_okay=False, path_type=Path), default=WORKQUEUE_PATH,
+              help="共有キューのSQLiteファイル")
+def queue_status(queue_path: Path):
+    """共有キューのジョブごとの進捗を表示"""
+    queue = WorkQueue(queue_path)
+    try:
+        for job in queue.status():
+            items = ", ".join(f"{k}={v}" for k, v in sorted(job["items"].items()))
+            print(f"{job['job_id']} [{job['status']}] {job['deck_name']}: {items} {job['output'] or job['error'] or ''}")
+    finally:
+        queue.close()
+
+@cli.command()
+@click.argument("apkgs", nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.option("--workers", "-w", type=int, default=None, help="メディアのハッシュ計算の並列数")
+@click.option("--no-hash", is_flag=True, help="メディアの読み出し・ハッシュ計算を省略し、参照の整合性だけを確認する")
+@click.option("--list", "list_notes", is_flag=True, help="ノートを表示する（--match/--limitで絞り込み）")
+@click.option("--match", default=None, help="この文字列をいずれかのフィールドに含むノートだけを表示・書き出す")
+@click.option("--limit", type=int, default=None, help="表示・書き出すノートの最大件数")
+@click.option("--dump", type=click.Path(dir_okay=False, path_type=Path), default=None,
+              help="選択したノートをTSVに書き出すパス")
+def verify(apkgs, workers: int, no_hash: bool, list_notes: bool, match: str, limit: int, dump: Path):
+    """apkgを展開せずに検証（メディア参照の整合性・メディアの読み出しとハッシュ・重複GUID）"""
+    from ..common.apkg import UnsupportedApkgError
+    from ..common.verify import verify_apkg, print_report, select_notes, dump_notes
+    failed = False
+    for apkg in apkgs:
+        try:
+            report = verify_apkg(apkg, workers=workers, hash_media=not no_hash)
+        except UnsupportedApkgError as e:
+            print(f"\n❌ {e}")
+            failed = True
+            continue
+        print_report(report)
+        failed = failed or not report["ok"]
+        if list_notes or dump:
+            notes = select_notes(apkg, match=match, limit=limit)
+            if list_notes:
+                for guid, fields in notes:
+                    print(f"  {guid}\t" + "\t".join(fields))
+            if dump:
+                # 複数指定時はファイル名にapkg名を付ける
+                out = dump if len(apkgs) == 1 else dump.with_name(f"{dump.stem}_{apkg.stem}{dump.suffix}")
+                dump_notes(notes, out)
+                print(f"📝 {len(notes)}件を書き出しました: {out}")
+    if failed:
+        raise click.Abort()
 
 def main():
     parser = argparse.ArgumentParser(description="Anki OCR - タイ語の語学学習用Ankiデッキ生成ツール")
@@ -64,13 +305,42 @@ def main():
     # 共通オプション
     parser.add_argument("--deck-name", type=str, default="Thai Vocab", help="デッキ名")
     parser.add_argument("--generate-media", action="store_true", help="音声ファイルを生成")
+    parser.add_argument("--reprocess", action="store_true", help="処理済みマニフェストを使わず、すべての画像をOCRし直す")
+    parser.add_argument("--watch", action="store_true", help="入力ディレクトリを監視し、画像が追加・変更されるたびにデッキを作り直す（--input-dir用）")
+    parser.add_argument("--watch-interval", type=float, default=10.0, help="--watch時にディレクトリを調べる間隔（秒）")
+    parser.add_argument("--tile-rows", action="store_true", help="縦に長い表の画像を最初から行の帯に分けてOCRする（デフォルトは応答が途中で切れたときだけ分けて再試行）")
+    parser.add_argument("--preprocess-workers", type=int, default=None, help="画像の前処理（デコード・回転・リサイズ）の並列プロセス数（デフォルト: CPUコア数）")
+    parser.add_argument("--tts-backend", choices=list(TTS_BACKENDS), default=DEFAULT_TTS_BACKEND, help="音声生成バックエンド（gtts: オンライン, espeak: オフライン）")
+    parser.add_argument("--tts-workers", type=int, default=None, help="音声生成の並列数（デフォルト: バックエンドごとの既定値）")
+    parser.add_argument("--tts-rate", type=float, default=None, help="音声生成の1秒あたりの最大リクエスト数（デフォルト: バックエンドごとの既定値）")
+    parser.add_argument("--compress-audio", action="store_true", help="音声の無音削除・モノラル化・低ビットレート再エンコードを行う")
+    parser.add_argument("--audio-bitrate", type=str, default=DEFAULT_AUDIO_BITRATE, help="--compress-audio時の目標ビットレート（デフォルト32k）")
+    parser.add_argument("--incremental", action="store_true", help="前回から新規・変更されたノートのみを書き出す")
+    parser.add_argument("--log-level", choices=LOG_LEVELS, default="INFO", help="ログレベル（DEBUGでOpenAIの生応答などを表示）")
+    parser.add_argument("--metrics-prom", type=pathlib.Path, default=None, help="計測値をPrometheus textfile形式で書き出すパス")
+    cassette_group = parser.add_mutually_exclusive_group()
+    cassette_group.add_argument("--record", type=pathlib.Path, default=None, help="外部APIの通信をこのカセットファイルに記録する")
+    cassette_group.add_argument("--replay", type=pathlib.Path, default=None, help="記録済みカセットから応答を再生する（APIは呼ばない）")
+    parser.add_argument("--replay-latency", action="store_true", help="再生時に記録時のレイテンシも再現する")
     
     # YouTube専用オプション
     parser.add_argument("--frame-interval", type=int, default=5, help="フレーム抽出間隔（秒）")
     parser.add_argument("--ssim-threshold", type=float, default=0.99, help="SSIMによる重複排除のしきい値（0.90〜0.99推奨、デフォルト0.99）")
     parser.add_argument("--no-paiboon-correction", action="store_true", help="Paiboon最終修正（ChatGPT一括投げ）を行わない")
+    parser.add_argument("--stage-workers", type=parse_stage_workers, default={}, help="段ごとの並列数（例: ocr=4,correct=4,translate=2）")
+    parser.add_argument("--resume", action="store_true", help="前回中断したジョブを、ジャーナルに記録済みの結果を使って再開する")
+    parser.add_argument("--job-id", type=str, default=None, help="ジョブID（デフォルト: URLとデッキ名から生成）")
+    parser.add_argument("--dry-run", action="store_true", help="抽出・重複除去だけを行い、API呼び出し数・トークン数・費用・所要時間の見積もりを表示する")
+    parser.add_argument("--budget", type=float, default=None, help="OCR・Paiboon修正の費用上限（USD）。超える場合は新規性の低いフレームから除外する")
+    parser.add_argument("--subtitles", action="store_true", help="アップロードされた字幕（VTT/SRV）も取得し、字幕から語彙を取り出す（字幕のない時間帯だけOCR）")
+    parser.add_argument("--subtitle-file", type=pathlib.Path, nargs="+", default=[], help="手元の字幕ファイル（.vtt/.srv3など）を使う")
+    parser.add_argument("--text-gate-lines", type=int, default=0, help=f"テキスト行らしき領域がこの数未満のフレームはOCRしない（デフォルト0で無効、推奨{DEFAULT_MIN_TEXT_LINES}）")
+    parser.add_argument("--text-gate-tesseract", action="store_true", help="テキスト判定（--text-gate-lines指定時）にTesseract（タイ語）も使い、タイ文字が読めないフレームはOCRしない")
+    parser.add_argument("--known-decks", type=pathlib.Path, nargs="+", default=[], help="既存デッキ（apkg/colpkg/collection.anki2/テキスト書き出し）。ここにある語はOCR直後に除外する")
     
     args = parser.parse_args()
+    setup_logging(args.log_level)
+    setup_cassette(args.record, args.replay, args.replay_latency)
     
     # 入力ディレクトリの作成
     if args.input_dir:
@@ -80,25 +350,63 @@ def main():
     output_dir = pathlib.Path("data/output/decks")
     output_dir.mkdir(parents=True, exist_ok=True)
     
-    # 処理の実行
-    if args.youtube:
-        # 明示的にYouTubeDeckBuilderを使う
-        builder = YouTubeDeckBuilder(
-            output_dir=str(output_dir),
-            deck_name=args.deck_name,
-            ssim_threshold=args.ssim_threshold,
-            use_paiboon_correction=not args.no_paiboon_correction
-        )
-        video_path = download_video(args.youtube, output_dir)
-        apkg_path = builder.build(video_path, args.frame_interval)
-        print(f"\n✅ 生成完了: {apkg_path}")
-        builder.cleanup()
-    else:
-        process_image_table(
-            args.input_dir or args.image.parent,
-            args.deck_name,
-            args.generate_media
-        )
+    try:
+        known_vocab = load_known_vocab(args.known_decks)
+        # 処理の実行
+        if args.youtube:
+            from ..deck_builders.youtube import YouTubeDeckBuilder, download_video
+            from ..common.subtitles import find_subtitles
+            # 明示的にYouTubeDeckBuilderを使う
+            builder = YouTubeDeckBuilder(
+                output_dir=str(output_dir),
+                deck_name=args.deck_name,
+                ssim_threshold=args.ssim_threshold,
+                use_paiboon_correction=not args.no_paiboon_correction,
+                tts_workers=args.tts_workers,
+                tts_rate=args.tts_rate,
+                tts_backend=args.tts_backend,
+                audio_bitrate=args.audio_bitrate if args.compress_audio else None,
+                incremental=args.incremental,
+                stage_workers=args.stage_workers,
+                job_id=None if args.dry_run else args.job_id or job_id_for(args.youtube, args.deck_name),
+                resume=args.resume,
+                known_vocab=known_vocab,
+                text_gate_lines=args.text_gate_lines,
+                text_gate_tesseract=args.text_gate_tesseract
+            )
+            try:
+                video_path = download_video(args.youtube, output_dir, subtitles=args.subtitles)
+                subtitle_paths = args.subtitle_file + (find_subtitles(video_path) if args.subtitles else [])
+                if args.dry_run:
+                    builder.dry_run(video_path, args.frame_interval, budget=args.budget, subtitles=subtitle_paths)
+                else:
+                    apkg_path = builder.build(video_path, args.frame_interval, budget=args.budget,
+                                              subtitles=subtitle_paths)
+                    print(f"\n✅ 生成完了: {apkg_path}")
+            finally:
+                builder.cleanup()
+        else:
+            from ..deck_builders.image_table import process_image_table, watch_image_table
+            options = dict(
+                generate_media=args.generate_media,
+                tts_workers=args.tts_workers,
+                tts_rate=args.tts_rate,
+                tts_backend=args.tts_backend,
+                audio_bitrate=args.audio_bitrate if args.compress_audio else None,
+                incremental=args.incremental,
+                known_vocab=known_vocab,
+                preprocess_workers=args.preprocess_workers,
+                use_manifest=not args.reprocess,
+                tile=True if args.tile_rows else None
+            )
+            if args.watch:
+                if not args.input_dir:
+                    parser.error("--watch は --input-dir と一緒に指定してください")
+                watch_image_table(args.input_dir, args.deck_name, interval=args.watch_interval, **options)
+            else:
+                process_image_table(args.input_dir or args.image.parent, args.deck_name, **options)
+    finally:
+        write_metrics(args.metrics_prom)
 
 if __name__ == "__main__":
     cli() 
\ No newline at end of file
@@ -0,0 +1,210 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import zipfile
+import hashlib
+import pathlib
+import tempfile
+import itertools
+from typing import Dict, Iterable, List, Sequence, Set, Tuple, TypeVar
+from .dedupe import thai_vocab_key
+from .utils import atomic_output
+
+DECK_STATE_DIR = pathlib.Path("data/output/system/deck_state")
+
+T = TypeVar("T")
+
+def stable_id(key: str) -> int:
+    """文字列から実行ごとに変わらない32ビット整数IDを生成（hash()はプロセスごとにランダム化される）"""
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    return int(digest[:15], 16) % (2**31 - 1)
+
+def stable_deck_id(deck_name: str) -> int:
+    """デッキ名から決定的なデッキIDを生成"""
+    return stable_id(f"deck:{deck_name}")
+
+def note_guid(thai: str) -> str:
+    """タイ語テキストから決定的なノートGUIDを生成（再インポート時に既存ノートを更新させる）"""
+    from genanki import guid_for
+    # 表記揺れ（空白・声調記号の順序など）だけが違う語は同じノートとして扱う
+    return guid_for(thai_vocab_key(thai))
+
+def note_content_hash(fields: Sequence[str]) -> str:
+    """ノート内容のハッシュ（音声ファイル名は実行ごとに変わるので除外）"""
+    text = "\x1f".join(re.sub(r"\[sound:[^\]]*\]", "", f or "") for f in fields)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def media_refs(fields: Iterable[str]) -> Set[str]:
+    """フィールドから参照されているメディアファイル名を抽出"""
+    refs = set()
+    for f in fields:
+        refs.update(re.findall(r"\[sound:([^\]]+)\]", f or ""))
+        refs.update(re.findall(r'<img src="([^"]+)"', f or ""))
+    return refs
+
+class DeckState:
+    """インクリメンタル出力用に、前回までに書き出したノート(GUID→内容ハッシュ)を保持"""
+
+    def __init__(self, deck_name: str, state_dir: pathlib.Path = DECK_STATE_DIR):
+        safe_name = re.sub(r'[\\/:*?"<>|\s]', "_", deck_name)
+        self.path = pathlib.Path(state_dir) / f"{safe_name}.json"
+        self.notes: Dict[str, str] = {}
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                self.notes = json.load(f).get("notes", {})
+
+    def filter_changed(self, items: List[Tuple[str, Sequence[str], T]]) -> List[T]:
+        """(GUID, フィールド, 値) のうち新規または内容が変わったものの値だけを返す"""
+        return [value for guid, fields, value in items
+                if self.notes.get(guid) != note_content_hash(fields)]
+
+    def update(self, items: Iterable[Tuple[str, Sequence[str]]]) -> None:
+        for guid, fields in items:
+            self.notes[guid] = note_content_hash(fields)
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_output(self.path) as tmp_path:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"notes": self.notes}, f, ensure_ascii=False, indent=2)
+
+def thai_vocab_model():
+    """BaseDeckBuilderやマージツールが使う「Thai Vocab Model」（Thai/Phonetic/English/Audio）"""
+    from genanki import Model
+    return Model(
+        1607392319,
+        "Thai Vocab Model",
+        fields=[
+            {"name": "Thai"},
+            {"name": "Phonetic"},
+            {"name": "English"},
+            {"name": "Audio"},
+        ],
+        templates=[
+            {
+                "name": "Card1",
+                "qfmt": "<h1>{{Phonetic}}</h1>\n<h2>{{Thai}}</h2>\n<hr>\n<h1>{{Audio}}</h1>",
+                "afmt": "<h1>{{Phonetic}}</h1>\n<h2>{{English}}</h2>\n<h2>{{Thai}}</h2>\n<hr>\n<h1>{{Audio}}</h1>",
+            },
+            {
+                "name": "Card2",
+                "qfmt": "<h1>{{English}}</h1>",
+                "afmt": "<h1>{{English}}</h1>\n<h2>{{Phonetic}}</h2>\n<h2>{{Thai}}</h2>\n<hr>\n<h1>{{Audio}}</h1>",
+            },
+        ],
+        css="""h1, h2 { text-align: center; }"""
+    )
+
+class UnsupportedApkgError(ValueError):
+    """読み込めない形式のパッケージ（Anki 2.1.50以降の新形式 collection.anki21b など）"""
+
+ANKI21B_HINT = ("Anki 2.1.50以降の新形式（collection.anki21b、zstd圧縮）のパッケージは読み込めません。"
+                "Ankiの書き出しで「古いバージョンのAnkiをサポートする」をオンにして書き出し直してください")
+
+def open_apkg_collection(z: zipfile.ZipFile) -> sqlite3.Connection:
+    """apkg内のcollectionをディスクに展開せずメモリ上のSQLiteとして開く
+
+    新形式（collection.anki21b）のパッケージにあるcollection.anki2は「Ankiを更新してください」
+    というノートだけの互換用の殻なので、読まずにUnsupportedApkgErrorにする。
+    """
+    names = z.namelist()
+    if "collection.anki21b" in names and "collection.anki21" not in names:
+        raise UnsupportedApkgError(f"{z.filename}: {ANKI21B_HINT}")
+    db_name = "collection.anki21" if "collection.anki21" in names else "collection.anki2"
+    data = z.read(db_name)
+    conn = sqlite3.connect(":memory:")
+    if hasattr(conn, "deserialize"):
+        conn.deserialize(data)
+        return conn
+    # Python 3.10以前: 一時ファイル経由でメモリDBにコピー
+    with tempfile.NamedTemporaryFile(suffix=".anki2", delete=False) as f:
+        f.write(data)
+        tmp_path = f.name
+    try:
+        src = sqlite3.connect(tmp_path)
+        src.backup(conn)
+        src.close()
+    finally:
+        os.unlink(tmp_path)
+    return conn
+
+def read_apkg_media_map(z: zipfile.ZipFile) -> Dict[str, str]:
+    """apkg内のmediaマップ（zipエントリ名→ファイル名）を読み込む"""
+    for fname in ("media", "media.json"):
+        if fname in z.namelist():
+            raw = z.read(fname)
+            if not raw:
+                return {}
+            try:
+                return json.loads(raw.decode("utf-8"))
+            except UnicodeDecodeError:
+                return json.loads(raw.decode("latin1"))
+    return {}
+
+def iter_apkg_notes(conn: sqlite3.Connection) -> Iterable[Tuple[str, List[str]]]:
+    """collectionから (GUID, フィールドのリスト) を順に返す"""
+    for guid, flds in conn.execute("SELECT guid, flds FROM notes ORDER BY id"):
+        yield guid, flds.split("\x1f")
+
+def _note_rows(deck, timestamp: float, id_gen):
+    """genankiのノートからnotes/cardsテーブル用の行を生成"""
+    note_rows = []
+    card_rows = []
+    for note in deck.notes:
+        if len(note.fields) != len(note.model.fields):
+            raise ValueError(f"フィールド数がモデルと一致しません: {note.fields}")
+        note_id = next(id_gen)
+        note_rows.append((
+            note_id, note.guid, note.model.model_id, int(timestamp), -1,
+            f" {' '.join(note.tags)} " if note.tags else "", "\x1f".join(note.fields), note.sort_field, 0, 0, "",
+        ))
+        for card in note.cards:
+            card_rows.append((
+                next(id_gen), note_id, deck.deck_id, card.ord, int(timestamp), -1,
+                0, -1 if card.suspend else 0, getattr(note, "due", 0),
+                0, 0, 0, 0, 0, 0, 0, 0, "",
+            ))
+    return note_rows, card_rows
+
+def write_apkg(deck, output_path: pathlib.Path, media_paths: Iterable[str] = ()) -> pathlib.Path:
+    """apkgをストリーミングで書き出す
+
+    - collection.anki2 はノート・カードを1トランザクションのexecutemanyで一括挿入
+    - 既に圧縮済みの音声はZIP_STOREDでそのまま格納（collectionとmediaマップのみdeflate）
+    - メディアはファイルから逐次コピーするため、デッキサイズに関わらずメモリ使用量は一定
+    """
+    from genanki import Deck, Package
+    output_path = pathlib.Path(output_path)
+    timestamp = time.time()
+    id_gen = itertools.count(int(timestamp * 1000))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = pathlib.Path(tmp_dir) / "collection.anki2"
+        conn = sqlite3.connect(str(db_path))
+        try:
+            cursor = conn.cursor()
+            # スキーマ・コレクション設定・デッキ/モデル定義はgenankiに任せる（ノートなしの殻デッキ）
+            shell = Deck(deck.deck_id, deck.name, deck.description)
+            for note in deck.notes:
+                shell.add_model(note.model)
+            for model in deck.models.values():
+                shell.add_model(model)
+            Package(shell).write_to_db(cursor, timestamp, id_gen)
+            note_rows, card_rows = _note_rows(deck, timestamp, id_gen)
+            cursor.executemany("INSERT INTO notes VALUES(?,?,?,?,?,?,?,?,?,?,?)", note_rows)
+            cursor.executemany("INSERT INTO cards VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)", card_rows)
+            conn.commit()
+        finally:
+            conn.close()
+
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        media_map = {}
+        with atomic_output(output_path) as part_path:
+            with zipfile.ZipFile(part_path, "w", compression=zipfile.ZIP_DEFLATED) as z:
+                z.write(db_path, "collection.anki2", compress_type=zipfile.ZIP_DEFLATED)
+                for idx, path in enumerate(media_paths):
+                    z.write(path, str(idx), compress_type=zipfile.ZIP_STORED)
+                    media_map[str(idx)] = os.path.basename(path)
+                z.writestr("media", json.dumps(media_map), compress_type=zipfile.ZIP_DEFLATED)
+    return output_path
@@ -1,20 +1,79 @@
-import os
 import uuid
 import pathlib
-from gtts import gTTS
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple, Union
 from .utils import sanitize_filename
+from .ratelimit import RateLimiter, retry_with_backoff
+from .tts import TTSBackend, get_tts_backend
+from .metrics import METRICS
+from .cassette import replaying, synthesize
 
-def gen_audio(word: str, thai: str, out_dir: pathlib.Path) -> str:
+def tts_limiter(backend: TTSBackend, rate: Optional[float] = None) -> RateLimiter:
+    """バックエンドに応じたレートリミッタを作成（rate未指定時はバックエンドの既定値）"""
+    return RateLimiter(backend.default_rate if rate is None else rate)
+
+def gen_audio(word: str, thai: str, out_dir: pathlib.Path,
+              backend: Union[str, TTSBackend, None] = None) -> str:
     """タイ語の音声ファイルを生成する"""
+    backend = get_tts_backend(backend)
     safe_word = sanitize_filename(word)
-    fname = f"{safe_word}_{uuid.uuid4().hex[:6]}.mp3"
+    fname = f"{safe_word}_{uuid.uuid4().hex[:6]}{backend.ext}"
     out_path = out_dir / fname
     try:
         print(f"🎵 音声生成開始: {word} -> {out_path}")
-        gTTS(thai, lang="th").save(out_path)
+        synthesize(backend, thai, out_path)
         print(f"✅ 音声生成成功: {out_path}")
     except Exception as e:
         print(f"❌ 音声生成に失敗しました: {word}")
         print(f"エラー: {str(e)}")
         return ""
-    return fname  # ファイル名のみ返す 
\ No newline at end of file
+    return fname  # ファイル名のみ返す
+
+def run_tts_jobs(jobs: List[Tuple[str, pathlib.Path]],
+                 backend: Union[str, TTSBackend, None] = None,
+                 workers: Optional[int] = None,
+                 limiter: Optional[RateLimiter] = None,
+                 retries: int = 3) -> List[bool]:
+    """(テキスト, 出力パス) のリストをスレッドプールで音声化する（戻り値は入力順の成否）"""
+    if not jobs:
+        return []
+    backend = get_tts_backend(backend)
+    workers = workers or backend.default_workers
+    if limiter is None:
+        limiter = tts_limiter(backend)
+
+    def _run(job: Tuple[str, pathlib.Path]) -> bool:
+        text, out_path = job
+
+        def _attempt():
+            if not replaying():
+                limiter.acquire()
+            with METRICS.track_api(f"tts_{backend.name}"):
+                synthesize(backend, text, out_path)
+
+        try:
+            retry_with_backoff(_attempt, retries=retries, label=f"音声生成({text})")
+            print(f"✅ 音声生成成功: {out_path}")
+            return True
+        except Exception as e:
+            print(f"❌ 音声生成に失敗しました: {text}")
+            print(f"エラー: {str(e)}")
+            return False
+
+    print(f"\n🎵 音声生成開始: {len(jobs)}件 (バックエンド: {backend.name}, 並列数: {workers})")
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        results = list(pool.map(_run, jobs))
+    print(f"✅ 音声生成完了: {sum(results)}/{len(jobs)}件")
+    return results
+
+def gen_audio_batch(items: List[Tuple[str, str]], out_dir: pathlib.Path,
+                    backend: Union[str, TTSBackend, None] = None,
+                    workers: Optional[int] = None,
+                    limiter: Optional[RateLimiter] = None,
+                    retries: int = 3) -> List[str]:
+    """(単語, タイ語) のリストから音声ファイルを並列生成し、入力順のファイル名リストを返す（失敗は空文字）"""
+    backend = get_tts_backend(backend)
+    fnames = [f"{sanitize_filename(word)}_{uuid.uuid4().hex[:6]}{backend.ext}" for word, _ in items]
+    jobs = [(thai, out_dir / fname) for (_, thai), fname in zip(items, fnames)]
+    ok = run_tts_jobs(jobs, backend=backend, workers=workers, limiter=limiter, retries=retries)
+    return [fname if success else "" for fname, success in zip(fnames, ok)]
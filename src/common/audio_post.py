@@ -0,0 +1,81 @@
+import os
+import shutil
+import pathlib
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Optional, Tuple
+
+DEFAULT_AUDIO_BITRATE = "32k"
+SILENCE_THRESHOLD = "-45dB"
+
+def find_ffmpeg() -> str:
+    """ffmpegの実行ファイルを探す（PATH → moviepy同梱のimageio-ffmpegの順）"""
+    exe = shutil.which("ffmpeg")
+    if exe:
+        return exe
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        raise RuntimeError("ffmpeg が見つかりません（apt install ffmpeg などでインストールしてください）")
+
+def _silence_filter() -> str:
+    """先頭と末尾の無音を削除するフィルタ（末尾は反転して先頭として削る）"""
+    trim = f"silenceremove=start_periods=1:start_threshold={SILENCE_THRESHOLD}:start_silence=0.05"
+    return f"{trim},areverse,{trim},areverse"
+
+def _process_one(args: Tuple[str, str, str]) -> Tuple[int, int]:
+    """1ファイルを無音削除・モノラル化・再エンコードし、(処理前, 処理後)のバイト数を返す"""
+    ffmpeg, path_str, bitrate = args
+    path = pathlib.Path(path_str)
+    before = path.stat().st_size
+    out_path = path.with_name(f".post_{path.name}")
+    cmd = [ffmpeg, "-hide_banner", "-loglevel", "error", "-y", "-i", str(path),
+           "-af", _silence_filter(), "-ac", "1"]
+    if path.suffix.lower() == ".wav":
+        # wavはビットレート指定ができないのでサンプルレートで揃える
+        cmd += ["-ar", "16000", "-c:a", "pcm_s16le"]
+    else:
+        cmd += ["-ar", "22050", "-c:a", "libmp3lame", "-b:a", bitrate]
+    cmd += ["-f", "wav" if path.suffix.lower() == ".wav" else "mp3", str(out_path)]
+    try:
+        subprocess.run(cmd, check=True, capture_output=True, timeout=120)
+        after = out_path.stat().st_size
+        # 無音のみのファイルなどで空になった場合や大きくなった場合は元のまま
+        if after == 0 or after >= before:
+            return before, before
+        os.replace(out_path, path)
+        return before, after
+    finally:
+        if out_path.exists():
+            out_path.unlink()
+
+def postprocess_audio_files(paths: Iterable[pathlib.Path], bitrate: str = DEFAULT_AUDIO_BITRATE,
+                            workers: Optional[int] = None) -> int:
+    """音声ファイルをプロセスプールで後処理し、削減したバイト数を返す"""
+    paths = [pathlib.Path(p) for p in paths if pathlib.Path(p).suffix.lower() in (".mp3", ".wav")]
+    paths = [p for p in paths if p.exists()]
+    if not paths:
+        return 0
+    ffmpeg = find_ffmpeg()
+    print(f"\n🎚️ 音声後処理開始: {len(paths)}件 (ビットレート: {bitrate})")
+    total_before = 0
+    total_after = 0
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [(p, pool.submit(_process_one, (ffmpeg, str(p), bitrate))) for p in paths]
+        for p, future in futures:
+            try:
+                before, after = future.result()
+            except Exception as e:
+                print(f"⚠️ 音声後処理に失敗しました（元のまま使用）: {p.name}")
+                print(f"エラー: {str(e)}")
+                failed += 1
+                continue
+            total_before += before
+            total_after += after
+    saved = total_before - total_after
+    ratio = (saved / total_before * 100) if total_before else 0.0
+    print(f"✅ 音声後処理完了: {total_before:,} bytes → {total_after:,} bytes "
+          f"({saved:,} bytes削減, {ratio:.1f}%)" + (f" / 失敗 {failed}件" if failed else ""))
+    return saved
@@ -0,0 +1,157 @@
+import os
+import json
+import time
+import base64
+import sqlite3
+import hashlib
+import pathlib
+import threading
+import unicodedata
+from typing import Any, Callable, Optional, TypeVar
+from .tts import TTSBackend
+from .utils import atomic_output
+from .metrics import METRICS
+
+T = TypeVar("T")
+
+CASSETTE_MODES = ("off", "record", "replay")
+
+class CassetteMiss(KeyError):
+    """リプレイ時にカセットに記録がないリクエスト"""
+
+def _normalize(value: Any) -> Any:
+    """リクエストの正規化（文字列はNFC、画像のdata URLは内容ハッシュに置き換え）"""
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, str):
+        if value.startswith("data:") and ";base64," in value:
+            head, _, data = value.partition(";base64,")
+            digest = hashlib.sha256(base64.b64decode(data)).hexdigest()
+            return f"{head};sha256,{digest}"
+        return unicodedata.normalize("NFC", value)
+    return value
+
+def request_key(service: str, request: Any) -> str:
+    """正規化したリクエストのハッシュ"""
+    text = json.dumps({"service": service, "request": _normalize(request)},
+                      ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class Cassette:
+    """外部API（OpenAI・MyMemory・TTS）のリクエスト/レスポンスを記録・再生するSQLiteストア
+
+    record: 実際にAPIを呼び、結果とレイテンシを記録する
+    replay: 記録済みの結果を返し、APIは呼ばない（replay_latency=Trueなら記録時の待ち時間も再現）
+    off:    何もしない
+    """
+
+    def __init__(self, path: Optional[pathlib.Path] = None, mode: str = "off", replay_latency: bool = False):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"不正なカセットモードです: {mode}")
+        self.mode = mode
+        self.replay_latency = replay_latency
+        self.path = pathlib.Path(path) if path else None
+        self.recorded = 0
+        self.replayed = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        if mode != "off":
+            if self.path is None:
+                raise ValueError("カセットファイルのパスを指定してください")
+            if mode == "replay" and not self.path.exists():
+                raise FileNotFoundError(f"カセットが見つかりません: {self.path}")
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, service TEXT NOT NULL, request TEXT NOT NULL,"
+                " response BLOB NOT NULL, latency REAL NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+
+    def call(self, service: str, request: Any, func: Callable[[], T],
+             encode: Callable[[T], bytes] = lambda v: json.dumps(v, ensure_ascii=False).encode("utf-8"),
+             decode: Callable[[bytes], T] = lambda b: json.loads(b.decode("utf-8"))) -> T:
+        """requestに対する外部API呼び出しfuncを、モードに応じて記録・再生する"""
+        if self.mode == "off":
+            return func()
+        key = request_key(service, request)
+        if self.mode == "replay":
+            with self._lock:
+                row = self._conn.execute("SELECT response, latency FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                raise CassetteMiss(f"カセットに記録がありません: {service} {key[:12]}")
+            if self.replay_latency:
+                time.sleep(row[1])
+            with self._lock:
+                self.replayed += 1
+            return decode(row[0])
+        t0 = time.monotonic()
+        result = func()
+        latency = time.monotonic() - t0
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, service, request, response, latency, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, service, json.dumps(_normalize(request), ensure_ascii=False), encode(result),
+                 latency, time.time())
+            )
+            self._conn.commit()
+            self.recorded += 1
+        return result
+
+    def close(self) -> None:
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+                self._conn = None
+            if self.mode == "record":
+                print(f"📼 カセットに記録: {self.recorded}件 → {self.path}")
+            elif self.mode == "replay":
+                print(f"📼 カセットから再生: {self.replayed}件 ({self.path})")
+
+_active = Cassette()
+
+def use_cassette(path: Optional[pathlib.Path], mode: str, replay_latency: bool = False) -> Cassette:
+    """プロセス全体で使うカセットを設定（リプレイ時はAPIキーがなくても動くようにする）"""
+    global _active
+    _active.close()
+    _active = Cassette(path, mode, replay_latency)
+    METRICS.replaying = mode == "replay"
+    if mode == "replay":
+        os.environ.setdefault("OPENAI_API_KEY", "sk-replay")
+    return _active
+
+def get_cassette() -> Cassette:
+    return _active
+
+def replaying() -> bool:
+    """replayモードか（実際のAPIを呼ばないので、呼び出し間隔の待機やレートリミットは不要）"""
+    return _active.mode == "replay"
+
+def chat_completion(client, **kwargs):
+    """client.chat.completions.create をカセット経由で呼ぶ"""
+    def decode(raw: bytes):
+        from openai.types.chat import ChatCompletion
+        return ChatCompletion.model_validate(json.loads(raw.decode("utf-8")))
+    return _active.call(
+        "openai", kwargs, lambda: client.chat.completions.create(**kwargs),
+        encode=lambda r: json.dumps(r.model_dump(mode="json"), ensure_ascii=False).encode("utf-8"),
+        decode=decode,
+    )
+
+def synthesize(backend: TTSBackend, text: str, out_path: pathlib.Path) -> None:
+    """backend.synthesize をカセット経由で呼ぶ（音声ファイルの中身を記録・再生）"""
+    out_path = pathlib.Path(out_path)
+
+    def record() -> bytes:
+        backend.synthesize(text, out_path)
+        return out_path.read_bytes()
+
+    data = _active.call(f"tts_{backend.name}", {"text": text, "ext": backend.ext}, record,
+                        encode=lambda b: b, decode=lambda b: b)
+    if _active.mode == "replay":
+        with atomic_output(out_path) as part_path:
+            part_path.write_bytes(data)
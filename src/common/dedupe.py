@@ -0,0 +1,73 @@
+import re
+import threading
+import unicodedata
+from typing import Iterable, List, Sequence, Tuple
+from .metrics import METRICS
+
+# ゼロ幅文字（OCRやコピー元によって混入する）
+_ZERO_WIDTH_RE = re.compile("[\u200b\u200c\u200d\u2060\ufeff]")
+# 声調記号（่ ้ ๊ ๋）と、その前に来るべき上下の母音記号（ั ิ ี ึ ื ุ ู ็）
+_THAI_TONES = "\u0e48\u0e49\u0e4a\u0e4b"
+_THAI_VOWEL_MARKS = "\u0e31\u0e34\u0e35\u0e36\u0e37\u0e38\u0e39\u0e47"
+_TONE_BEFORE_VOWEL_RE = re.compile(f"([{_THAI_TONES}])([{_THAI_VOWEL_MARKS}])")
+_DOUBLE_TONE_RE = re.compile(f"([{_THAI_TONES}])\\1+")
+# ํ + (声調) + า は ำ（サラアム）と同じ
+_SARA_AM_RE = re.compile(f"\u0e4d([{_THAI_TONES}]?)\u0e32")
+# Paiboonの ue に付く声調記号は u・e のどちらに付いていても同じ（NFD上で e の後ろにそろえる）
+_UE_TONE_RE = re.compile("u([\u0300-\u036f]+)e")
+
+def thai_vocab_key(thai: str) -> str:
+    """タイ語の重複判定キー（NFC・空白とゼロ幅文字の除去・声調記号の並びの正規化）"""
+    text = unicodedata.normalize("NFC", thai or "")
+    text = _ZERO_WIDTH_RE.sub("", text)
+    text = "".join(text.split())
+    text = _SARA_AM_RE.sub("\\1\u0e33", text)
+    text = _TONE_BEFORE_VOWEL_RE.sub("\\2\\1", text)
+    text = _DOUBLE_TONE_RE.sub("\\1", text)
+    return unicodedata.normalize("NFC", text)
+
+def paiboon_vocab_key(paiboon: str) -> str:
+    """Paiboonの重複判定キー（NFD上で ʉ → ue にそろえ、声調記号の位置・小文字化・空白を正規化）"""
+    text = unicodedata.normalize("NFD", paiboon or "")
+    text = _ZERO_WIDTH_RE.sub("", text).casefold().replace("\u0289", "ue")
+    text = _UE_TONE_RE.sub("ue\\1", text)
+    return unicodedata.normalize("NFC", " ".join(text.split()))
+
+def vocab_key(thai: str, paiboon: str = "") -> str:
+    """語彙の重複判定キー（タイ語を優先し、タイ語がない行だけPaiboonで判定）"""
+    key = thai_vocab_key(thai)
+    return f"th:{key}" if key else f"pb:{paiboon_vocab_key(paiboon)}"
+
+class VocabDeduper:
+    """正規化キーによる重複排除の索引
+
+    OCR直後に照合し、表記揺れ（空白・NFC/NFD・声調記号の順序・ʉ/ue）だけが違う語を
+    Paiboon修正・翻訳・TTSの前に落とす。最初に照合した行を残す（パイプラインでは入力順に照合する）。
+    """
+
+    def __init__(self):
+        self._keys = set()
+        self._lock = threading.Lock()
+        self.removed = 0
+
+    def seen(self, thai: str, paiboon: str = "") -> bool:
+        """既出の語なら除外件数を数えてTrueを返し、初出なら登録してFalseを返す（複数スレッドから呼ばれる）"""
+        key = vocab_key(thai, paiboon)
+        with self._lock:
+            if key in self._keys:
+                self.removed += 1
+                duplicate = True
+            else:
+                self._keys.add(key)
+                duplicate = False
+        if duplicate:
+            METRICS.incr("vocab_duplicates_total")
+        return duplicate
+
+    def filter_rows(self, rows: Iterable[Sequence[str]]) -> List[Tuple[str, ...]]:
+        """(english, thai, paiboon, ...) の行から既出の語を除く"""
+        return [tuple(row) for row in rows if not self.seen(row[1], row[2])]
+
+    def report(self) -> None:
+        if self.removed:
+            print(f"🧹 表記揺れを含む重複を除外: {self.removed}件（翻訳・TTSを省略）")
@@ -0,0 +1,188 @@
+import json
+import math
+import pathlib
+from typing import Dict, List, Optional, Sequence, Tuple
+from .metrics import METRICS_DIR
+
+# 1Mトークンあたりの料金（USD、入力・出力）。料金改定時はここを更新する
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4o": (2.50, 10.00),
+}
+
+# 画像トークンの計算方式（OpenAIのVision料金の説明による）
+# 32pxパッチ方式のモデル: パッチ数（上限1536）× 係数
+PATCH_TOKEN_MULTIPLIERS: Dict[str, float] = {
+    "gpt-4.1-mini": 1.62,
+    "gpt-4.1-nano": 2.46,
+    "o4-mini": 1.72,
+}
+IMAGE_PATCH_SIZE = 32
+IMAGE_MAX_PATCHES = 1536
+# 512pxタイル方式のモデル: (基本トークン, タイルあたりのトークン)。一覧にないモデルはgpt-4oとして扱う
+TILE_TOKENS: Dict[str, Tuple[int, int]] = {
+    "gpt-4o": (85, 170),
+    "gpt-4.1": (85, 170),
+    "gpt-4o-mini": (2833, 5667),
+}
+
+# 計測結果がない場合の1リクエストあたりの想定レイテンシ（秒）
+DEFAULT_LATENCIES = {
+    "ocr": 3.0,
+    "correct": 1.5,
+    "translate": 1.0,
+    "tts": 0.8,
+}
+
+# 計測サマリーのサービス名と段の対応
+_LATENCY_SERVICES = {
+    "ocr": "openai_vision",
+    "correct": "openai_correct",
+    "translate": "mymemory",
+}
+
+# 1リクエストあたりの想定出力トークン数
+OCR_COMPLETION_TOKENS = 80
+CORRECT_COMPLETION_TOKENS = 40
+# 1件あたりの入力JSONの想定トークン数（Paiboon修正）
+CORRECT_ENTRY_TOKENS = 40
+
+def estimate_text_tokens(text: str) -> int:
+    """テキストのトークン数の概算（ASCIIは約4文字/トークン、タイ語・日本語などは約1文字/トークン）"""
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return math.ceil(ascii_chars / 4) + (len(text) - ascii_chars)
+
+def _image_patches(width: int, height: int) -> int:
+    """32pxパッチ数（上限を超える場合は上限に収まるよう縮小してから数える）"""
+    patches = math.ceil(width / IMAGE_PATCH_SIZE) * math.ceil(height / IMAGE_PATCH_SIZE)
+    if patches <= IMAGE_MAX_PATCHES:
+        return patches
+    scale = math.sqrt(IMAGE_PATCH_SIZE ** 2 * IMAGE_MAX_PATCHES / (width * height))
+    # 縮小後の幅・高さがパッチの整数倍になるよう、もう少しだけ縮める
+    w, h = width * scale / IMAGE_PATCH_SIZE, height * scale / IMAGE_PATCH_SIZE
+    scale *= min(math.floor(w) / w, math.floor(h) / h)
+    patches = math.ceil(width * scale / IMAGE_PATCH_SIZE) * math.ceil(height * scale / IMAGE_PATCH_SIZE)
+    return min(patches, IMAGE_MAX_PATCHES)
+
+def estimate_image_tokens(width: int, height: int, model: str = "gpt-4o") -> int:
+    """Vision入力の画像トークン数の概算（モデルごとの計算方式）
+
+    gpt-4.1-miniなどは32pxパッチ数×係数、gpt-4oなどは2048px以内・短辺768pxに縮小後の
+    512pxタイル数×タイルあたりのトークン＋基本トークン。
+    """
+    if model in PATCH_TOKEN_MULTIPLIERS:
+        return math.ceil(_image_patches(width, height) * PATCH_TOKEN_MULTIPLIERS[model])
+    base, per_tile = TILE_TOKENS.get(model, TILE_TOKENS["gpt-4o"])
+    scale = min(1.0, 2048 / max(width, height))
+    w, h = width * scale, height * scale
+    scale = min(1.0, 768 / min(w, h))
+    w, h = w * scale, h * scale
+    return base + per_tile * math.ceil(w / 512) * math.ceil(h / 512)
+
+def api_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    price_in, price_out = MODEL_PRICES.get(model, MODEL_PRICES["gpt-4o"])
+    return (prompt_tokens * price_in + completion_tokens * price_out) / 1_000_000
+
+def measured_latencies(metrics_dir: pathlib.Path = METRICS_DIR) -> Dict[str, float]:
+    """直近の実行の計測サマリーがあれば、その平均レイテンシで想定値を置き換える"""
+    latencies = dict(DEFAULT_LATENCIES)
+    runs = sorted(pathlib.Path(metrics_dir).glob("run_*.json")) if pathlib.Path(metrics_dir).exists() else []
+    if not runs:
+        return latencies
+    with open(runs[-1], encoding="utf-8") as f:
+        histograms = json.load(f).get("histograms", {})
+    for stage, service in _LATENCY_SERVICES.items():
+        hist = histograms.get(f"api_latency_seconds{{service={service}}}")
+        if hist and hist.get("avg"):
+            latencies[stage] = hist["avg"]
+    for key, hist in histograms.items():
+        if key.startswith("api_latency_seconds{service=tts_") and hist.get("avg"):
+            latencies["tts"] = hist["avg"]
+    return latencies
+
+def estimate_frames_run(frame_sizes: Sequence[Tuple[int, int]], ocr_prompt: str, rules_prompt: Optional[str],
+                        stage_workers: Dict[str, int], tts_rate: float, ocr_model: str = "gpt-4.1-mini",
+                        correct_model: str = "gpt-4o", subtitle_items: int = 0) -> Dict[str, float]:
+    """OCRに送るフレームから、API呼び出し数・トークン数・費用・所要時間を見積もる
+
+    各フレームから最大1件の語彙が得られる前提（上限の見積もり）。字幕の語彙（subtitle_items件）は
+    OCRを通らないが、Paiboon修正・翻訳・TTSには流れるので、その分も数える。
+    予算で削れるのはフレームだけなので、字幕の分の費用はsubtitle_cost_usdとして別に返す。所要時間は段ごとの
+    (件数×レイテンシ÷並列数) とレートリミットによる下限の大きい方で、パイプラインでは
+    段が重なって動くため全体は最も遅い段に近づく。
+    """
+    latencies = measured_latencies()
+    frames = len(frame_sizes)
+    rows = frames + subtitle_items
+    image_tokens = sum(estimate_image_tokens(w, h, ocr_model) for w, h in frame_sizes)
+    ocr_prompt_tokens = estimate_text_tokens(ocr_prompt) * frames + image_tokens
+    ocr_completion_tokens = OCR_COMPLETION_TOKENS * frames
+    correct_calls = rows if rules_prompt is not None else 0
+    correct_prompt_tokens = (estimate_text_tokens(rules_prompt) + CORRECT_ENTRY_TOKENS) * correct_calls if rules_prompt else 0
+    correct_completion_tokens = CORRECT_COMPLETION_TOKENS * correct_calls
+    ocr_cost = api_cost(ocr_model, ocr_prompt_tokens, ocr_completion_tokens)
+    correct_cost = api_cost(correct_model, correct_prompt_tokens, correct_completion_tokens)
+    subtitle_cost = correct_cost * subtitle_items / correct_calls if correct_calls else 0.0
+
+    def stage_time(name: str, calls: int, rate: float = 0.0) -> float:
+        t = calls * latencies[name] / max(1, stage_workers.get(name, 1))
+        return max(t, calls / rate) if rate else t
+
+    stage_seconds = {
+        "ocr": stage_time("ocr", frames),
+        "correct": stage_time("correct", correct_calls),
+        # 翻訳は1件ごとに0.5秒の待機が入る
+        "translate": rows * (latencies["translate"] + 0.5) / max(1, stage_workers.get("translate", 1)),
+        "tts": stage_time("tts", rows, tts_rate),
+    }
+    return {
+        "frames": frames,
+        "subtitle_items": subtitle_items,
+        "ocr_calls": frames,
+        "correct_calls": correct_calls,
+        "translate_calls": rows,
+        "tts_calls": rows,
+        "image_tokens": image_tokens,
+        "ocr_prompt_tokens": ocr_prompt_tokens,
+        "ocr_completion_tokens": ocr_completion_tokens,
+        "rules_prompt_tokens": estimate_text_tokens(rules_prompt) if rules_prompt else 0,
+        "correct_prompt_tokens": correct_prompt_tokens,
+        "correct_completion_tokens": correct_completion_tokens,
+        "ocr_cost_usd": ocr_cost,
+        "correct_cost_usd": correct_cost,
+        "cost_usd": ocr_cost + correct_cost,
+        "subtitle_cost_usd": subtitle_cost,
+        "cost_per_frame_usd": (ocr_cost + correct_cost - subtitle_cost) / frames if frames else 0.0,
+        "stage_seconds": stage_seconds,
+        "wall_seconds": max(stage_seconds.values()) if rows else 0.0,
+    }
+
+def select_within_budget(frames: List[Tuple[pathlib.Path, float]], cost_per_frame: float,
+                         budget: float) -> List[pathlib.Path]:
+    """予算内に収まるよう、新規性（直前のユニークフレームとの差）の低いフレームから落とす（順序は維持）
+
+    budgetはフレームに使える分（字幕の語彙の費用は呼び出し側で差し引いておく）。
+    """
+    if cost_per_frame <= 0:
+        return [path for path, _ in frames]
+    keep = max(0, int(budget // cost_per_frame))
+    if keep >= len(frames):
+        return [path for path, _ in frames]
+    ranked = sorted(range(len(frames)), key=lambda i: frames[i][1], reverse=True)[:keep]
+    return [frames[i][0] for i in sorted(ranked)]
+
+def print_estimate(est: Dict[str, float], budget: Optional[float] = None, dropped: int = 0) -> None:
+    print("\n🧮 実行前の見積もり（概算）")
+    print(f"  - OCRに送るフレーム: {est['frames']}枚" + (f"（予算により {dropped}枚を除外）" if dropped else ""))
+    if est.get("subtitle_items"):
+        print(f"  - 字幕の語彙: {est['subtitle_items']}件（OCRなし、修正費用 ${est['subtitle_cost_usd']:.4f}）")
+    print(f"  - API呼び出し: OCR {est['ocr_calls']} / Paiboon修正 {est['correct_calls']} / "
+          f"翻訳 {est['translate_calls']} / TTS {est['tts_calls']}")
+    print(f"  - OCRトークン: 入力 {est['ocr_prompt_tokens']:,}（うち画像 {est['image_tokens']:,}） / "
+          f"出力 {est['ocr_completion_tokens']:,}")
+    print(f"  - Paiboon修正トークン: ルールプロンプト {est['rules_prompt_tokens']:,}/件 → 入力 "
+          f"{est['correct_prompt_tokens']:,} / 出力 {est['correct_completion_tokens']:,}")
+    print(f"  - 費用: ${est['cost_usd']:.4f} (OCR ${est['ocr_cost_usd']:.4f} + 修正 ${est['correct_cost_usd']:.4f}, "
+          f"1フレームあたり ${est['cost_per_frame_usd']:.5f})" + (f" / 予算 ${budget:.4f}" if budget is not None else ""))
+    stages = ", ".join(f"{k} {v:.0f}秒" for k, v in est["stage_seconds"].items())
+    print(f"  - 所要時間: 約{est['wall_seconds']:.0f}秒（段ごと: {stages}）")
@@ -0,0 +1,234 @@
+import csv
+import time
+import sqlite3
+import pathlib
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
+from .utils import atomic_output
+from .dedupe import thai_vocab_key
+
+T = TypeVar("T")
+
+EXCEPTION_STORE_PATH = pathlib.Path("data/output/system/paiboon_exceptions.sqlite")
+# 旧形式の例外パターン（インポート・エクスポート用）
+DIFF_TSV_PATH = pathlib.Path("data/output/system/paiboon_diff.tsv")
+DIFF_FIELDS = ["thai", "gold_paiboon", "generated_paiboon", "type"]
+# キー（タイ語の正規化）の版。変えたときは開いたときに既存の行のキーを付け直す
+KEY_VERSION = 1
+
+def _row_key(row: Dict[str, str]) -> str:
+    # 生成Paiboonが同じ例外定義は新しいもので置き換え、生成Paiboonが空のものは (タイ語, 正解) ごとに持つ
+    return row["generated_paiboon"] or f"{thai_vocab_key(row['thai'])}\t{row['gold_paiboon']}"
+
+def _rekey(conn: sqlite3.Connection) -> None:
+    """全行のキーを現在の正規化で付け直す（同じキーになった行は新しいものを残す）"""
+    rows = conn.execute(
+        "SELECT seq, thai, gold_paiboon, generated_paiboon, type FROM exceptions ORDER BY seq DESC"
+    ).fetchall()
+    # 付け直しの途中でUNIQUE制約にかからないよう、いったん重ならない値にする
+    conn.execute("UPDATE exceptions SET key = '#' || seq")
+    taken = set()
+    for seq, *values in rows:
+        row = dict(zip(DIFF_FIELDS, values))
+        key = _row_key(row)
+        if key in taken:
+            conn.execute("DELETE FROM exceptions WHERE seq = ?", (seq,))
+            continue
+        taken.add(key)
+        conn.execute("UPDATE exceptions SET key = ?, thai_key = ? WHERE seq = ?",
+                     (key, thai_vocab_key(row["thai"]), seq))
+    conn.execute(f"PRAGMA user_version = {KEY_VERSION}")
+
+class ExceptionStore:
+    """Paiboon例外パターン（正解デッキとの差分）のSQLiteストア
+
+    読み出しはプロセス内にキャッシュし、DBファイルの更新時刻とサイズが変わったときだけ読み直す
+    （フレームごとのプロンプト生成でファイルを再パースしない）。書き込みはBEGIN IMMEDIATEで
+    ロックを取ったトランザクションで行うため、複数の実行が同時に書いても壊れない。
+    TSVはインポート・エクスポート用の形式としてのみ使う。
+    """
+
+    def __init__(self, path: pathlib.Path = EXCEPTION_STORE_PATH, legacy_tsv: Optional[pathlib.Path] = DIFF_TSV_PATH):
+        self.path = pathlib.Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        created = not self.path.exists()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=60,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA busy_timeout = 60000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS exceptions ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL UNIQUE, thai TEXT NOT NULL,"
+            " thai_key TEXT NOT NULL, gold_paiboon TEXT NOT NULL, generated_paiboon TEXT NOT NULL,"
+            " type TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS exceptions_thai ON exceptions (thai_key, type)")
+        self._signature = None
+        self._rows: List[Dict[str, str]] = []
+        self._keys = set()
+        self._lookup: Dict[str, str] = {}
+        self._derived: Dict[str, Any] = {}
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] < KEY_VERSION:
+            self._write(_rekey)
+        # 初回は既存のTSVを取り込む
+        if created and legacy_tsv is not None and pathlib.Path(legacy_tsv).exists():
+            count = self.import_tsv(legacy_tsv)
+            print(f"📥 例外パターンをTSVから取り込みました: {count}件 ({legacy_tsv})")
+
+    def _write(self, func):
+        """BEGIN IMMEDIATEで書き込みロックを取ってからfuncを実行"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(self._conn)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._signature = None
+            return result
+
+    def _refresh(self) -> None:
+        """DBファイルが変わっていればキャッシュを読み直す（呼び出し側でロックを取る）"""
+        try:
+            st = self.path.stat()
+            signature = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            signature = None
+        if signature is not None and signature == self._signature:
+            return
+        rows = [
+            dict(zip(DIFF_FIELDS, r)) for r in self._conn.execute(
+                "SELECT thai, gold_paiboon, generated_paiboon, type FROM exceptions ORDER BY seq"
+            )
+        ]
+        lookup = {}
+        for row in rows:
+            if row["type"] == "mismatch" and row["gold_paiboon"]:
+                lookup[thai_vocab_key(row["thai"])] = row["gold_paiboon"]
+        self._rows, self._lookup, self._derived = rows, lookup, {}
+        self._keys = {_row_key(row) for row in rows}
+        self._signature = signature
+
+    def rows(self) -> List[Dict[str, str]]:
+        """全例外パターン（登録順）"""
+        with self._lock:
+            self._refresh()
+            return self._rows
+
+    def lookup(self, thai: str) -> Optional[str]:
+        """タイ語に完全一致する例外の正解Paiboon（なければNone）"""
+        with self._lock:
+            self._refresh()
+            return self._lookup.get(thai_vocab_key(thai))
+
+    def derive(self, name: str, build: Callable[[List[Dict[str, str]]], T]) -> T:
+        """例外パターンから作る値（プロンプトなど）を、ストアが変わるまでキャッシュして返す"""
+        with self._lock:
+            self._refresh()
+            if name not in self._derived:
+                self._derived[name] = build(self._rows)
+            return self._derived[name]
+
+    def merge(self, diffs: Iterable[Tuple[str, str, Optional[str], str]]) -> int:
+        """差分 (タイ語, 正解, 生成 or None, 種別) を積み上げる（新しいものを優先）。追加・更新件数を返す"""
+        rows = [{"thai": t, "gold_paiboon": g, "generated_paiboon": p or "", "type": k} for t, g, p, k in diffs]
+        return self._upsert(rows, replace=True)
+
+    def ensure(self, rows: Iterable[Dict[str, str]]) -> int:
+        """まだ登録されていない例外パターンだけを追加する。追加件数を返す"""
+        rows = [{k: row.get(k) or "" for k in DIFF_FIELDS} for row in rows]
+        with self._lock:
+            self._refresh()
+            # すべて登録済みなら書き込みトランザクションを開かない
+            rows = [row for row in rows if _row_key(row) not in self._keys]
+        return self._upsert(rows, replace=False)
+
+    def _upsert(self, rows: Iterable[Dict[str, str]], replace: bool) -> int:
+        rows = [{k: row.get(k) or "" for k in DIFF_FIELDS} for row in rows]
+
+        def _apply(conn):
+            changed = 0
+            now = time.time()
+            for row in rows:
+                key = _row_key(row)
+                current = conn.execute(
+                    "SELECT thai, gold_paiboon, generated_paiboon, type FROM exceptions WHERE key = ?", (key,)
+                ).fetchone()
+                if current is not None and (not replace or dict(zip(DIFF_FIELDS, current)) == row):
+                    continue
+                # 置き換え時は末尾（最新）に付け直す
+                conn.execute("DELETE FROM exceptions WHERE key = ?", (key,))
+                conn.execute(
+                    "INSERT INTO exceptions (key, thai, thai_key, gold_paiboon, generated_paiboon, type, updated_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, row["thai"], thai_vocab_key(row["thai"]), row["gold_paiboon"], row["generated_paiboon"],
+                     row["type"], now)
+                )
+                changed += 1
+            return changed
+        return self._write(_apply) if rows else 0
+
+    def import_tsv(self, path: pathlib.Path = DIFF_TSV_PATH) -> int:
+        """TSV（thai, gold_paiboon, generated_paiboon, type）を取り込む。追加・更新件数を返す"""
+        with open(path, encoding="utf-8") as f:
+            rows = list(csv.DictReader(f, delimiter="\t"))
+        return self._upsert(rows, replace=True)
+
+    def export_tsv(self, path: pathlib.Path = DIFF_TSV_PATH) -> int:
+        """全例外パターンをTSVにアトミックに書き出す。書き出した件数を返す"""
+        rows = self.rows()
+        path = pathlib.Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_output(path) as part_path:
+            with open(part_path, "w", encoding="utf-8", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=DIFF_FIELDS, delimiter="\t")
+                writer.writeheader()
+                writer.writerows(rows)
+        return len(rows)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+def peek_rows(extra: Iterable[Dict[str, str]] = (), path: pathlib.Path = EXCEPTION_STORE_PATH,
+              legacy_tsv: Optional[pathlib.Path] = DIFF_TSV_PATH) -> List[Dict[str, str]]:
+    """ストアを作成・変更せずに、ensure(extra)した後と同じ全例外パターンを返す（--dry-run用）
+
+    ストアがまだなければ、初回に取り込まれるはずの旧TSVを読む。
+    """
+    path = pathlib.Path(path)
+    rows: Dict[str, Dict[str, str]] = {}
+    if path.exists():
+        conn = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True)
+        try:
+            found = [dict(zip(DIFF_FIELDS, r)) for r in conn.execute(
+                "SELECT thai, gold_paiboon, generated_paiboon, type FROM exceptions ORDER BY seq"
+            )]
+        finally:
+            conn.close()
+    elif legacy_tsv is not None and pathlib.Path(legacy_tsv).exists():
+        with open(legacy_tsv, encoding="utf-8") as f:
+            found = list(csv.DictReader(f, delimiter="\t"))
+    else:
+        found = []
+    for row in found:
+        row = {k: row.get(k) or "" for k in DIFF_FIELDS}
+        # import_tsvと同じく、同じキーは新しいもので置き換えて末尾に付け直す
+        rows.pop(_row_key(row), None)
+        rows[_row_key(row)] = row
+    for row in extra:
+        row = {k: row.get(k) or "" for k in DIFF_FIELDS}
+        rows.setdefault(_row_key(row), row)
+    return list(rows.values())
+
+_store: Optional[ExceptionStore] = None
+_store_lock = threading.Lock()
+
+def get_exception_store() -> ExceptionStore:
+    """プロセス全体で共有する例外パターンストア"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ExceptionStore()
+        return _store
@@ -0,0 +1,91 @@
+import pathlib
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, Optional, Tuple
+from .metrics import METRICS
+from .text_gate import TextGate
+
+if TYPE_CHECKING:
+    import numpy as np
+
+class FrameScanner:
+    """動画のフレーム読み出しとSSIMによる重複除去（APIを使わない前段、ビルダーとキュー登録で共通）
+
+    重複除去は直前のユニークフレームとの比較なので入力順に依存する。パイプラインでは並列数1の段で使う。
+    text_gateを渡すと、テキストが写っていないフレームも保存せずに落とす。
+    """
+
+    def __init__(self, out_dir: pathlib.Path, ssim_threshold: float = 0.99, text_gate: Optional[TextGate] = None):
+        self.out_dir = pathlib.Path(out_dir)
+        self.ssim_threshold = ssim_threshold
+        self.text_gate = text_gate
+        self.reset()
+
+    def reset(self) -> None:
+        self._prev_gray = None
+        # ユニークフレームごとの新規性（1 - 直前のユニークフレームとのSSIM、先頭は1.0）
+        self.novelty: Dict[pathlib.Path, float] = {}
+        # 字幕でカバーされているため読み飛ばしたフレーム数
+        self.subtitle_skipped = 0
+        if self.text_gate is not None:
+            self.text_gate.checked = self.text_gate.skipped = 0
+
+    def iter_frames(self, video_path: pathlib.Path, interval: int = 1,
+                    skip: Optional[Callable[[float], bool]] = None) -> Iterator[Tuple[int, "np.ndarray"]]:
+        """動画から一定間隔でフレームを1枚ずつ読み出す（(フレーム番号, 画像) を返すジェネレータ）
+
+        skip(秒)がTrueの時刻（字幕でカバーされている時間帯）のフレームは読み飛ばす。
+        """
+        import cv2
+        cap = cv2.VideoCapture(str(video_path))
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        frame_count = 0
+        try:
+            while cap.isOpened():
+                ret, frame = cap.read()
+                if not ret:
+                    break
+
+                if frame_count % interval == 0:
+                    if skip is not None and fps and skip(frame_count / fps):
+                        self.subtitle_skipped += 1
+                        METRICS.incr("subtitle_skipped_frames_total")
+                    else:
+                        yield frame_count, frame
+
+                frame_count += 1
+        finally:
+            cap.release()
+
+    def save(self, frame_count: int, frame: "np.ndarray") -> pathlib.Path:
+        """フレームをJPEGで保存"""
+        import cv2
+        frame_path = self.out_dir / f"frame_{frame_count:04d}.jpg"
+        cv2.imwrite(str(frame_path), frame)
+        return frame_path
+
+    def dedupe(self, frame_item: Tuple[int, "np.ndarray"]) -> Optional[pathlib.Path]:
+        """直前のユニークフレームとSSIMを比較し、新しいフレームのみ保存して返す"""
+        import cv2
+        from skimage.metrics import structural_similarity as ssim
+        frame_count, frame = frame_item
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        novelty = 1.0
+        if self._prev_gray is not None:
+            score = ssim(gray, self._prev_gray)
+            if score >= self.ssim_threshold:
+                return None
+            novelty = 1.0 - score
+        self._prev_gray = gray
+        # テキストのない場面は、似たフレームが続いても判定は場面ごとに1回で済む
+        if self.text_gate is not None and not self.text_gate.passes(frame):
+            return None
+        frame_path = self.save(frame_count, frame)
+        self.novelty[frame_path] = novelty
+        return frame_path
+
+    def scan(self, video_path: pathlib.Path, interval: int = 1,
+             skip: Optional[Callable[[float], bool]] = None) -> Iterator[Tuple[int, pathlib.Path]]:
+        """読み出しと重複除去をまとめて行い、残ったフレームの (フレーム番号, 保存先) を返す"""
+        for frame_count, frame in self.iter_frames(video_path, interval, skip):
+            frame_path = self.dedupe((frame_count, frame))
+            if frame_path is not None:
+                yield frame_count, frame_path
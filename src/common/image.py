@@ -1,36 +1,53 @@
+import io
+import os
 import pathlib
-from typing import Optional
-from PIL import Image, UnidentifiedImageError, ImageOps
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Optional, Tuple
 
-def load_and_convert_image(img_path: pathlib.Path) -> Optional[Image.Image]:
-    """画像を読み込んで適切な形式に変換する"""
+if TYPE_CHECKING:
+    from PIL import Image
+
+# 対応する画像形式（JPEG/PNG以外はメモリ上でJPEGに変換してOCRに渡す）
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif", ".tif", ".tiff")
+MAX_IMAGE_SIZE = 4000
+JPEG_QUALITY = 95
+
+def list_image_files(input_dir: pathlib.Path) -> List[pathlib.Path]:
+    """ディレクトリ内の画像ファイル（以前の版が書き出したtemp_*は除く）"""
+    return sorted(
+        p for p in pathlib.Path(input_dir).iterdir()
+        if p.suffix.lower() in IMAGE_SUFFIXES and not p.name.startswith("temp_")
+    )
+
+def _normalize(img: "Image.Image", img_path: pathlib.Path) -> Tuple["Image.Image", bool]:
+    """向きの補正・RGB化・リサイズを行い、(画像, 変更したか) を返す"""
+    from PIL import Image, ImageOps
+    changed = False
+    # EXIFのOrientationが回転・反転を指定している場合のみ向きを補正
+    if img.getexif().get(0x0112, 1) != 1:
+        img = ImageOps.exif_transpose(img)
+        changed = True
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+        changed = True
+    if img.size[0] > MAX_IMAGE_SIZE or img.size[1] > MAX_IMAGE_SIZE:
+        print(f"⚠️ 画像サイズが大きすぎます: {img.size} ({img_path})")
+        print("リサイズします")
+        img.thumbnail((MAX_IMAGE_SIZE, MAX_IMAGE_SIZE), Image.Resampling.LANCZOS)
+        changed = True
+    return img, changed
+
+def load_and_convert_image(img_path: pathlib.Path) -> Optional["Image.Image"]:
+    """画像を読み込んで適切な形式に変換する（入力ディレクトリには何も書かない）"""
+    from PIL import Image, UnidentifiedImageError
     try:
-        # 画像を開く
         with Image.open(img_path) as img:
-            # 画像の形式を確認
             if img.format not in ['JPEG', 'PNG']:
                 print(f"⚠️ 非推奨の画像形式です: {img.format} ({img_path})")
-                print("JPEGまたはPNG形式に変換します")
-                # 一時ファイルに変換して保存
-                temp_path = img_path.parent / f"temp_{img_path.stem}.jpg"
-                img = img.convert('RGB')
-                img.save(temp_path, 'JPEG', quality=95)
-                img_path = temp_path
-                print(f"✅ 変換完了: {temp_path}")
-            
-            # 画像をRGBモードに変換
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            
-            # 画像の向きを自動修正
-            img = ImageOps.exif_transpose(img)
-            
-            # 画像のサイズを確認
-            if img.size[0] > 4000 or img.size[1] > 4000:
-                print(f"⚠️ 画像サイズが大きすぎます: {img.size} ({img_path})")
-                print("リサイズします")
-                img.thumbnail((4000, 4000), Image.Resampling.LANCZOS)
-            
+                print("メモリ上でRGBに変換します")
+            img.load()
+            img, _ = _normalize(img, img_path)
             return img
     except UnidentifiedImageError:
         print(f"❌ 画像形式が認識できません: {img_path}")
@@ -41,8 +58,62 @@ def load_and_convert_image(img_path: pathlib.Path) -> Optional[Image.Image]:
         print(f"エラー: {str(e)}")
         return None
 
-def preprocess_image_for_ocr(img: Image.Image) -> Image.Image:
+def prepare_image_bytes(img_path: str) -> Tuple[str, Optional[bytes], Optional[str]]:
+    """画像をデコード・向き補正・RGB化・リサイズし、OCRに送るバイト列にする（プロセスプールで実行）
+
+    JPEG/PNGで変更が不要な場合は元のバイト列をそのまま返す。(パス, バイト列 or None, エラー) を返す。
+    """
+    from PIL import Image, UnidentifiedImageError
+    path = pathlib.Path(img_path)
+    try:
+        raw = path.read_bytes()
+        with Image.open(io.BytesIO(raw)) as img:
+            fmt = img.format
+            img.load()
+            img, changed = _normalize(img, path)
+            if fmt in ("JPEG", "PNG") and not changed:
+                return img_path, raw, None
+            buf = io.BytesIO()
+            img.save(buf, "JPEG", quality=JPEG_QUALITY)
+            return img_path, buf.getvalue(), None
+    except UnidentifiedImageError:
+        return img_path, None, "画像形式が認識できません（破損しているか、サポートされていない形式です）"
+    except Exception as e:
+        return img_path, None, f"{type(e).__name__}: {e}"
+
+def iter_prepared_images(paths: Iterable[pathlib.Path], workers: Optional[int] = None,
+                         max_in_flight: Optional[int] = None) -> Iterator[Tuple[pathlib.Path, Optional[bytes], Optional[str]]]:
+    """画像の前処理をプロセスプールで並列に行い、入力順に (パス, バイト列, エラー) を返す
+
+    デコード済みの画像を溜め込まないよう、先読みはmax_in_flight件（デフォルト: 並列数の2倍）までにする。
+    """
+    paths = [pathlib.Path(p) for p in paths]
+    if not paths:
+        return
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max(1, max_in_flight or workers * 2)
+    with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as pool:
+        pending = deque()
+        remaining = iter(paths)
+        for path in remaining:
+            pending.append((path, pool.submit(prepare_image_bytes, str(path))))
+            if len(pending) >= max_in_flight:
+                break
+        while pending:
+            path, future = pending.popleft()
+            try:
+                _, data, error = future.result()
+            except Exception as e:
+                data, error = None, f"{type(e).__name__}: {e}"
+            # 1件受け取ったら1件補充する
+            nxt = next(remaining, None)
+            if nxt is not None:
+                pending.append((nxt, pool.submit(prepare_image_bytes, str(nxt))))
+            yield path, data, error
+
+def preprocess_image_for_ocr(img: "Image.Image") -> "Image.Image":
     """OCR用に画像を前処理（グレースケール化・二値化・リサイズ）"""
+    from PIL import Image, ImageOps
     # グレースケール化
     img = img.convert('L')
     # リサイズ（幅が2000pxを超える場合は2000pxに縮小）
@@ -61,4 +132,4 @@ def preprocess_image_for_ocr(img: Image.Image) -> Image.Image:
     except Exception:
         # numpyがなければImageOpsで簡易二値化
         img = ImageOps.autocontrast(img)
-    return img 
\ No newline at end of file
+    return img
@@ -0,0 +1,153 @@
+import json
+import time
+import hashlib
+import pathlib
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from .utils import atomic_output
+
+INGEST_MANIFEST_DIR = pathlib.Path("data/output/system/ingest")
+HASH_CHUNK_SIZE = 1 << 20
+# process_image_table（画像表デッキ）のOCR
+DEFAULT_VARIANT = "image_table"
+
+Row = Tuple[str, str, str]
+
+def file_sha1(path: pathlib.Path) -> str:
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def manifest_path_for(input_dir: pathlib.Path, manifest_dir: pathlib.Path = INGEST_MANIFEST_DIR,
+                      variant: str = DEFAULT_VARIANT) -> pathlib.Path:
+    """入力ディレクトリ・作り手ごとのマニフェストの保存先（入力ディレクトリ自体には書き込まない）
+
+    variantはOCRの方式（プロンプト・分割の有無など）を表す名前。同じ画像でも方式が違えば
+    抽出される行が違うので、別のマニフェストに記録して互いの行を再利用しない。
+    """
+    resolved = pathlib.Path(input_dir).resolve()
+    digest = hashlib.sha1(str(resolved).encode("utf-8")).hexdigest()[:12]
+    return pathlib.Path(manifest_dir) / f"{resolved.name or 'root'}_{digest}_{variant}.json"
+
+class IngestManifest:
+    """処理済み画像のマニフェスト（ファイル名 → サイズ・更新時刻・内容ハッシュ・抽出した行）
+
+    サイズと更新時刻が同じファイルはハッシュも計算せずに前回の行を使う。変わっていれば
+    ハッシュを比べ、内容が同じ（コピーやtouchのみ）なら行を再利用、違えば再OCRの対象にする。
+    名前が変わっただけのファイルも内容ハッシュで前回の行を見つける。
+    書き出したデッキごとに、ビルド時のオプションのハッシュも記録する（オプションが変われば作り直す）。
+    """
+
+    def __init__(self, input_dir: pathlib.Path, path: Optional[pathlib.Path] = None,
+                 variant: str = DEFAULT_VARIANT):
+        self.input_dir = pathlib.Path(input_dir)
+        self.path = pathlib.Path(path) if path else manifest_path_for(self.input_dir, variant=variant)
+        self.files: Dict[str, Dict] = {}
+        # デッキの出力先 → ビルド時のオプションのハッシュ
+        self.builds: Dict[str, str] = {}
+        # plan()で調べた新規・変更ファイルの (stat, ハッシュ)。OCR中に書き換わっても次回に再処理される
+        self._pending: Dict[pathlib.Path, Tuple[object, str]] = {}
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.files = data.get("files", {})
+            self.builds = data.get("builds", {})
+
+    def _by_hash(self) -> Dict[str, List[List[str]]]:
+        return {entry["sha1"]: entry["rows"] for entry in self.files.values()}
+
+    def plan(self, paths: Iterable[pathlib.Path]) -> Tuple[Dict[pathlib.Path, List[Row]], List[pathlib.Path]]:
+        """(前回の行を使えるファイル → 行, 新規・変更されたファイル) に分ける"""
+        cached: Dict[pathlib.Path, List[Row]] = {}
+        todo: List[pathlib.Path] = []
+        by_hash = None
+        for path in paths:
+            st = path.stat()
+            entry = self.files.get(path.name)
+            if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+                cached[path] = [tuple(row) for row in entry["rows"]]
+                continue
+            sha1 = file_sha1(path)
+            if by_hash is None:
+                by_hash = self._by_hash()
+            if sha1 in by_hash:
+                rows = by_hash[sha1]
+                self._set(path, st, sha1, rows)
+                cached[path] = [tuple(row) for row in rows]
+            else:
+                self._pending[path] = (st, sha1)
+                todo.append(path)
+        return cached, todo
+
+    def _set(self, path: pathlib.Path, st, sha1: str, rows) -> None:
+        self.files[path.name] = {
+            "size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha1": sha1,
+            "rows": [list(row) for row in rows], "processed_at": time.time(),
+        }
+
+    def record(self, path: pathlib.Path, rows: List[Row]) -> None:
+        """OCR結果を記録する（行が取れなかった画像はAPIエラーの可能性があるので記録せず、次回も処理する）"""
+        if not rows:
+            return
+        st, sha1 = self._pending.pop(path, None) or (path.stat(), file_sha1(path))
+        self._set(path, st, sha1, rows)
+
+    def prune(self, paths: Iterable[pathlib.Path]) -> int:
+        """ディレクトリから消えたファイルの記録を削除し、件数を返す"""
+        names = {p.name for p in paths}
+        removed = [name for name in self.files if name not in names]
+        for name in removed:
+            del self.files[name]
+        return len(removed)
+
+    def built_with(self, output_path: pathlib.Path, options_hash: str) -> bool:
+        """output_pathのデッキが同じオプションで書き出されていればTrue"""
+        output_path = pathlib.Path(output_path)
+        return output_path.exists() and self.builds.get(str(output_path.resolve())) == options_hash
+
+    def record_build(self, output_path: pathlib.Path, options_hash: str) -> None:
+        self.builds[str(pathlib.Path(output_path).resolve())] = options_hash
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_output(self.path) as tmp_path:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"input_dir": str(self.input_dir.resolve()), "files": self.files, "builds": self.builds},
+                          f, ensure_ascii=False, indent=2)
+
+def dir_snapshot(paths: Iterable[pathlib.Path]) -> Dict[str, Tuple[int, int]]:
+    """ファイル名 → (サイズ, 更新時刻) の一覧（--watchで変化の検出に使う）"""
+    snapshot = {}
+    for p in paths:
+        try:
+            st = p.stat()
+        except FileNotFoundError:
+            continue
+        snapshot[p.name] = (st.st_size, st.st_mtime_ns)
+    return snapshot
+
+def watch_directory(list_files: Callable[[], List[pathlib.Path]], on_change: Callable[[], None],
+                    interval: float = 10.0) -> None:
+    """ディレクトリを定期的に調べ、ファイルが増えたり変わったりしたらon_changeを呼ぶ（Ctrl+Cで終了）
+
+    コピー途中のファイルを拾わないよう、2回続けて同じ状態だったときだけ処理する。
+    """
+    processed = dir_snapshot(list_files())
+    previous = processed
+    print(f"👀 監視を開始しました（{interval:g}秒ごと、Ctrl+Cで終了）")
+    try:
+        while True:
+            time.sleep(interval)
+            current = dir_snapshot(list_files())
+            if current != processed and current == previous:
+                added = len(set(current) - set(processed))
+                print(f"\n🔔 変更を検出しました（新規 {added}件）")
+                on_change()
+                processed = current
+            previous = current
+    except KeyboardInterrupt:
+        print("\n👋 監視を終了しました")
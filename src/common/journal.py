@@ -0,0 +1,103 @@
+import json
+import time
+import sqlite3
+import hashlib
+import pathlib
+import threading
+from typing import Any, Callable, Optional, Tuple
+from .metrics import METRICS
+
+JOURNAL_PATH = pathlib.Path("data/output/system/journal.sqlite")
+JOBS_DIR = pathlib.Path("data/output/system/jobs")
+
+# decodeがこれを返すと記録を無効とみなして再実行する
+MISSING = object()
+
+def job_id_for(*parts: str) -> str:
+    """デッキ名や入力ソースから決定的なジョブIDを生成"""
+    key = "\x1f".join(str(p) for p in parts)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+
+class Journal:
+    """ジョブID×段×アイテムIDごとに各段の出力を記録するSQLiteジャーナル
+
+    各段の結果は完了した時点でコミットされるため、途中で落ちても--resumeで完了済みの
+    API呼び出し（OCR・修正・翻訳・TTS）を飛ばして再開できる。
+    """
+
+    def __init__(self, job_id: str, resume: bool = False, path: pathlib.Path = JOURNAL_PATH):
+        self.job_id = job_id
+        self.path = pathlib.Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " job_id TEXT NOT NULL, stage TEXT NOT NULL, item_id TEXT NOT NULL,"
+            " output TEXT, created_at REAL NOT NULL,"
+            " PRIMARY KEY (job_id, stage, item_id))"
+        )
+        self._conn.commit()
+        self.hits = 0
+        if not resume:
+            self.clear()
+        else:
+            count = self._conn.execute("SELECT COUNT(*) FROM entries WHERE job_id = ?", (job_id,)).fetchone()[0]
+            print(f"🔁 ジャーナルから再開: job={job_id} (記録済み {count}件)")
+
+    @property
+    def work_dir(self) -> pathlib.Path:
+        """再開時にも残しておく作業ディレクトリ（フレーム・音声）"""
+        return JOBS_DIR / self.job_id
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE job_id = ?", (self.job_id,))
+            self._conn.commit()
+
+    def get(self, stage: str, item_id: str) -> Tuple[bool, Any]:
+        """記録済みの出力を返す（(見つかったか, 値)）"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT output FROM entries WHERE job_id = ? AND stage = ? AND item_id = ?",
+                (self.job_id, stage, item_id)
+            ).fetchone()
+        if row is None:
+            return False, None
+        return True, json.loads(row[0])
+
+    def put(self, stage: str, item_id: str, value: Any) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (job_id, stage, item_id, output, created_at) VALUES (?, ?, ?, ?, ?)",
+                (self.job_id, stage, item_id, json.dumps(value, ensure_ascii=False), time.time())
+            )
+            self._conn.commit()
+
+    def wrap(self, stage: str, key: Callable[[Any], str], func: Callable[[Any], Any],
+             encode: Callable[[Any], Any] = lambda v: v,
+             decode: Callable[[Any], Any] = lambda v: v) -> Callable[[Any], Any]:
+        """段の関数を、記録済みなら再利用・未記録なら実行して記録する関数に包む
+
+        decodeがMISSINGを返した場合（音声ファイルが消えているなど）は再実行する。
+        """
+        def run(item):
+            item_id = key(item)
+            found, stored = self.get(stage, item_id)
+            if found:
+                value = decode(stored)
+                if value is not MISSING:
+                    with self._lock:
+                        self.hits += 1
+                    METRICS.cache("journal", True)
+                    return value
+            METRICS.cache("journal", False)
+            value = func(item)
+            self.put(stage, item_id, encode(value))
+            return value
+        return run
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
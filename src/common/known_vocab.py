@@ -0,0 +1,109 @@
+import re
+import csv
+import sqlite3
+import zipfile
+import hashlib
+import pathlib
+import threading
+from typing import Iterable, Iterator, Optional, Sequence
+from .apkg import ANKI21B_HINT, UnsupportedApkgError, open_apkg_collection, iter_apkg_notes
+from .dedupe import thai_vocab_key
+from .metrics import METRICS
+
+THAI_RE = re.compile(r"[\u0E00-\u0E7F]")
+_TAG_RE = re.compile(r"<[^>]+>|\[sound:[^\]]*\]|&nbsp;")
+
+def thai_field(fields: Sequence[str]) -> Optional[str]:
+    """ノートのフィールドのうち、最初にタイ文字を含むもの（HTMLタグ・音声参照は除去）"""
+    for field in fields:
+        text = _TAG_RE.sub(" ", field)
+        if THAI_RE.search(text):
+            return text
+    return None
+
+def _iter_collection(conn: sqlite3.Connection) -> Iterator[str]:
+    for _, fields in iter_apkg_notes(conn):
+        thai = thai_field(fields)
+        if thai:
+            yield thai
+
+def iter_known_thai(path: pathlib.Path) -> Iterator[str]:
+    """apkg/colpkg・Ankiのcollectionファイル・テキスト書き出し（TSV/CSV/TXT）からタイ語を順に返す
+
+    新形式（collection.anki21b）はUnsupportedApkgError（既知語彙が空のまま進めないよう、スキップせずに止める）。
+    """
+    path = pathlib.Path(path)
+    suffix = path.suffix.lower()
+    if suffix in (".apkg", ".colpkg"):
+        with zipfile.ZipFile(path) as z:
+            conn = open_apkg_collection(z)
+        try:
+            yield from _iter_collection(conn)
+        finally:
+            conn.close()
+    elif suffix == ".anki21b":
+        raise UnsupportedApkgError(f"{path}: {ANKI21B_HINT}")
+    elif suffix in (".anki2", ".anki21"):
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            yield from _iter_collection(conn)
+        finally:
+            conn.close()
+    else:
+        # Ankiの「ノートをプレーンテキストで書き出す」形式（#で始まる行はヘッダ）
+        delimiter = "," if suffix == ".csv" else "\t"
+        with open(path, encoding="utf-8", newline="") as f:
+            for row in csv.reader(f, delimiter=delimiter):
+                if not row or row[0].startswith("#"):
+                    continue
+                thai = thai_field(row)
+                if thai:
+                    yield thai
+
+class KnownVocab:
+    """既存デッキにあるタイ語の索引（正規化したタイ語のハッシュ集合）
+
+    OCR直後に照合し、既にカードがある語をPaiboon修正・翻訳・TTSの前に落とす。
+    """
+
+    def __init__(self, keys: Iterable[str] = ()):
+        self._keys = {thai_vocab_key(k) for k in keys}
+        self._lock = threading.Lock()
+        self.skipped = 0
+
+    @classmethod
+    def load(cls, paths: Iterable[pathlib.Path]) -> "KnownVocab":
+        vocab = cls()
+        for path in paths:
+            before = len(vocab)
+            vocab._keys.update(thai_vocab_key(t) for t in iter_known_thai(path))
+            print(f"📚 既知語彙を読み込み: {path} (+{len(vocab) - before}語)")
+        return vocab
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def fingerprint(self) -> str:
+        """索引の内容のハッシュ（既存デッキが変わったかの判定用）"""
+        return hashlib.sha1("\n".join(sorted(self._keys)).encode("utf-8")).hexdigest()
+
+    def __contains__(self, thai: str) -> bool:
+        return thai_vocab_key(thai) in self._keys
+
+    def seen(self, thai: str) -> bool:
+        """既知の語ならスキップ件数を数えてTrueを返す（複数スレッドから呼ばれる）"""
+        if thai and thai_vocab_key(thai) in self._keys:
+            with self._lock:
+                self.skipped += 1
+            METRICS.incr("known_vocab_skipped_total")
+            return True
+        return False
+
+    def report(self) -> None:
+        if self.skipped:
+            print(f"📚 既知語彙のためスキップ: {self.skipped}件（修正・翻訳・TTSを省略）")
+
+def load_known_vocab(paths: Optional[Iterable[pathlib.Path]]) -> Optional[KnownVocab]:
+    """指定がなければNone"""
+    paths = [pathlib.Path(p) for p in (paths or [])]
+    return KnownVocab.load(paths) if paths else None
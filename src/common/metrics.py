@@ -0,0 +1,233 @@
+import json
+import time
+import bisect
+import logging
+import pathlib
+import datetime
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+from .utils import atomic_output
+
+METRICS_DIR = pathlib.Path("data/output/system/metrics")
+
+# API・段の処理時間用のヒストグラム境界（秒）
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+
+Labels = Tuple[Tuple[str, str], ...]
+
+def setup_logging(level: str = "INFO") -> None:
+    """ログレベルを設定（DEBUGでOpenAIの生応答などの詳細ログも出す）"""
+    logging.basicConfig(level=getattr(logging, level.upper(), logging.INFO),
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+class Histogram:
+    """累積バケット付きのヒストグラム（Prometheus形式で出力できる）"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """バケット境界からの近似分位点"""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets + (self.max,), self.counts):
+            seen += n
+            if seen >= target:
+                return bound
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 4),
+            "avg": round(self.sum / self.count, 4) if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": {str(b): n for b, n in zip(self.buckets + ("+Inf",), self.counts)},
+        }
+
+class ApiCall:
+    """track_apiのブロック内で応答のトークン使用量を記録するためのハンドル"""
+
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def usage(self, response) -> None:
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            self.prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+            self.completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+
+class Metrics:
+    """実行中の計測値（段ごとの時間・APIレイテンシ・リクエスト数・トークン・キャッシュ）を集計する"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # カセットのreplayモード中はAPI呼び出しの計測にmode=replayを付け、実際の呼び出しと区別する
+        self.replaying = False
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters: Dict[Tuple[str, Labels], float] = {}
+            self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+            self.started_at = time.time()
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, Any]) -> Tuple[str, Labels]:
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def incr(self, name: str, value: float = 1, **labels) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        """ブロックの経過時間をヒストグラムに記録"""
+        t0 = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - t0, **labels)
+
+    @contextmanager
+    def track_api(self, service: str, bytes_sent: int = 0) -> Iterator[ApiCall]:
+        """外部API呼び出しのレイテンシ・成否・トークン数・送信バイト数を記録"""
+        labels = {"service": service, "mode": "replay"} if self.replaying else {"service": service}
+        call = ApiCall()
+        t0 = time.monotonic()
+        status = "ok"
+        try:
+            yield call
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            self.observe("api_latency_seconds", time.monotonic() - t0, **labels)
+            self.incr("api_requests_total", status=status, **labels)
+            if bytes_sent:
+                self.incr("api_bytes_sent_total", bytes_sent, **labels)
+            if call.prompt_tokens:
+                self.incr("api_prompt_tokens_total", call.prompt_tokens, **labels)
+            if call.completion_tokens:
+                self.incr("api_completion_tokens_total", call.completion_tokens, **labels)
+
+    def has_data(self) -> bool:
+        """何か計測されたか（API呼び出しや段の処理がないコマンドでは書き出さない）"""
+        with self._lock:
+            return bool(self.counters or self.histograms)
+
+    def cache(self, name: str, hit: bool) -> None:
+        self.incr("cache_requests_total", cache=name, result="hit" if hit else "miss")
+
+    def summary(self) -> Dict[str, Any]:
+        """JSON向けの集計（キャッシュはヒット率も付ける）"""
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = {k: h.to_dict() for k, h in self.histograms.items()}
+        def fmt(key):
+            name, labels = key
+            return name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else "")
+        caches: Dict[str, Dict[str, float]] = {}
+        for (name, labels), value in counters.items():
+            if name == "cache_requests_total":
+                d = dict(labels)
+                caches.setdefault(d["cache"], {"hit": 0, "miss": 0})[d["result"]] += value
+        for stats in caches.values():
+            total = stats["hit"] + stats["miss"]
+            stats["hit_rate"] = round(stats["hit"] / total, 4) if total else None
+        return {
+            "started_at": datetime.datetime.fromtimestamp(self.started_at).isoformat(timespec="seconds"),
+            "elapsed_seconds": round(time.time() - self.started_at, 2),
+            "counters": {fmt(k): v for k, v in sorted(counters.items())},
+            "histograms": {fmt(k): v for k, v in sorted(histograms.items())},
+            "caches": caches,
+        }
+
+    def write_json(self, path: Optional[pathlib.Path] = None) -> pathlib.Path:
+        """実行ごとのサマリーをJSONで保存"""
+        if path is None:
+            ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            path = METRICS_DIR / f"run_{ts}.json"
+        path = pathlib.Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, ensure_ascii=False, indent=2)
+        return path
+
+    def write_prometheus(self, path: pathlib.Path) -> pathlib.Path:
+        """node_exporterのtextfileコレクタ用の形式で保存（アトミックに置き換え）"""
+        def labels_str(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+            items = labels + extra
+            return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}" if items else ""
+        lines = []
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items(), key=lambda kv: kv[0])
+        typed = set()
+        for (name, labels), value in counters:
+            metric = f"anki_ocr_{name}"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f"{metric}{labels_str(labels)} {value}")
+        for (name, labels), hist in histograms:
+            metric = f"anki_ocr_{name}"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} histogram")
+                typed.add(metric)
+            cumulative = 0
+            for bound, n in zip(hist.buckets + ("+Inf",), hist.counts):
+                cumulative += n
+                lines.append(f"{metric}_bucket{labels_str(labels, (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{metric}_sum{labels_str(labels)} {hist.sum}")
+            lines.append(f"{metric}_count{labels_str(labels)} {hist.count}")
+        path = pathlib.Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_output(path) as tmp_path:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+        return path
+
+    def report(self) -> None:
+        """主要な値を表示"""
+        s = self.summary()
+        print(f"\n📈 計測サマリー ({s['elapsed_seconds']}秒)")
+        for key, value in s["counters"].items():
+            if not key.startswith("cache_requests_total"):
+                print(f"  - {key}: {value:g}")
+        for key, hist in s["histograms"].items():
+            print(f"  - {key}: {hist['count']}件 平均{hist['avg']}秒 p95≈{hist['p95']}秒 最大{hist['max']:.2f}秒")
+        for name, stats in s["caches"].items():
+            print(f"  - キャッシュ {name}: ヒット {stats['hit']:g} / ミス {stats['miss']:g} (ヒット率 {stats['hit_rate']})")
+
+# プロセス全体で共有する計測レジストリ
+METRICS = Metrics()
@@ -2,13 +2,22 @@ import os
 import re
 import json
 import base64
-import openai
-from typing import List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
 import pathlib
 from dotenv import load_dotenv
-from .image import load_and_convert_image, preprocess_image_for_ocr
 import shutil
+import logging
 import datetime
+from .metrics import METRICS
+from .cassette import chat_completion
+from .tiling import split_row_bands, stitch_band_rows
+from .dedupe import paiboon_vocab_key
+
+logger = logging.getLogger(__name__)
+
+# 1枚の表を帯に分割したときに同時に送るリクエスト数
+BAND_WORKERS = 4
 
 # .envファイルを読み込む
 load_dotenv()
@@ -48,37 +57,110 @@ def save_invalid_frame(img_path, reason):
     shutil.copy(img_path, out_path)
     print(f"⚠️ 無効画像を保存: {out_path}")
 
-def ocr_and_process(img_path: pathlib.Path, media_dir: pathlib.Path) -> List[Tuple[str, str, str]]:
-    """OpenAI o3モデルで画像からThai, Paiboon, Englishを抽出"""
+def _image_mime(data: bytes) -> str:
+    return "image/png" if data.startswith(b"\x89PNG") else "image/jpeg"
+
+def _split_bands(image_bytes: bytes, min_bands: int = 1) -> List[bytes]:
+    try:
+        return split_row_bands(image_bytes, min_bands=min_bands)
+    except ImportError:
+        logger.debug("OpenCVがないため行の帯に分割せずに送ります")
+        return [image_bytes]
+
+def openai_client():
+    """OPENAI_API_KEYからクライアントを作る（未設定ならメッセージを出してNone）
+
+    作成には接続プールの準備などのコストがかかるので、呼び出し側で1回作って画像間で使い回す。
+    """
+    import openai
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         print("❌ OPENAI_API_KEYが設定されていません")
         print("⚠️ .envファイルにOPENAI_API_KEYを設定してください")
+        return None
+    return openai.OpenAI(api_key=api_key)
+
+def ocr_and_process(img_path: pathlib.Path, media_dir: pathlib.Path,
+                    image_bytes: Optional[bytes] = None, tile: Optional[bool] = None,
+                    band_workers: int = BAND_WORKERS, client=None) -> List[Tuple[str, str, str]]:
+    """OpenAI o3モデルで画像からThai, Paiboon, Englishを抽出
+
+    image_bytesを渡すと（前処理済みの画像など）ファイルを読まずにそれを送る。img_pathはログ用。
+    表は罫線・余白で行の帯に分割し、帯ごとに並列でOCRしてからつなぐことができる。
+    tile=Noneなら1回で送り、応答がmax_completion_tokensで途中で切れたときだけ帯に分けて再試行する。
+    tile=Trueなら縦に長い表を最初から帯に分け、tile=Falseなら分割しない。
+    clientを渡すとそれを使う（渡さなければ呼び出しごとに作る）。
+    """
+    client = client or openai_client()
+    if client is None:
         return []
-    client = openai.OpenAI(api_key=api_key)
-    with open(img_path, "rb") as image_file:
-        b64_image = base64.b64encode(image_file.read()).decode("utf-8")
+    if image_bytes is None:
+        with open(img_path, "rb") as image_file:
+            image_bytes = image_file.read()
+    bands = _split_bands(image_bytes) if tile else [image_bytes]
+    if len(bands) == 1:
+        rows, truncated = _ocr_table_image(client, bands[0], img_path)
+        if not truncated or tile is not None:
+            return rows
+        bands = _split_bands(image_bytes, min_bands=2)
+        if len(bands) == 1:
+            return rows
+        print("🧩 応答が途中で切れたため、行の帯に分けて再試行します")
+
+    print(f"🧩 行の帯に分割しました: {len(bands)}件（並列にOCR）")
+    METRICS.incr("ocr_bands_total", len(bands))
+    with ThreadPoolExecutor(max_workers=max(1, min(band_workers, len(bands)))) as pool:
+        band_rows = list(pool.map(lambda band: _ocr_table_image(client, band, img_path, banded=True)[0], bands))
+    rows, overlapped = stitch_band_rows(band_rows)
+    if overlapped:
+        print(f"🧵 帯の重なりで重複した行を除外: {overlapped}件")
+    # 帯をまたいだPaiboon重複排除（1回で送った場合と同じ結果にそろえる）
+    results = []
+    seen_paiboon = set()
+    for row in rows:
+        key = paiboon_vocab_key(row[2])
+        if key in seen_paiboon:
+            continue
+        seen_paiboon.add(key)
+        results.append(row)
+    return results
+
+def _ocr_table_image(client, image_bytes: bytes, img_path: pathlib.Path,
+                     banded: bool = False) -> Tuple[List[Tuple[str, str, str]], bool]:
+    """表の画像（または帯）1枚をOCRし、((english, thai, paiboon) の行, 応答が途中で切れたか) を返す"""
+    b64_image = base64.b64encode(image_bytes).decode("utf-8")
+    mime = _image_mime(image_bytes)
     prompt = (
         "この画像は語学学習用の表です。各行から「タイ語」「Paiboon式ローマ字」「英語の意味」を抽出し、"
         "JSON形式で出力してください。特にPaiboon式ローマ字の抽出は画像に忠実になるよう注意してください。例: [{\"thai\": \"...\", \"paiboon\": \"...\", \"english\": \"...\"}, ...]"
     )
+    if banded:
+        prompt += "\nこの画像は表を行ごとに分割した一部です。先頭の行は列の見出しなので、列の対応に使い、出力には含めないでください。"
+    truncated = False
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",  # o3モデルを使用
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant."},
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{b64_image}"}}
-                    ]
-                }
-            ],
-            max_completion_tokens=2048
-        )
+        with METRICS.track_api("openai_vision", bytes_sent=len(b64_image)) as call:
+            response = chat_completion(
+                client,
+                model="gpt-4o",  # o3モデルを使用
+                messages=[
+                    {"role": "system", "content": "You are a helpful assistant."},
+                    {
+                        "role": "user",
+                        "content": [
+                            {"type": "text", "text": prompt},
+                            {"type": "image_url", "image_url": {"url": f"data:{mime};base64,{b64_image}"}}
+                        ]
+                    }
+                ],
+                max_completion_tokens=2048
+            )
+            call.usage(response)
         content = response.choices[0].message.content
-        print(content)  # デバッグ用に出力を保持
+        logger.debug("OpenAI応答: %s", content)
+        if response.choices[0].finish_reason == "length":
+            print(f"⚠️ OpenAI応答がトークン上限で途中で切れました: {img_path}")
+            METRICS.incr("ocr_truncated_total")
+            truncated = True
         json_match = re.search(r'```json\n(.*?)\n```', content, re.DOTALL)
         if json_match:
             json_str = json_match.group(1)
@@ -86,7 +168,7 @@ def ocr_and_process(img_path: pathlib.Path, media_dir: pathlib.Path) -> List[Tup
             json_match = re.search(r'\[[\s\S]*\]', content)
             if not json_match:
                 print("❌ OpenAI応答にJSONが見つかりませんでした")
-                return []
+                return [], truncated
             json_str = json_match.group(0)
         try:
             table = json.loads(json_str)
@@ -112,30 +194,21 @@ def ocr_and_process(img_path: pathlib.Path, media_dir: pathlib.Path) -> List[Tup
                 seen_paiboon.add(paiboon)
                 results.append((english, thai, paiboon))
                 print(f"✅ 処理成功: {english} | {thai} | {paiboon}")
-            return results
+            return results, truncated
         except json.JSONDecodeError as e:
             print(f"❌ JSONの解析に失敗しました: {str(e)}")
-            return []
+            return [], truncated
     except Exception as e:
         print(f"❌ OpenAI APIでの処理に失敗しました: {img_path}")
         print(f"エラー: {str(e)}")
-        return []
+        return [], truncated
 
-def ocr_and_process_youtube_frame(img_path: pathlib.Path, media_dir: pathlib.Path) -> List[Tuple[str, str, str]]:
-    """YouTubeフレーム用のプロンプトでOCR処理"""
-    from dotenv import load_dotenv
-    load_dotenv()
-    import os
-    import base64
-    import openai
-    import re
-    import json
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        print("❌ OPENAI_API_KEYが設定されていません")
-        print("⚠️ .envファイルにOPENAI_API_KEYを設定してください")
+def ocr_and_process_youtube_frame(img_path: pathlib.Path, media_dir: pathlib.Path,
+                                  client=None) -> List[Tuple[str, str, str]]:
+    """YouTubeフレーム用のプロンプトでOCR処理（clientを渡すとそれを使う）"""
+    client = client or openai_client()
+    if client is None:
         return []
-    client = openai.OpenAI(api_key=api_key)
     with open(img_path, "rb") as image_file:
         b64_image = base64.b64encode(image_file.read()).decode("utf-8")
     prompt = (
@@ -143,22 +216,25 @@ def ocr_and_process_youtube_frame(img_path: pathlib.Path, media_dir: pathlib.Pat
         "JSON形式で出力してください。その3要素が揃っていない画像は無視してださい。例: [{\"thai\": \"...\", \"paiboon\": \"...\", \"meaning\": \"...\"}, ...]"
     )
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant."},
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{b64_image}"}}
-                    ]
-                }
-            ],
-            max_completion_tokens=2048
-        )
+        with METRICS.track_api("openai_vision", bytes_sent=len(b64_image)) as call:
+            response = chat_completion(
+                client,
+                model="gpt-4o",
+                messages=[
+                    {"role": "system", "content": "You are a helpful assistant."},
+                    {
+                        "role": "user",
+                        "content": [
+                            {"type": "text", "text": prompt},
+                            {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{b64_image}"}}
+                        ]
+                    }
+                ],
+                max_completion_tokens=2048
+            )
+            call.usage(response)
         content = response.choices[0].message.content
-        print(content)  # デバッグ用
+        logger.debug("OpenAI応答: %s", content)
         json_match = re.search(r'```json\n(.*?)\n```', content, re.DOTALL)
         if json_match:
             json_str = json_match.group(1)
@@ -0,0 +1,221 @@
+import time
+import heapq
+import queue
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from .metrics import METRICS
+
+_DONE = object()
+
+class Stage:
+    """パイプラインの1段（独自の並列数と入力キューを持つ）
+
+    funcの戻り値がNoneの場合はその要素を破棄する。flatten=Trueの場合は戻り値のリストを
+    要素ごとに次段へ流す。入力順に依存する処理（前フレームとの比較など）は、
+    その段と上流の段をすべてworkers=1にするか、ordered=Trueにすること。
+    ordered=Trueの段には、上流の並列数に関係なく入力順で要素を渡す（workers=1で使う）。
+    """
+
+    def __init__(self, name: str, func: Callable[[Any], Any], workers: int = 1,
+                 queue_size: int = 32, flatten: bool = False, ordered: bool = False):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.flatten = flatten
+        self.ordered = ordered
+        self.processed = 0
+        self.emitted = 0
+        self.dropped = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.max_depth = 0
+        self._depth_total = 0
+        self._depth_samples = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _record(self, depth: int, elapsed: float, emitted: int, error: bool) -> None:
+        with self._lock:
+            if self.started_at is None:
+                self.started_at = time.monotonic() - elapsed
+            self.processed += 1
+            self.emitted += emitted
+            if error:
+                self.errors += 1
+            elif not emitted:
+                self.dropped += 1
+            self.busy_seconds += elapsed
+            self.max_depth = max(self.max_depth, depth)
+            self._depth_total += depth
+            self._depth_samples += 1
+
+    @property
+    def wall_seconds(self) -> float:
+        if self.started_at is None or self.finished_at is None:
+            return 0.0
+        return self.finished_at - self.started_at
+
+    @property
+    def throughput(self) -> float:
+        """1秒あたりの処理件数（この段の稼働時間ベース）"""
+        wall = self.wall_seconds
+        return self.processed / wall if wall > 0 else 0.0
+
+    @property
+    def avg_depth(self) -> float:
+        return self._depth_total / self._depth_samples if self._depth_samples else 0.0
+
+class _Sequencer:
+    """ordered=Trueの段の入口で、届いた要素を入力順に並べ直す
+
+    上流に残っている要素の数を入力の通し番号ごとに数え、それより前の番号の要素がすべて
+    届いた（または上流で破棄された）ものから順に段のキューへ入れる。
+    """
+
+    def __init__(self, out_q: "queue.Queue"):
+        self.out_q = out_q
+        self._live: Dict[int, int] = {}
+        self._buffer: List[Tuple[Tuple[int, ...], Any]] = []
+        self._lock = threading.Lock()
+
+    def add(self, head: int) -> None:
+        """上流に要素が1つ増えた"""
+        with self._lock:
+            self._live[head] = self._live.get(head, 0) + 1
+
+    def arrive(self, seq: Tuple[int, ...], value: Any) -> None:
+        with self._lock:
+            heapq.heappush(self._buffer, (seq, value))
+
+    def done(self, head: int) -> None:
+        """上流の段が要素を1つ処理し終えた（出力はadd/arriveで数え済み）"""
+        with self._lock:
+            self._live[head] -= 1
+            if not self._live[head]:
+                del self._live[head]
+            floor = min(self._live) if self._live else None
+            while self._buffer and (floor is None or self._buffer[0][0][0] < floor):
+                self.out_q.put(heapq.heappop(self._buffer))
+
+class Pipeline:
+    """段同士を有界キューでつなぎ、ネットワーク待ちとCPU処理を重ねて実行する"""
+
+    def __init__(self, stages: List[Stage], name: str = "pipeline"):
+        self.stages = stages
+        self.name = name
+        self.source_seconds = 0.0
+        self.wall_seconds = 0.0
+
+    def run(self, source: Iterable[Any]) -> List[Any]:
+        """sourceの各要素を全段に通し、最終段の出力を入力順で返す"""
+        queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        # ordered=Trueの段（先頭以外）の手前で並べ直す
+        sequencers = {idx: _Sequencer(queues[idx]) for idx, stage in enumerate(self.stages)
+                      if stage.ordered and idx > 0}
+        results = []
+        results_lock = threading.Lock()
+        started = time.monotonic()
+        feeder_error = []
+
+        def feed():
+            t0 = time.monotonic()
+            try:
+                for seq, item in enumerate(source):
+                    for sequencer in sequencers.values():
+                        sequencer.add(seq)
+                    queues[0].put(((seq,), item))
+            except Exception as e:
+                feeder_error.append(e)
+            finally:
+                self.source_seconds = time.monotonic() - t0
+                for _ in range(self.stages[0].workers):
+                    queues[0].put(_DONE)
+
+        def make_worker(idx: int, remaining: List[int]):
+            stage = self.stages[idx]
+            in_q = queues[idx]
+            out_q = queues[idx + 1] if idx + 1 < len(queues) else None
+            # この段より下流で並べ直す段のうち、すぐ次の段と、さらに先の段
+            arriving = sequencers.get(idx + 1)
+            upstream_of = [s for k, s in sequencers.items() if k > idx + 1]
+
+            def emit(seq, value):
+                for sequencer in upstream_of:
+                    sequencer.add(seq[0])
+                if arriving is not None:
+                    arriving.arrive(seq, value)
+                elif out_q is not None:
+                    out_q.put((seq, value))
+                else:
+                    with results_lock:
+                        results.append((seq, value))
+
+            def work():
+                while True:
+                    msg = in_q.get()
+                    if msg is _DONE:
+                        with stage._lock:
+                            remaining[0] -= 1
+                            last = remaining[0] == 0
+                            if last:
+                                stage.finished_at = time.monotonic()
+                        if last and out_q is not None:
+                            for _ in range(self.stages[idx + 1].workers):
+                                out_q.put(_DONE)
+                        return
+                    seq, item = msg
+                    depth = in_q.qsize()
+                    t0 = time.monotonic()
+                    emitted = 0
+                    error = False
+                    try:
+                        value = stage.func(item)
+                        if value is not None:
+                            if stage.flatten:
+                                for sub, v in enumerate(value):
+                                    emit(seq + (sub,), v)
+                                    emitted += 1
+                            else:
+                                emit(seq, value)
+                                emitted = 1
+                    except Exception as e:
+                        error = True
+                        print(f"⚠️ [{stage.name}] 処理中にエラーが発生: {str(e)}")
+                    for sequencer in upstream_of + ([arriving] if arriving is not None else []):
+                        sequencer.done(seq[0])
+                    elapsed = time.monotonic() - t0
+                    stage._record(depth, elapsed, emitted, error)
+                    METRICS.observe("stage_item_seconds", elapsed, stage=stage.name)
+                    if error:
+                        METRICS.incr("stage_errors_total", stage=stage.name)
+            return work
+
+        threads = [threading.Thread(target=feed, name=f"{self.name}-source", daemon=True)]
+        for idx, stage in enumerate(self.stages):
+            remaining = [stage.workers]
+            for n in range(stage.workers):
+                threads.append(threading.Thread(target=make_worker(idx, remaining),
+                                                name=f"{self.name}-{stage.name}-{n}", daemon=True))
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.wall_seconds = time.monotonic() - started
+        for stage in self.stages:
+            METRICS.incr("stage_wall_seconds_total", stage.wall_seconds, stage=stage.name)
+            METRICS.incr("stage_items_total", stage.processed, stage=stage.name)
+        if feeder_error:
+            raise feeder_error[0]
+        results.sort(key=lambda r: r[0])
+        return [value for _, value in results]
+
+    def report(self) -> None:
+        """段ごとのスループットとキュー深さを表示"""
+        print(f"\n📊 パイプライン統計: {self.name} (全体 {self.wall_seconds:.1f}秒, 入力 {self.source_seconds:.1f}秒)")
+        for stage in self.stages:
+            print(f"  - {stage.name:<10} 並列{stage.workers:>2} | 処理 {stage.processed:>5}件 "
+                  f"(出力 {stage.emitted}, 破棄 {stage.dropped}, エラー {stage.errors}) | "
+                  f"{stage.throughput:6.2f}件/秒 | 稼働 {stage.busy_seconds:6.1f}秒 | "
+                  f"キュー深さ 平均{stage.avg_depth:.1f}/最大{stage.max_depth}")
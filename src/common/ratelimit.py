@@ -0,0 +1,45 @@
+import time
+import random
+import threading
+from typing import Callable, TypeVar
+from .metrics import METRICS
+
+T = TypeVar("T")
+
+class RateLimiter:
+    """スレッド間で共有するレートリミッタ（1秒あたりのリクエスト数を制限）"""
+
+    def __init__(self, rate: float):
+        # rateが0以下の場合は制限なし
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def acquire(self) -> None:
+        """次のリクエスト枠まで待機する"""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        wait = slot - now
+        if wait > 0:
+            time.sleep(wait)
+
+def retry_with_backoff(func: Callable[[], T], retries: int = 3, base_delay: float = 1.0,
+                       max_delay: float = 30.0, label: str = "") -> T:
+    """指数バックオフ（ジッター付き）でリトライしながら関数を実行"""
+    attempt = 0
+    while True:
+        try:
+            return func()
+        except Exception as e:
+            if attempt >= retries:
+                raise
+            delay = min(max_delay, base_delay * (2 ** attempt))
+            delay *= 0.5 + random.random() / 2
+            attempt += 1
+            METRICS.incr("retries_total")
+            print(f"⚠️ {label}失敗: {e} ({delay:.1f}秒後にリトライ {attempt}/{retries})")
+            time.sleep(delay)
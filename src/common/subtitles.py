@@ -0,0 +1,157 @@
+import re
+import html
+import bisect
+import pathlib
+import unicodedata
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# (開始秒, 終了秒, テキスト)
+Cue = Tuple[float, float, str]
+
+SUBTITLE_SUFFIXES = (".vtt", ".srv1", ".srv2", ".srv3", ".xml")
+# yt-dlpで取得する字幕の言語（アップロードされた字幕のみ、自動生成字幕は使わない）
+# 英語字幕はPaiboonと見分けにくいので取得しない
+DEFAULT_SUBTITLE_LANGS = ["th", "ja"]
+
+_THAI_RE = re.compile(r"[\u0E00-\u0E7F]")
+_LATIN_RE = re.compile(r"[A-Za-z\u00C0-\u024F\u0250-\u02AF]")
+# Paiboon式に特有の文字（ɛ ɔ ə ʉ ŋ と声調記号）
+_PAIBOON_MARK_RE = re.compile(r"[\u025B\u0254\u0259\u0289\u014B\u0300-\u036F]")
+_TIMESTAMP_RE = re.compile(r"(?:(\d+):)?(\d{1,2}):(\d{2})[.,](\d{3})")
+_TAG_RE = re.compile(r"<[^>]*>")
+_SPLIT_RE = re.compile(r"\s*[|｜/／]\s*")
+
+def _seconds(stamp: str) -> float:
+    m = _TIMESTAMP_RE.fullmatch(stamp.strip())
+    if not m:
+        raise ValueError(f"タイムスタンプの形式が不正です: {stamp}")
+    hours, minutes, seconds, millis = m.groups()
+    return int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds) + int(millis) / 1000
+
+def _clean(text: str) -> str:
+    return html.unescape(_TAG_RE.sub("", text)).strip()
+
+def parse_vtt(text: str) -> List[Cue]:
+    """WebVTTをキューのリストにする（NOTE/STYLE/REGIONブロック・キューID・タグは無視）"""
+    cues = []
+    for block in re.split(r"\n\s*\n", text.replace("\r\n", "\n").replace("\r", "\n")):
+        lines = [line for line in block.split("\n") if line.strip()]
+        idx = next((i for i, line in enumerate(lines) if "-->" in line), None)
+        if idx is None:
+            continue
+        start, _, rest = lines[idx].partition("-->")
+        try:
+            begin = _seconds(start)
+            end = _seconds(rest.split()[0])
+        except (ValueError, IndexError):
+            continue
+        body = "\n".join(filter(None, (_clean(line) for line in lines[idx + 1:])))
+        if body:
+            cues.append((begin, end, body))
+    return cues
+
+def parse_srv(text: str) -> List[Cue]:
+    """YouTubeのXML字幕（srv1: <text start dur>、srv2/srv3: <p t d>、単位はsrv1が秒、それ以外はミリ秒）"""
+    root = ET.fromstring(text)
+    cues = []
+    for node in root.iter():
+        if node.tag == "text" and "start" in node.attrib:
+            begin = float(node.attrib["start"])
+            end = begin + float(node.attrib.get("dur", 0))
+        elif node.tag == "p" and "t" in node.attrib:
+            begin = int(node.attrib["t"]) / 1000
+            end = begin + int(node.attrib.get("d", 0)) / 1000
+        else:
+            continue
+        body = "\n".join(filter(None, (_clean(line) for line in "".join(node.itertext()).split("\n"))))
+        if body:
+            cues.append((begin, end, body))
+    return cues
+
+def load_cues(path: pathlib.Path) -> List[Cue]:
+    path = pathlib.Path(path)
+    text = path.read_text(encoding="utf-8")
+    if path.suffix.lower() == ".vtt" or text.lstrip("\ufeff").startswith("WEBVTT"):
+        return parse_vtt(text)
+    return parse_srv(text)
+
+def cue_to_triple(text: str) -> Optional[Tuple[str, str, str]]:
+    """キューの本文から (意味, タイ語, Paiboon) を取り出す（タイ語とPaiboonがなければNone）
+
+    行ごと（1行しかなければ | や / で区切った部分ごと）に、タイ文字を含むものをタイ語、
+    ラテン文字だけのもののうちPaiboon特有の文字・声調記号を含むものをPaiboon、残りの最初のものを意味とする。
+    記号のないラテン文字（英語の字幕など）はPaiboonとみなさない（そのキューの時間帯はOCRする）。
+    """
+    parts = [p.strip() for p in text.split("\n") if p.strip()]
+    if len(parts) == 1:
+        parts = [p for p in _SPLIT_RE.split(parts[0]) if p]
+    thai = next((p for p in parts if _THAI_RE.search(p)), "")
+    latin = [p for p in parts if not _THAI_RE.search(p) and _LATIN_RE.search(p)
+             and not re.search(r"[\u3040-\u30FF\u4E00-\u9FFF]", p)]
+    paiboon = next((p for p in latin if _PAIBOON_MARK_RE.search(unicodedata.normalize("NFD", p))), "")
+    if not thai or not paiboon:
+        return None
+    meaning = next((p for p in parts if p not in (thai, paiboon)), "")
+    return meaning, thai, paiboon
+
+def merge_tracks(tracks: Iterable[List[Cue]]) -> List[Cue]:
+    """言語ごとの字幕トラック（タイ語・日本語など別ファイル）を、同じ時間範囲のキューごとに1つの本文にまとめる"""
+    merged: Dict[Tuple[float, float], List[str]] = {}
+    for cues in tracks:
+        for begin, end, text in cues:
+            lines = merged.setdefault((round(begin, 1), round(end, 1)), [])
+            if text not in lines:
+                lines.append(text)
+    return [(begin, end, "\n".join(lines)) for (begin, end), lines in sorted(merged.items())]
+
+class CueIndex:
+    """語彙を取り出せたキューの時間範囲（フレームの時刻がどれかのキューに含まれるかを二分探索で判定）"""
+
+    def __init__(self, cues: Iterable[Cue]):
+        self.items: List[Dict[str, str]] = []
+        spans = []
+        for begin, end, text in sorted(cues):
+            triple = cue_to_triple(text)
+            if triple is None:
+                continue
+            meaning, thai, paiboon = triple
+            self.items.append({"meaning": meaning, "thai": thai, "paiboon": paiboon})
+            spans.append((begin, end))
+        # 重なる範囲をまとめておく
+        merged: List[List[float]] = []
+        for begin, end in spans:
+            if merged and begin <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([begin, end])
+        self._starts = [b for b, _ in merged]
+        self._ends = [e for _, e in merged]
+
+    @classmethod
+    def load(cls, paths: Sequence[pathlib.Path]) -> "CueIndex":
+        tracks = []
+        for path in paths:
+            loaded = load_cues(path)
+            print(f"💬 字幕を読み込み: {path} ({len(loaded)}キュー)")
+            tracks.append(loaded)
+        index = cls(merge_tracks(tracks))
+        print(f"💬 字幕から取り出した語彙: {len(index)}件（{index.covered_seconds:.0f}秒分のフレームはOCRしない）")
+        return index
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def covers(self, seconds: float) -> bool:
+        i = bisect.bisect_right(self._starts, seconds) - 1
+        return i >= 0 and seconds < self._ends[i]
+
+    @property
+    def covered_seconds(self) -> float:
+        return sum(e - b for b, e in zip(self._starts, self._ends))
+
+def find_subtitles(video_path: pathlib.Path) -> List[pathlib.Path]:
+    """download_videoが動画の隣に保存した字幕ファイル（<id>.<lang>.vtt など）"""
+    video_path = pathlib.Path(video_path)
+    return sorted(p for p in video_path.parent.glob(f"{video_path.stem}.*")
+                  if p.suffix.lower() in SUBTITLE_SUFFIXES)
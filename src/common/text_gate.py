@@ -0,0 +1,106 @@
+import re
+import logging
+import threading
+from typing import TYPE_CHECKING, List, Optional, Tuple
+from .metrics import METRICS
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 判定を有効にするときの推奨値（語彙フレームは タイ語・Paiboon・意味 の3行が普通）。
+# 判定は既定では無効で、--text-gate-lines を指定したときだけ行う
+DEFAULT_MIN_TEXT_LINES = 2
+# 判定は縮小した画像で行う（幅px）
+GATE_WIDTH = 640
+_THAI_RE = re.compile(r"[\u0E00-\u0E7F]")
+
+def text_line_boxes(gray: "np.ndarray") -> List[Tuple[int, int, int, int]]:
+    """グレースケール画像からテキスト行らしき領域 (x, y, w, h) を返す
+
+    モルフォロジー勾配で文字の輪郭を強調し、横方向に閉じて文字を行にまとめ、
+    横長・適度な高さ・適度な充填率の領域だけを残す。
+    """
+    import cv2
+    import numpy as np
+    height, width = gray.shape[:2]
+    grad = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+    _, binary = cv2.threshold(grad, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    connected = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (15, 3)))
+    contours, _ = cv2.findContours(connected, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    boxes = []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        if not (height * 0.02 <= h <= height * 0.25 and w >= width * 0.05 and w >= h * 1.5):
+            continue
+        fill = float(np.count_nonzero(binary[y:y + h, x:x + w])) / (w * h)
+        if 0.15 <= fill <= 0.9:
+            boxes.append((x, y, w, h))
+    return boxes
+
+def _tesseract_has_thai(image: "np.ndarray", min_chars: int = 2) -> Optional[bool]:
+    """Tesseract（tha）で軽く読んでタイ文字があるか調べる（pytesseractやタイ語データがなければNone）"""
+    try:
+        import pytesseract
+        text = pytesseract.image_to_string(image, lang="tha", config="--psm 6")
+    except Exception as e:
+        logger.debug("Tesseractによる判定を使えません: %s", e)
+        return None
+    return len(_THAI_RE.findall(text)) >= min_chars
+
+class TextGate:
+    """OCRの前に、フレームにテキスト（タイ語）が写っていそうかをローカルで判定する
+
+    OpenCVのテキスト行検出でmin_lines行未満のフレーム（イントロ・話者の映像・場面転換など）は
+    Vision APIに送らない。use_tesseract=Trueなら、さらにTesseractでタイ文字が読めないフレームも落とす
+    （pytesseractやタイ語の言語データがなければOpenCVの判定だけを使う）。
+    """
+
+    def __init__(self, min_lines: int = DEFAULT_MIN_TEXT_LINES, use_tesseract: bool = False):
+        self.min_lines = min_lines
+        self.use_tesseract = use_tesseract
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.skipped = 0
+        self._tesseract_warned = False
+
+    def count_lines(self, frame: "np.ndarray") -> int:
+        """縮小した画像で数えたテキスト行の数"""
+        import cv2
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if gray.shape[1] > GATE_WIDTH:
+            scale = GATE_WIDTH / gray.shape[1]
+            gray = cv2.resize(gray, (GATE_WIDTH, max(1, int(gray.shape[0] * scale))), interpolation=cv2.INTER_AREA)
+        return len(text_line_boxes(gray))
+
+    def passes(self, frame: "np.ndarray") -> bool:
+        """OCRに送るべきならTrue（落としたフレームは件数を数える、複数スレッドから呼ばれる）"""
+        lines = self.count_lines(frame)
+        ok = lines >= self.min_lines
+        if ok and self.use_tesseract:
+            has_thai = _tesseract_has_thai(frame)
+            if has_thai is None:
+                if not self._tesseract_warned:
+                    print("⚠️ Tesseract（タイ語）が使えないため、OpenCVのテキスト行検出だけで判定します")
+                    self._tesseract_warned = True
+            else:
+                ok = has_thai
+        with self._lock:
+            self.checked += 1
+            if not ok:
+                self.skipped += 1
+        if not ok:
+            METRICS.incr("text_gate_skipped_total")
+            logger.debug("テキストなしと判定: lines=%d", lines)
+        return ok
+
+    def passes_file(self, path) -> bool:
+        import cv2
+        frame = cv2.imread(str(path))
+        # 読めない画像は判定せずOCRに任せる
+        return True if frame is None else self.passes(frame)
+
+    def report(self) -> None:
+        if self.checked:
+            print(f"🚦 テキストなしと判定してOCRを省略: {self.skipped}/{self.checked}フレーム")
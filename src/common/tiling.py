@@ -0,0 +1,126 @@
+from typing import TYPE_CHECKING, Iterable, List, Sequence, Tuple
+from .dedupe import paiboon_vocab_key, thai_vocab_key
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# この高さ（px）以下の画像は分割せず1回で送る
+MAX_BAND_HEIGHT = 1200
+# 罫線・余白が見つからず固定位置で切る場合に、前の帯と重ねる高さ（px）
+BAND_OVERLAP = 80
+# 罫線とみなす横方向の連続長（画像幅に対する割合）
+RULE_MIN_WIDTH = 0.5
+# 余白とみなす行のインク量（画像幅に対する割合）
+BLANK_INK_RATIO = 0.005
+# 2番目以降の帯の先頭に付ける見出し行の最大の高さ（帯の高さに対する割合）
+HEADER_MAX_RATIO = 0.25
+
+def find_row_cuts(gray: "np.ndarray") -> List[int]:
+    """表の行の切れ目になるy座標（横罫線の中央・行間の余白の中央）を返す"""
+    import cv2
+    import numpy as np
+    height, width = gray.shape[:2]
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    # 横に長い成分だけを残して横罫線を検出
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(1, int(width * RULE_MIN_WIDTH)), 1))
+    rules = cv2.morphologyEx(binary, cv2.MORPH_OPEN, kernel)
+    is_rule = (rules > 0).sum(axis=1) >= width * RULE_MIN_WIDTH
+    # 罫線を除いたインク量がほぼ0の行は余白
+    ink = ((binary > 0) & (rules == 0)).sum(axis=1)
+    is_gap = is_rule | (ink <= width * BLANK_INK_RATIO)
+
+    cuts = []
+    y = 0
+    while y < height:
+        if not is_gap[y]:
+            y += 1
+            continue
+        start = y
+        while y < height and is_gap[y]:
+            y += 1
+        # 上端・下端に接する余白は切れ目にしない
+        if start > 0 and y < height:
+            cuts.append((start + y) // 2)
+    return cuts
+
+def plan_bands(height: int, cuts: Sequence[int], max_height: int = MAX_BAND_HEIGHT,
+               overlap: int = BAND_OVERLAP) -> List[Tuple[int, int]]:
+    """切れ目の候補から、高さmax_height以下の帯 (上端, 下端) を決める
+
+    帯の境界はなるべく罫線・余白に合わせる。候補がない場合だけ固定位置で切り、
+    行が途中で切れても次の帯に完全に入るよう、次の帯をoverlapだけ上に広げる。
+    """
+    bands = []
+    top = 0
+    while top < height:
+        if height - top <= max_height:
+            bands.append((top, height))
+            break
+        limit = top + max_height
+        candidates = [c for c in cuts if top + max_height // 3 < c <= limit]
+        if candidates:
+            bottom = candidates[-1]
+            bands.append((top, bottom))
+            top = bottom
+        else:
+            bands.append((top, limit))
+            top = limit - overlap
+    return bands
+
+def header_height(cuts: Sequence[int], max_height: int = MAX_BAND_HEIGHT) -> int:
+    """表の先頭の見出し行の高さ（最初の切れ目まで。見出しらしくない高さなら0）"""
+    if not cuts or cuts[0] > max_height * HEADER_MAX_RATIO:
+        return 0
+    return cuts[0]
+
+def split_row_bands(image_bytes: bytes, max_height: int = MAX_BAND_HEIGHT,
+                    overlap: int = BAND_OVERLAP, min_bands: int = 1) -> List[bytes]:
+    """表の画像を行の帯に分割し、帯ごとにエンコードしたバイト列を返す（分割不要なら元のまま1件）
+
+    min_bandsを指定すると、max_height以下の画像もその数以上の帯に分ける（応答が途中で切れたときの再試行用）。
+    2番目以降の帯には表の見出し行を先頭に付け、列の対応が帯ごとに変わらないようにする。
+    """
+    import cv2
+    import numpy as np
+    img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        return [image_bytes]
+    height = img.shape[0]
+    max_height = min(max_height, -(-height // max(1, min_bands)))
+    if height <= max_height:
+        return [image_bytes]
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    cuts = find_row_cuts(gray)
+    bands = plan_bands(height, cuts, max_height, overlap)
+    header = img[:header_height(cuts, max_height)]
+    encoded = []
+    for top, bottom in bands:
+        band = img[top:bottom]
+        if top > 0 and len(header):
+            band = np.vstack([header, band])
+        ok, buf = cv2.imencode(".jpg", band, [cv2.IMWRITE_JPEG_QUALITY, 95])
+        if not ok:
+            return [image_bytes]
+        encoded.append(buf.tobytes())
+    return encoded
+
+def stitch_band_rows(band_rows: Iterable[List[Tuple[str, str, str]]]) -> Tuple[List[Tuple[str, str, str]], int]:
+    """帯ごとのOCR結果を上から順につなぐ
+
+    重なり部分に写った行は隣り合う帯の両方から返るので、直前の帯にある (タイ語, Paiboon) の行は落とす。
+    離れた帯にある同じ語は残す（最終的な重複排除は呼び出し側で行う）。(行, 落とした件数) を返す。
+    """
+    stitched = []
+    removed = 0
+    previous = set()
+    for rows in band_rows:
+        keys = set()
+        for row in rows:
+            key = (thai_vocab_key(row[1]), paiboon_vocab_key(row[2]))
+            keys.add(key)
+            if key in previous:
+                removed += 1
+                continue
+            stitched.append(row)
+        previous = keys
+    return stitched, removed
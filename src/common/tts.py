@@ -0,0 +1,70 @@
+import os
+import shutil
+import pathlib
+import subprocess
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Type, Union
+from .utils import atomic_output
+
+DEFAULT_TTS_BACKEND = "gtts"
+
+class TTSBackend(ABC):
+    """TTSバックエンドの共通インターフェース"""
+    name = ""
+    ext = ".mp3"
+    default_workers = 4
+    default_rate = 0.0  # 1秒あたりの最大リクエスト数（0は制限なし）
+
+    @abstractmethod
+    def synthesize(self, text: str, out_path: pathlib.Path) -> None:
+        """textを音声化してout_pathに保存する"""
+
+class GTTSBackend(TTSBackend):
+    """Google翻訳のTTS（ネットワーク経由）"""
+    name = "gtts"
+    ext = ".mp3"
+    default_workers = 4
+    default_rate = 3.0
+
+    def __init__(self, lang: str = "th"):
+        self.lang = lang
+
+    def synthesize(self, text: str, out_path: pathlib.Path) -> None:
+        from gtts import gTTS
+        with atomic_output(out_path) as part_path:
+            gTTS(text, lang=self.lang).save(str(part_path))
+
+class EspeakBackend(TTSBackend):
+    """espeak-ngによるローカルTTS（サブプロセスで実行、ネットワーク不要）"""
+    name = "espeak"
+    ext = ".wav"
+    default_workers = os.cpu_count() or 4
+    default_rate = 0.0
+
+    def __init__(self, voice: str = "th", speed: int = 140, executable: Optional[str] = None):
+        self.voice = voice
+        self.speed = speed
+        self.executable = executable or shutil.which("espeak-ng") or shutil.which("espeak")
+        if not self.executable:
+            raise RuntimeError("espeak-ng が見つかりません（apt install espeak-ng などでインストールしてください）")
+
+    def synthesize(self, text: str, out_path: pathlib.Path) -> None:
+        with atomic_output(out_path) as part_path:
+            subprocess.run(
+                [self.executable, "-v", self.voice, "-s", str(self.speed), "-w", str(part_path), text],
+                check=True, capture_output=True, timeout=60
+            )
+
+TTS_BACKENDS: Dict[str, Type[TTSBackend]] = {
+    GTTSBackend.name: GTTSBackend,
+    EspeakBackend.name: EspeakBackend,
+}
+
+def get_tts_backend(backend: Union[str, TTSBackend, None] = None) -> TTSBackend:
+    """名前またはインスタンスからTTSバックエンドを取得する"""
+    if isinstance(backend, TTSBackend):
+        return backend
+    name = backend or DEFAULT_TTS_BACKEND
+    if name not in TTS_BACKENDS:
+        raise ValueError(f"未知のTTSバックエンドです: {name} (選択肢: {', '.join(TTS_BACKENDS)})")
+    return TTS_BACKENDS[name]()
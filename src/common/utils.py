@@ -1,4 +1,7 @@
+import os
 import re
+import pathlib
+from contextlib import contextmanager
 
 def sanitize_filename(name: str) -> str:
     """ファイル名を安全な形式に変換する"""
@@ -6,4 +9,16 @@ def sanitize_filename(name: str) -> str:
     if '/' in name:
         name = name.split('/')[0]
     # それ以外のファイル名に使えない文字をアンダースコアに置換
-    return re.sub(r'[\\:*?"<>|]', '_', name) 
\ No newline at end of file
+    return re.sub(r'[\\:*?"<>|]', '_', name)
+
+@contextmanager
+def atomic_output(out_path: pathlib.Path):
+    """一時ファイル（.part）に書き出してからリネームする（途中終了で壊れたファイルを残さない）"""
+    out_path = pathlib.Path(out_path)
+    part_path = out_path.with_name(out_path.name + ".part")
+    try:
+        yield part_path
+        os.replace(part_path, out_path)
+    finally:
+        if part_path.exists():
+            part_path.unlink()
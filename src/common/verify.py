@@ -0,0 +1,153 @@
+import os
+import csv
+import zipfile
+import hashlib
+import pathlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from .apkg import open_apkg_collection, read_apkg_media_map, iter_apkg_notes, media_refs
+
+# メディアのハッシュ計算で一度に読むサイズ
+CHUNK_SIZE = 1 << 20
+# 問題の一覧を表示する最大件数
+MAX_SHOWN = 20
+
+def _hash_entries(apkg_path: pathlib.Path, entries: List[str], workers: Optional[int]) -> Dict[str, Tuple[str, int, Optional[str]]]:
+    """zip内のメディアをディスクに展開せずにハッシュ計算（スレッドごとにZipFileを開いて並列に読む）
+
+    エントリ名 → (sha1, バイト数, エラー) を返す。読み切るとzipfileがCRCも検証する。
+    """
+    local = threading.local()
+    handles = []
+    handles_lock = threading.Lock()
+
+    def _zip() -> zipfile.ZipFile:
+        if not hasattr(local, "zip"):
+            local.zip = zipfile.ZipFile(apkg_path)
+            with handles_lock:
+                handles.append(local.zip)
+        return local.zip
+
+    def _hash(name: str) -> Tuple[str, Tuple[str, int, Optional[str]]]:
+        digest = hashlib.sha1()
+        size = 0
+        try:
+            with _zip().open(name) as f:
+                while True:
+                    chunk = f.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    size += len(chunk)
+            return name, (digest.hexdigest(), size, None)
+        except (zipfile.BadZipFile, OSError, EOFError) as e:
+            return name, ("", size, f"{type(e).__name__}: {e}")
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 1)) as pool:
+            return dict(pool.map(_hash, entries))
+    finally:
+        for z in handles:
+            z.close()
+
+def verify_apkg(apkg_path: pathlib.Path, workers: Optional[int] = None, hash_media: bool = True) -> Dict[str, Any]:
+    """apkgの整合性を検証する（ディスクには何も書かない）
+
+    - ノートの [sound:...] / <img src> が参照するメディアがmediaマップとzipにあるか
+    - mediaマップにあってzipにないエントリ、どこからも参照されないメディア
+    - 重複GUID
+    - メディアの読み出し（CRC検証）とハッシュ、内容が同じメディアの検出
+    """
+    apkg_path = pathlib.Path(apkg_path)
+    report: Dict[str, Any] = {"path": str(apkg_path)}
+    with zipfile.ZipFile(apkg_path) as z:
+        infos = {info.filename: info for info in z.infolist()}
+        media_map = read_apkg_media_map(z)
+        conn = open_apkg_collection(z)
+    try:
+        refs = set()
+        guids = set()
+        duplicate_guids = []
+        notes = 0
+        for guid, fields in iter_apkg_notes(conn):
+            notes += 1
+            refs.update(media_refs(fields))
+            if guid in guids:
+                duplicate_guids.append(guid)
+            guids.add(guid)
+    finally:
+        conn.close()
+
+    name_to_entry = {name: entry for entry, name in media_map.items()}
+    report["notes"] = notes
+    report["media"] = len(media_map)
+    report["media_bytes"] = sum(infos[e].file_size for e in media_map if e in infos)
+    report["missing_media"] = sorted(r for r in refs if r not in name_to_entry)
+    report["missing_entries"] = sorted(name for entry, name in media_map.items() if entry not in infos)
+    report["unreferenced_media"] = sorted(name for name in name_to_entry if name not in refs)
+    report["duplicate_guids"] = duplicate_guids
+    report["corrupt_media"] = []
+    report["duplicate_media"] = []
+    if hash_media:
+        entries = [e for e in media_map if e in infos]
+        hashes = _hash_entries(apkg_path, entries, workers)
+        by_digest: Dict[str, List[str]] = {}
+        for entry, (digest, _, error) in hashes.items():
+            if error:
+                report["corrupt_media"].append(f"{media_map[entry]} ({error})")
+            else:
+                by_digest.setdefault(digest, []).append(media_map[entry])
+        report["duplicate_media"] = sorted(sorted(names) for names in by_digest.values() if len(names) > 1)
+        report["media_sha1"] = {media_map[e]: h[0] for e, h in hashes.items() if not h[2]}
+    report["ok"] = not (report["missing_media"] or report["missing_entries"]
+                        or report["duplicate_guids"] or report["corrupt_media"])
+    return report
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"\n🔎 検証: {report['path']}")
+    print(f"  - ノート: {report['notes']}件 / メディア: {report['media']}件 ({report['media_bytes']:,} bytes)")
+    checks = [
+        ("missing_media", "❌ 参照されているがパッケージにないメディア"),
+        ("missing_entries", "❌ mediaマップにあるがzipにないエントリ"),
+        ("corrupt_media", "❌ 読み出しに失敗したメディア"),
+        ("duplicate_guids", "❌ 重複GUID"),
+        ("unreferenced_media", "⚠️ どのノートからも参照されていないメディア"),
+        ("duplicate_media", "ℹ️ 内容が同じメディア"),
+    ]
+    for key, label in checks:
+        items = report.get(key) or []
+        if not items:
+            continue
+        print(f"  {label}: {len(items)}件")
+        for item in items[:MAX_SHOWN]:
+            print(f"    - {', '.join(item) if isinstance(item, list) else item}")
+        if len(items) > MAX_SHOWN:
+            print(f"    ... ほか{len(items) - MAX_SHOWN}件")
+    print("✅ 問題は見つかりませんでした" if report["ok"] else "❌ 問題が見つかりました")
+
+def select_notes(apkg_path: pathlib.Path, match: Optional[str] = None,
+                 limit: Optional[int] = None) -> List[Tuple[str, List[str]]]:
+    """matchを含むノート（未指定なら全件）を最大limit件返す"""
+    with zipfile.ZipFile(apkg_path) as z:
+        conn = open_apkg_collection(z)
+    try:
+        selected = []
+        for guid, fields in iter_apkg_notes(conn):
+            if match and not any(match in f for f in fields):
+                continue
+            selected.append((guid, fields))
+            if limit and len(selected) >= limit:
+                break
+        return selected
+    finally:
+        conn.close()
+
+def dump_notes(notes: List[Tuple[str, List[str]]], path: pathlib.Path) -> None:
+    """ノートをTSVに書き出す（GUID + フィールド）"""
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, delimiter="\t")
+        for guid, fields in notes:
+            writer.writerow([guid] + fields)
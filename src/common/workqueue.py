@@ -0,0 +1,208 @@
+import json
+import time
+import sqlite3
+import pathlib
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+WORKQUEUE_PATH = pathlib.Path("data/output/system/workqueue.sqlite")
+DEFAULT_LEASE_SECONDS = 120.0
+DEFAULT_MAX_ATTEMPTS = 3
+
+class WorkQueue:
+    """共有ストレージ上のSQLiteに置くジョブ／作業アイテムのキュー（複数マシンのワーカーで分担）
+
+    ワーカーはアイテムを期限付きのリースで取得し、ハートビートで延長する。
+    ワーカーが落ちてリースが切れたアイテムは他のワーカーが取り直す。
+    全アイテムが終わったジョブは、1つのワーカーだけがリースを取ってパッケージ化する。
+    ネットワークファイルシステムでも使えるよう、WALではなく通常のロールバックジャーナルを使う。
+    """
+
+    def __init__(self, path: pathlib.Path = WORKQUEUE_PATH):
+        self.path = pathlib.Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=60,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA busy_timeout = 60000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY, deck_name TEXT NOT NULL, config TEXT NOT NULL,"
+            " status TEXT NOT NULL DEFAULT 'open', owner TEXT, lease_expires REAL,"
+            " output TEXT, error TEXT, created_at REAL NOT NULL, finished_at REAL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS items ("
+            " job_id TEXT NOT NULL, item_id TEXT NOT NULL, payload TEXT NOT NULL,"
+            " status TEXT NOT NULL DEFAULT 'pending', owner TEXT, lease_expires REAL,"
+            " attempts INTEGER NOT NULL DEFAULT 0, result TEXT, error TEXT,"
+            " PRIMARY KEY (job_id, item_id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS items_status ON items (status, lease_expires)")
+
+    @property
+    def root(self) -> pathlib.Path:
+        """フレームや音声を置く共有ディレクトリ（キューファイルと同じ場所）"""
+        return self.path.parent / "workqueue"
+
+    def job_dir(self, job_id: str) -> pathlib.Path:
+        return self.root / job_id
+
+    def _write(self, func):
+        """BEGIN IMMEDIATEで書き込みロックを取ってからfuncを実行（取得処理の競合を防ぐ）"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(self._conn)
+                self._conn.execute("COMMIT")
+                return result
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def add_job(self, job_id: str, deck_name: str, config: Dict[str, Any],
+                items: Iterable[Tuple[str, Any]]) -> int:
+        """ジョブとアイテムを登録（同じジョブIDは置き換える）。登録したアイテム数を返す"""
+        rows = [(job_id, item_id, json.dumps(payload, ensure_ascii=False)) for item_id, payload in items]
+
+        def _add(conn):
+            conn.execute("DELETE FROM items WHERE job_id = ?", (job_id,))
+            conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+            conn.execute(
+                "INSERT INTO jobs (job_id, deck_name, config, created_at) VALUES (?, ?, ?, ?)",
+                (job_id, deck_name, json.dumps(config, ensure_ascii=False), time.time())
+            )
+            conn.executemany("INSERT INTO items (job_id, item_id, payload) VALUES (?, ?, ?)", rows)
+            return len(rows)
+        return self._write(_add)
+
+    def claim(self, worker_id: str, lease_seconds: float = DEFAULT_LEASE_SECONDS,
+              limit: int = 1, max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> List[Tuple[str, str, Any]]:
+        """未処理またはリース切れのアイテムを取得する（(ジョブID, アイテムID, ペイロード) のリスト）"""
+        def _claim(conn):
+            now = time.time()
+            # 試行回数を使い切ったリース切れアイテムは失敗扱いにする
+            conn.execute(
+                "UPDATE items SET status = 'failed', owner = NULL, error = 'lease expired too many times'"
+                " WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, max_attempts)
+            )
+            rows = conn.execute(
+                "SELECT job_id, item_id, payload FROM items"
+                " WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?)"
+                " ORDER BY job_id, item_id LIMIT ?",
+                (now, limit)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE items SET status = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1"
+                " WHERE job_id = ? AND item_id = ?",
+                [(worker_id, now + lease_seconds, job_id, item_id) for job_id, item_id, _ in rows]
+            )
+            return [(job_id, item_id, json.loads(payload)) for job_id, item_id, payload in rows]
+        return self._write(_claim)
+
+    def heartbeat(self, worker_id: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> int:
+        """このワーカーが持っているリース（アイテム・ジョブ）をすべて延長する"""
+        def _renew(conn):
+            expires = time.time() + lease_seconds
+            n = conn.execute("UPDATE items SET lease_expires = ? WHERE status = 'leased' AND owner = ?",
+                             (expires, worker_id)).rowcount
+            n += conn.execute("UPDATE jobs SET lease_expires = ? WHERE status = 'finalizing' AND owner = ?",
+                              (expires, worker_id)).rowcount
+            return n
+        return self._write(_renew)
+
+    def complete(self, worker_id: str, job_id: str, item_id: str, result: Any) -> bool:
+        """アイテムの結果を記録（リースを失っていた場合はFalse）"""
+        def _complete(conn):
+            return conn.execute(
+                "UPDATE items SET status = 'done', result = ?, owner = NULL, lease_expires = NULL"
+                " WHERE job_id = ? AND item_id = ? AND status = 'leased' AND owner = ?",
+                (json.dumps(result, ensure_ascii=False), job_id, item_id, worker_id)
+            ).rowcount == 1
+        return self._write(_complete)
+
+    def fail(self, worker_id: str, job_id: str, item_id: str, error: str,
+             max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> None:
+        """アイテムの失敗を記録（試行回数が残っていれば再度未処理に戻す）"""
+        def _fail(conn):
+            conn.execute(
+                "UPDATE items SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,"
+                " error = ?, owner = NULL, lease_expires = NULL"
+                " WHERE job_id = ? AND item_id = ? AND owner = ?",
+                (max_attempts, error, job_id, item_id, worker_id)
+            )
+        self._write(_fail)
+
+    def claim_finalize(self, worker_id: str,
+                       lease_seconds: float = DEFAULT_LEASE_SECONDS) -> Optional[Tuple[str, str, Dict[str, Any]]]:
+        """全アイテムが終わったジョブを1つ取得し、パッケージ化の担当になる"""
+        def _claim(conn):
+            now = time.time()
+            row = conn.execute(
+                "SELECT job_id, deck_name, config FROM jobs j"
+                " WHERE (status = 'open' OR (status = 'finalizing' AND lease_expires < ?))"
+                " AND NOT EXISTS (SELECT 1 FROM items i WHERE i.job_id = j.job_id"
+                "                 AND i.status IN ('pending', 'leased'))"
+                " ORDER BY created_at LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE jobs SET status = 'finalizing', owner = ?, lease_expires = ? WHERE job_id = ?",
+                         (worker_id, now + lease_seconds, row[0]))
+            return row[0], row[1], json.loads(row[2])
+        return self._write(_claim)
+
+    def finish_job(self, worker_id: str, job_id: str, output: Optional[str], error: Optional[str] = None) -> None:
+        def _finish(conn):
+            conn.execute(
+                "UPDATE jobs SET status = ?, output = ?, error = ?, owner = NULL, lease_expires = NULL,"
+                " finished_at = ? WHERE job_id = ? AND owner = ?",
+                ("failed" if error else "done", output, error, time.time(), job_id, worker_id)
+            )
+        self._write(_finish)
+
+    def results(self, job_id: str) -> List[Any]:
+        """完了したアイテムの結果をアイテムID順に返す"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT result FROM items WHERE job_id = ? AND status = 'done' ORDER BY item_id",
+                (job_id,)
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def job_config(self, job_id: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        with self._lock:
+            row = self._conn.execute("SELECT deck_name, config FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def has_open_work(self) -> bool:
+        """未完了のジョブが残っているか"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM jobs WHERE status IN ('open', 'finalizing') LIMIT 1"
+            ).fetchone()
+        return row is not None
+
+    def status(self) -> List[Dict[str, Any]]:
+        """ジョブごとのアイテム状態の集計"""
+        with self._lock:
+            jobs = self._conn.execute(
+                "SELECT job_id, deck_name, status, output, error FROM jobs ORDER BY created_at"
+            ).fetchall()
+            counts = self._conn.execute(
+                "SELECT job_id, status, COUNT(*) FROM items GROUP BY job_id, status"
+            ).fetchall()
+        by_job: Dict[str, Dict[str, int]] = {}
+        for job_id, status, n in counts:
+            by_job.setdefault(job_id, {})[status] = n
+        return [
+            {"job_id": job_id, "deck_name": deck_name, "status": status, "output": output,
+             "error": error, "items": by_job.get(job_id, {})}
+            for job_id, deck_name, status, output, error in jobs
+        ]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -1,70 +1,151 @@
 import os
 import json
+import uuid
 import tempfile
+import threading
 from pathlib import Path
-from typing import List, Dict, Any, Optional
-from openai import OpenAI
-from gtts import gTTS
-from deep_translator import MyMemoryTranslator
-from genanki import Model, Note, Deck, Package
-import csv
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Tuple
 import re
 import time
 import random
+import logging
+from ..common.audio import tts_limiter
+from ..common.ratelimit import RateLimiter, retry_with_backoff
+from ..common.pipeline import Stage, Pipeline
+from ..common.journal import Journal, MISSING
+from ..common.tts import get_tts_backend
+from ..common.audio_post import postprocess_audio_files
+from ..common.apkg import stable_deck_id, note_guid, media_refs, DeckState, write_apkg, thai_vocab_model
+from ..common.metrics import METRICS
+from ..common.cassette import chat_completion, get_cassette, replaying, synthesize
+from ..common.exception_store import get_exception_store, peek_rows
+from ..common.known_vocab import KnownVocab
+from ..common.dedupe import VocabDeduper
+from ..common.utils import sanitize_filename
+
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+logger = logging.getLogger(__name__)
+
+FIX_PAIBOON_SCHEMA = {
+    "name": "fix_paiboon",
+    "description": "Paiboon 表記を修正して返す",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "thai": {"type": "string"},
+            "paiboon": {"type": "string"},
+            "meaning": {"type": "string"}
+        },
+        "required": ["thai", "paiboon", "meaning"]
+    }
+}
+
+# 段ごとの既定の並列数（ネットワーク待ちの段は多め）
+DEFAULT_STAGE_WORKERS = {
+    "ocr": 4,
+    "correct": 4,
+    "translate": 2,
+}
+
+class PaiboonCorrectionError(RuntimeError):
+    """Paiboon修正のAPI呼び出しに失敗した（ジャーナルに記録せず、--resumeで再試行させる）"""
+
+    def __init__(self, entry: Dict[str, str], message: str):
+        super().__init__(message)
+        self.entry = entry
+
+# 例外パターンのデフォルト
+DEFAULT_EXCEPTIONS = [
+    ("ขอบคุณ", "khòp khun"),
+    ("ขอโทษ", "khǎw thôot"),
+    ("ไม่เป็นไร", "mây pen ray"),
+    ("ยินดีที่ได้รู้จัก", "yin dii thîi dây rúu càk"),
+    ("ชื่ออะไร", "chûʉ aray"),
+    ("เป็นยังไงบ้าง", "pen yàŋŋay bâaŋ"),
+    ("เรื่อย ๆ", "rʉ̂ay rʉ̂ay"),
+]
+
+def _default_exception_rows() -> List[Dict[str, str]]:
+    return [{"thai": thai, "gold_paiboon": paiboon, "generated_paiboon": "", "type": "mismatch"}
+            for thai, paiboon in DEFAULT_EXCEPTIONS]
 
 class BaseDeckBuilder:
-    def __init__(self, output_dir: str, deck_name: str, use_paiboon_correction: bool = True):
+    def __init__(self, output_dir: str, deck_name: str, use_paiboon_correction: bool = True,
+                 tts_workers: Optional[int] = None, tts_rate: Optional[float] = None,
+                 tts_backend: Optional[str] = None, audio_bitrate: Optional[str] = None,
+                 incremental: bool = False, stage_workers: Optional[Dict[str, int]] = None,
+                 job_id: Optional[str] = None, resume: bool = False,
+                 client: Optional["OpenAI"] = None, shared_tts_limiter: Optional[RateLimiter] = None,
+                 translation_cache: Optional[Dict[str, str]] = None, work_dir: Optional[Path] = None,
+                 known_vocab: Optional[KnownVocab] = None):
         self.output_dir = Path(output_dir)
         self.deck_name = deck_name
-        self.client = OpenAI()
-        self.temp_dir = Path(tempfile.mkdtemp())
+        # バッチ実行時はクライアント・レートリミッタ・翻訳キャッシュをジョブ間で共有する
+        # 渡されなければ最初のAPI呼び出しまで作らない（--dry-runにはAPIキーが要らない）
+        self._client = client
+        self._client_lock = threading.Lock()
+        self.translation_cache = translation_cache if translation_cache is not None else {}
+        # 既存デッキにある語はOCR直後に落とす（修正・翻訳・TTSのAPI呼び出しを省く）
+        self.known_vocab = known_vocab
+        # 表記揺れ（空白・NFC/NFD・声調記号の順序・ʉ/ue）だけが違う語もOCR直後に落とす
+        self.deduper = VocabDeduper()
+        # ジョブIDがあれば各段の出力をジャーナルに記録し、作業ディレクトリも再開用に残す
+        self.journal = Journal(job_id, resume=resume) if job_id else None
+        # ワーカーモードでは共有ストレージ上のジョブディレクトリを使う（削除はしない）
+        self._owns_temp_dir = work_dir is None
+        if work_dir is not None:
+            self.temp_dir = Path(work_dir)
+            self.temp_dir.mkdir(parents=True, exist_ok=True)
+        elif self.journal is not None:
+            self.temp_dir = self.journal.work_dir
+            self.temp_dir.mkdir(parents=True, exist_ok=True)
+        else:
+            self.temp_dir = Path(tempfile.mkdtemp())
+        self._completed = False
         self.use_paiboon_correction = use_paiboon_correction
+        self.tts_backend = get_tts_backend(tts_backend)
+        self.tts_limiter = shared_tts_limiter or tts_limiter(self.tts_backend, tts_rate)
+        # 指定時のみ音声の無音削除・モノラル化・再エンコードを行う
+        self.audio_bitrate = audio_bitrate
+        # 新規・変更ノートのみを書き出す（GUIDが決定的なので再インポートで既存ノートが更新される）
+        self.incremental = incremental
+        # パイプラインの段ごとの並列数
+        self.stage_workers = dict(DEFAULT_STAGE_WORKERS)
+        self.stage_workers["tts"] = tts_workers or self.tts_backend.default_workers
+        self.stage_workers.update(stage_workers or {})
         
+    @property
+    def client(self) -> "OpenAI":
+        with self._client_lock:
+            if self._client is None:
+                from openai import OpenAI
+                self._client = OpenAI()
+            return self._client
+
     def build_rules(self) -> str:
-        """Paiboon修正プロンプトを動的に生成（例外パターンはTSVから自動挿入）"""
-        # 例外パターンのデフォルト
-        default_exceptions = [
-            ("ขอบคุณ", "khòp khun"),
-            ("ขอโทษ", "khǎw thôot"),
-            ("ไม่เป็นไร", "mây pen ray"),
-            ("ยินดีที่ได้รู้จัก", "yin dii thîi dây rúu càk"),
-            ("ชื่ออะไร", "chûʉ aray"),
-            ("เป็นยังไงบ้าง", "pen yàŋŋay bâaŋ"),
-            ("เรื่อย ๆ", "rʉ̂ay rʉ̂ay"),
-        ]
-        # TSVから例外パターンを抽出
-        tsv_path = Path("data/output/system/paiboon_diff.tsv")
+        """Paiboon修正プロンプトを動的に生成（例外パターンはストアから自動挿入、ストアが変わるまでキャッシュ）"""
+        # 既存例外パターンがストアに無ければ追加
+        store = get_exception_store()
+        store.ensure(_default_exception_rows())
+        return store.derive("rules", self._render_rules)
+
+    def preview_exception_rows(self) -> List[Dict[str, str]]:
+        """ストアを変更せずに、実行時と同じ例外パターンを返す（見積もり用、デフォルトは修正時のみ追加される）"""
+        return peek_rows(_default_exception_rows() if self.use_paiboon_correction else ())
+
+    @staticmethod
+    def _render_rules(rows: List[Dict[str, str]]) -> str:
+        """例外パターンからPaiboon修正プロンプトを生成"""
         exceptions = []
         seen = set()
-        if tsv_path.exists():
-            with open(tsv_path, encoding="utf-8") as f:
-                reader = csv.DictReader(f, delimiter="\t")
-                for row in reader:
-                    if row["type"] == "mismatch" and row["gold_paiboon"]:
-                        key = (row["thai"], row["gold_paiboon"])
-                        if key not in seen:
-                            exceptions.append(key)
-                            seen.add(key)
-        # 既存例外パターンがtsvに無ければ追記
-        new_lines = []
-        for thai, paiboon in default_exceptions:
-            if (thai, paiboon) not in seen:
-                new_lines.append({
-                    "thai": thai,
-                    "gold_paiboon": paiboon,
-                    "generated_paiboon": "",
-                    "type": "mismatch"
-                })
-                exceptions.append((thai, paiboon))
-        if new_lines:
-            # 追記
-            write_header = not tsv_path.exists()
-            with open(tsv_path, "a", encoding="utf-8", newline='') as f:
-                writer = csv.DictWriter(f, fieldnames=["thai", "gold_paiboon", "generated_paiboon", "type"], delimiter="\t")
-                if write_header:
-                    writer.writeheader()
-                for row in new_lines:
-                    writer.writerow(row)
+        for row in rows:
+            if row["type"] == "mismatch" and row["gold_paiboon"]:
+                key = (row["thai"], row["gold_paiboon"])
+                if key not in seen:
+                    exceptions.append(key)
+                    seen.add(key)
         # 例外パターン文言生成
         if exceptions:
             exception_lines = [f"   - {thai} → {paiboon}" for thai, paiboon in exceptions]
@@ -140,47 +221,54 @@ class BaseDeckBuilder:
         if not data:
             print("⚠️ 修正対象のデータが空です")
             return []
-        corrected_data = []
         rules = self.build_rules()
-        function_schema = {
-            "name": "fix_paiboon",
-            "description": "Paiboon 表記を修正して返す",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "thai": {"type": "string"},
-                    "paiboon": {"type": "string"},
-                    "meaning": {"type": "string"}
-                },
-                "required": ["thai", "paiboon", "meaning"]
-            }
+        corrected_data = [self._correct_or_keep(self._correct_entry, entry, rules) for entry in data]
+        if not all(isinstance(item, dict) and all(k in item for k in ["thai", "paiboon", "meaning"]) for item in corrected_data):
+            print("⚠️ 戻り値の型が不正です。元のデータを返します。")
+            return data
+        return corrected_data
+
+    @staticmethod
+    def _correct_or_keep(correct, entry: Dict[str, str], *args) -> Dict[str, str]:
+        """修正に失敗した項目は修正前のままデッキに入れる（失敗はジャーナルに残らないので再開時に再試行される）"""
+        try:
+            return correct(entry, *args)
+        except PaiboonCorrectionError as e:
+            return e.entry
+
+    def _correct_entry(self, entry: Dict[str, str], rules: str) -> Dict[str, str]:
+        """1件分のPaiboon修正（API呼び出しの失敗時はPaiboonCorrectionErrorを送出）"""
+        logger.debug("[処理開始] 入力データ: %s", json.dumps(entry, ensure_ascii=False))
+        # Thaiフィールドにタイ文字が1文字も含まれない場合はスキップ
+        if not re.search(r'[\u0E00-\u0E7F]', entry.get("thai", "")):
+            print(f"⚠️ Thaiフィールドにタイ文字が含まれていないためスキップ: {json.dumps(entry, ensure_ascii=False)}")
+            return entry
+        if not entry.get("paiboon"):
+            print(f"⚠️ paiboon=None or empty entry: {json.dumps(entry, ensure_ascii=False)}")
+            return entry
+        # 例外パターンに完全一致するタイ語はAPIを呼ばずに正解へ置き換える
+        gold = get_exception_store().lookup(entry["thai"])
+        METRICS.cache("paiboon_exception", gold is not None)
+        if gold is not None:
+            logger.debug("[例外パターン適用] %s → %s", entry["paiboon"], gold)
+            return {"thai": entry["thai"], "paiboon": gold, "meaning": entry.get("meaning", "")}
+        logger.debug("[Paiboon正規化前] %s", entry["paiboon"])
+        norm_entry = dict(entry)
+        norm_entry["paiboon"] = self.paiboon_normalize(norm_entry["paiboon"], norm_entry)
+        logger.debug("[Paiboon正規化後] %s", norm_entry["paiboon"])
+        single_entry = {
+            "thai": norm_entry["thai"],
+            "paiboon": norm_entry["paiboon"],
+            "meaning": norm_entry["meaning"]
         }
-        for entry in data:
-            print(f"\n---\n[処理開始] 入力データ: {json.dumps(entry, ensure_ascii=False)}")
-            # Thaiフィールドにタイ文字が1文字も含まれない場合はスキップ
-            if not re.search(r'[\u0E00-\u0E7F]', entry.get("thai", "")):
-                print(f"⚠️ Thaiフィールドにタイ文字が含まれていないためスキップ: {json.dumps(entry, ensure_ascii=False)}")
-                corrected_data.append(entry)
-                continue
-            if not entry.get("paiboon"):
-                print(f"⚠️ paiboon=None or empty entry: {json.dumps(entry, ensure_ascii=False)}")
-                corrected_data.append(entry)
-                continue
-            print(f"[Paiboon正規化前] {entry['paiboon']}")
-            norm_entry = dict(entry)
-            norm_entry["paiboon"] = self.paiboon_normalize(norm_entry["paiboon"], norm_entry)
-            print(f"[Paiboon正規化後] {norm_entry['paiboon']}")
-            single_entry = {
-                "thai": norm_entry["thai"],
-                "paiboon": norm_entry["paiboon"],
-                "meaning": norm_entry["meaning"]
-            }
-            print(f"[ChatGPT補正前] {json.dumps(single_entry, ensure_ascii=False)}")
-            retry = 0
-            max_retry = 1
-            while retry < max_retry:
-                try:
-                    response = self.client.chat.completions.create(
+        logger.debug("[ChatGPT補正前] %s", json.dumps(single_entry, ensure_ascii=False))
+        retry = 0
+        max_retry = 1
+        while retry < max_retry:
+            try:
+                with METRICS.track_api("openai_correct") as call:
+                    response = chat_completion(
+                        self.client,
                         model="gpt-4o",
                         messages=[
                             {"role": "system", "content": rules},
@@ -189,54 +277,56 @@ class BaseDeckBuilder:
                         temperature=0,
                         top_p=1,
                         max_tokens=128,
-                        tools=[{"type": "function", "function": function_schema}],
+                        tools=[{"type": "function", "function": FIX_PAIBOON_SCHEMA}],
                         tool_choice="auto"
                     )
-                    msg = response.choices[0].message
-                    if getattr(msg, "tool_calls", None):
-                        args = msg.tool_calls[0].function.arguments
-                        result = json.loads(args) if isinstance(args, str) else args
-                    else:
-                        if msg.content is None:
-                            raise ValueError("OpenAI応答のcontentがNoneです")
-                        json_match = re.search(r'\{[\s\S]*\}', msg.content)
-                        if json_match:
-                            result = json.loads(json_match.group(0))
-                        else:
-                            raise ValueError("No JSON found in response content")
-                    if isinstance(result, dict) and all(k in result for k in ["thai", "paiboon", "meaning"]):
-                        print(f"[ChatGPT補正後] {json.dumps(result, ensure_ascii=False)}")
-                        corrected_data.append(result)
-                        break
+                    call.usage(response)
+                msg = response.choices[0].message
+                if getattr(msg, "tool_calls", None):
+                    args = msg.tool_calls[0].function.arguments
+                    result = json.loads(args) if isinstance(args, str) else args
+                else:
+                    if msg.content is None:
+                        raise ValueError("OpenAI応答のcontentがNoneです")
+                    json_match = re.search(r'\{[\s\S]*\}', msg.content)
+                    if json_match:
+                        result = json.loads(json_match.group(0))
                     else:
-                        raise ValueError("Result missing required keys")
-                except Exception as e:
-                    print(f"⚠️ エラーが発生: {str(e)} (リトライ{retry+1}/{max_retry})")
-                    retry += 1
-                    if retry == max_retry:
-                        print(f"⚠️ 最終エラー詳細: {str(e)} 入力: {json.dumps(single_entry, ensure_ascii=False)}")
-                        corrected_data.append(entry)
-                        break
-        if not all(isinstance(item, dict) and all(k in item for k in ["thai", "paiboon", "meaning"]) for item in corrected_data):
-            print("⚠️ 戻り値の型が不正です。元のデータを返します。")
-            return data
-        return corrected_data
+                        raise ValueError("No JSON found in response content")
+                if isinstance(result, dict) and all(k in result for k in ["thai", "paiboon", "meaning"]):
+                    logger.debug("[ChatGPT補正後] %s", json.dumps(result, ensure_ascii=False))
+                    return result
+                else:
+                    raise ValueError("Result missing required keys")
+            except Exception as e:
+                print(f"⚠️ エラーが発生: {str(e)} (リトライ{retry+1}/{max_retry})")
+                retry += 1
+                if retry == max_retry:
+                    print(f"⚠️ 最終エラー詳細: {str(e)} 入力: {json.dumps(single_entry, ensure_ascii=False)}")
+                    raise PaiboonCorrectionError(entry, str(e)) from e
+        return entry
 
     def _translate_to_english(self, text: str) -> str:
         """日本語から英語に翻訳（レートリミット時は10秒待って1回リトライ）"""
+        from deep_translator import MyMemoryTranslator
         translator = MyMemoryTranslator(source="ja-JP", target="en-GB")
         try:
-            result = translator.translate(text)
-            time.sleep(0.5)  # Google翻訳APIのレートリミット回避
+            with METRICS.track_api("mymemory", bytes_sent=len(text.encode("utf-8"))):
+                result = self._mymemory_translate(translator, text)
+            if not replaying():
+                time.sleep(0.5)  # Google翻訳APIのレートリミット回避
             return result
         except Exception as e:
             msg = str(e)
             if "too many requests" in msg.lower() or "you made too many requests" in msg.lower():
                 print("⚠️ Google翻訳APIのレートリミットに達しました。10秒待機してリトライします。")
+                METRICS.incr("api_retries_total", service="mymemory")
                 time.sleep(10)
                 try:
-                    result = translator.translate(text)
-                    time.sleep(0.5)
+                    with METRICS.track_api("mymemory", bytes_sent=len(text.encode("utf-8"))):
+                        result = self._mymemory_translate(translator, text)
+                    if not replaying():
+                        time.sleep(0.5)
                     return result
                 except Exception as e2:
                     print(f"❌ 再試行でも失敗: {e2}")
@@ -244,110 +334,201 @@ class BaseDeckBuilder:
             else:
                 raise
 
+    def _mymemory_translate(self, translator, text: str) -> str:
+        """MyMemoryでの翻訳（record/replayモードではカセット経由）"""
+        request = {"text": text, "source": "ja-JP", "target": "en-GB"}
+        return get_cassette().call("mymemory", request, lambda: translator.translate(text))
+
     def _generate_tts(self, text: str, output_path: Path) -> None:
-        """タイ語のTTS音声を生成"""
-        tts = gTTS(text=text, lang="th")
-        tts.save(str(output_path))
+        """タイ語のTTS音声を生成（選択中のバックエンドでアトミックに書き込む）"""
+        synthesize(self.tts_backend, text, output_path)
 
-    def _create_anki_package(self, notes: List[Dict[str, str]], media_files: List[Path]) -> Path:
-        """Ankiパッケージを作成し、音声ファイルを含める"""
+    def _create_anki_package(self, notes: List[Dict[str, str]], media_files: List[Path]) -> Optional[Path]:
+        """Ankiパッケージを作成し、音声ファイルを含める（インクリメンタルで変更がなければNone）"""
+        from genanki import Note, Deck
         # モデル定義
-        model = Model(
-            1607392319,
-            "Thai Vocab Model",
-            fields=[
-                {"name": "Thai"},
-                {"name": "Phonetic"},
-                {"name": "English"},
-                {"name": "Audio"},
-            ],
-            templates=[
-                {
-                    "name": "Card1",
-                    "qfmt": "<h1>{{Phonetic}}</h1>\n<h2>{{Thai}}</h2>\n<hr>\n<h1>{{Audio}}</h1>",
-                    "afmt": "<h1>{{Phonetic}}</h1>\n<h2>{{English}}</h2>\n<h2>{{Thai}}</h2>\n<hr>\n<h1>{{Audio}}</h1>",
-                },
-                {
-                    "name": "Card2",
-                    "qfmt": "<h1>{{English}}</h1>",
-                    "afmt": "<h1>{{English}}</h1>\n<h2>{{Phonetic}}</h2>\n<h2>{{Thai}}</h2>\n<hr>\n<h1>{{Audio}}</h1>",
-                },
-            ],
-            css="""h1, h2 { text-align: center; }"""
-        )
-        deck_id = abs(hash(self.deck_name)) % (2**31 - 1)
+        model = thai_vocab_model()
+        deck_id = stable_deck_id(self.deck_name)
         deck = Deck(deck_id, self.deck_name)
+        entries = []
+        seen_guids = set()
         for note in notes:
-            deck.add_note(Note(model, [
+            fields = [
                 note["Thai"],
                 note["Phonetic"],
                 note["English"],
                 note["Audio"],
-            ]))
+            ]
+            guid = note_guid(note["Thai"])
+            if guid in seen_guids:
+                print(f"⚠️ 同じタイ語のノートが既にあるためスキップ: {note['Thai']}")
+                continue
+            seen_guids.add(guid)
+            entries.append((guid, fields, (guid, fields)))
+        selected = [value for _, _, value in entries]
+        state = None
+        if self.incremental:
+            state = DeckState(self.deck_name)
+            selected = state.filter_changed(entries)
+            print(f"🔁 インクリメンタル出力: {len(selected)}/{len(entries)} 件が新規または変更")
+            if not selected:
+                print("✅ 変更されたノートはありません")
+                # 出力するものがないだけで処理は完了しているので、ジャーナルは再開用に残さない
+                self._completed = True
+                return None
+        for guid, fields in selected:
+            deck.add_note(Note(model, fields, guid=guid))
         # メディアファイルの絶対パスリスト
         media_paths = [str(p) for p in media_files if Path(p).exists()]
+        if self.incremental:
+            refs = media_refs(f for _, fields in selected for f in fields)
+            media_paths = [p for p in media_paths if Path(p).name in refs]
         output_path = self.output_dir / f"{self.deck_name.replace(' ', '_')}.apkg"
-        pkg = Package(deck, media_files=media_paths)
-        pkg.write_to_file(str(output_path))
+        write_apkg(deck, output_path, media_paths)
+        if state is not None:
+            state.update(selected)
+            state.save()
         print(f"✅ Ankiパッケージ生成完了: {output_path} (メディアファイル数: {len(media_paths)})")
         return output_path
 
-    def build(self, data: List[Dict[str, str]]) -> Path:
-        """デッキをビルド"""
-        # 空のデータやnull値をフィルタリング
-        valid_data = []
-        for item in data:
-            if (item.get("thai") and item.get("paiboon") and 
-                isinstance(item["thai"], str) and isinstance(item["paiboon"], str) and
-                item["thai"].strip() and item["paiboon"].strip()):
-                valid_data.append(item)
-            else:
-                print(f"⚠️ 無効なデータをスキップ: {item}")
+    def _validate_item(self, item: Dict[str, str]) -> Optional[Dict[str, str]]:
+        """空のデータやnull値、既知語彙を除外"""
+        if (item.get("thai") and item.get("paiboon") and
+            isinstance(item["thai"], str) and isinstance(item["paiboon"], str) and
+            item["thai"].strip() and item["paiboon"].strip()):
+            if self.known_vocab is not None and self.known_vocab.seen(item["thai"]):
+                logger.debug("既知語彙のためスキップ: %s", item["thai"])
+                return None
+            return item
+        print(f"⚠️ 無効なデータをスキップ: {item}")
+        return None
 
-        if not valid_data:
-            print("❌ 有効なデータがありません")
+    def _translate_item(self, item: Dict[str, str]) -> Tuple[Dict[str, str], str]:
+        """意味（日本語）を英語に翻訳"""
+        logger.debug("[翻訳] thai: %s", item["thai"])
+        meaning = item["meaning"]
+        METRICS.cache("translation", meaning in self.translation_cache)
+        if meaning not in self.translation_cache:
+            self.translation_cache[meaning] = self._translate_to_english(meaning)
+        return item, self.translation_cache[meaning]
+
+    def _tts_item(self, pair: Tuple[Dict[str, str], str]) -> Optional[Tuple[Dict[str, str], Path]]:
+        """TTS音声を生成してノートと音声パスを返す（共有レートリミッタ・リトライ付き）"""
+        item, english = pair
+        # 同じタイ語が別のワーカーで同時に処理されても同じファイルに書き込まないよう、項目ごとに一意な名前にする
+        tts_path = self.temp_dir / f"{sanitize_filename(item['thai'])}_{uuid.uuid4().hex[:6]}{self.tts_backend.ext}"
+
+        def _attempt():
+            if not replaying():
+                self.tts_limiter.acquire()
+            with METRICS.track_api(f"tts_{self.tts_backend.name}"):
+                self._generate_tts(item["thai"], tts_path)
+
+        try:
+            retry_with_backoff(_attempt, label=f"音声生成({item['thai']})")
+        except Exception as e:
+            print(f"⚠️ 音声生成に失敗したためスキップ: {item['thai']} ({str(e)})")
+            return None
+        note = {
+            "Thai": item["thai"],
+            "Phonetic": item["paiboon"],
+            "English": english,
+            "Audio": f"[sound:{tts_path.name}]"
+        }
+        return note, tts_path
+
+    def _journaled(self, stage: str, key, func, encode=lambda v: v, decode=lambda v: v):
+        """ジャーナル有効時は記録済みの結果を再利用する段関数を返す"""
+        if self.journal is None:
+            return func
+        return self.journal.wrap(stage, key, func, encode, decode)
+
+    def _dedupe_item(self, item: Dict[str, str]) -> Optional[Dict[str, str]]:
+        """表記揺れを正規化したタイ語で既出の語を除外"""
+        if self.deduper.seen(item["thai"], item["paiboon"]):
+            logger.debug("重複のためスキップ: %s", item["thai"])
             return None
+        return item
 
-        print(f"\n📝 デッキ生成対象件数: {len(valid_data)} 件")
+    def _note_stages(self, dedupe: bool = True) -> List[Stage]:
+        """検証→重複排除→Paiboon修正→翻訳→TTS の各段
 
-        # OCRデータを修正
+        キューのワーカーは同じ項目を再試行することがあるのでdedupe=Falseで使う（パッケージ化時にGUIDで重複排除される）。
+        """
+        entry_key = lambda item: json.dumps(item, ensure_ascii=False, sort_keys=True)
+        stages = [Stage("validate", self._validate_item)]
+        self.deduper = VocabDeduper()
+        if dedupe:
+            # OCRが並列でも、表記揺れのうち入力順で最初のものが残るように入力順で照合する
+            stages.append(Stage("dedupe_vocab", self._dedupe_item, ordered=True))
         if self.use_paiboon_correction:
-            corrected_data = self._correct_paiboon(valid_data)
-        else:
-            corrected_data = valid_data
+            rules = self.build_rules()
+            correct = self._journaled("correct", entry_key, lambda entry: self._correct_entry(entry, rules))
+            stages.append(Stage("correct", lambda entry: self._correct_or_keep(correct, entry),
+                                workers=self.stage_workers["correct"]))
+        translate = self._journaled(
+            "translate", entry_key, self._translate_item,
+            encode=lambda pair: list(pair),
+            decode=lambda stored: tuple(stored)
+        )
+        stages.append(Stage("translate", translate, workers=self.stage_workers["translate"]))
+        tts = self._journaled(
+            "tts", lambda pair: entry_key(pair[0]), self._tts_item,
+            encode=lambda result: [result[0], str(result[1])] if result else None,
+            # 失敗した音声や消えたファイルは再生成する
+            decode=lambda stored: (stored[0], Path(stored[1])) if stored and Path(stored[1]).exists() else MISSING
+        )
+        stages.append(Stage("tts", tts, workers=self.stage_workers["tts"]))
+        return stages
 
-        # 翻訳とTTS生成
-        notes = []
-        media_files = []
-        total = len(corrected_data)
-        for idx, item in enumerate(corrected_data, 1):
-            try:
-                print(f"[進捗] {idx}/{total} ({(idx/total)*100:.1f}%) - thai: {item['thai']}")
-                # 英語に翻訳
-                english = self._translate_to_english(item["meaning"])
-                # TTS音声を生成
-                tts_path = self.temp_dir / f"{item['thai']}.mp3"
-                self._generate_tts(item["thai"], tts_path)
-                media_files.append(tts_path)
-                # ノートを作成
-                notes.append({
-                    "Thai": item["thai"],
-                    "Phonetic": item["paiboon"],
-                    "English": english,
-                    "Audio": f"[sound:{tts_path.name}]"
-                })
-            except Exception as e:
-                print(f"⚠️ ノート生成中にエラーが発生: {str(e)}")
-                continue
+    def _run_pipeline(self, source, stages: List[Stage]) -> Optional[Path]:
+        """段をパイプラインで実行し、結果からAnkiパッケージを作成"""
+        pipeline = Pipeline(stages, name=self.deck_name)
+        results = pipeline.run(source)
+        pipeline.report()
+        if self.journal is not None:
+            print(f"🔁 ジャーナルから再利用: {self.journal.hits}件")
+        if self.known_vocab is not None:
+            self.known_vocab.report()
+        self.deduper.report()
+
+        notes = [note for note, _ in results]
+        media_files = [tts_path for _, tts_path in results]
+        return self._package(notes, media_files)
 
+    def _package(self, notes: List[Dict[str, str]], media_files: List[Path]) -> Optional[Path]:
+        """音声の後処理とAnkiパッケージ作成（パイプラインとワーカーモードの共通の最終段）"""
         if not notes:
             print("❌ 有効なノートが生成できませんでした")
             return None
 
+        # 音声の後処理（任意）
+        if self.audio_bitrate:
+            postprocess_audio_files(media_files, bitrate=self.audio_bitrate)
+
         # Ankiパッケージを作成
-        return self._create_anki_package(notes, media_files)
+        output_path = self._create_anki_package(notes, media_files)
+        if output_path is not None:
+            self._completed = True
+        return output_path
+
+    def build(self, data: List[Dict[str, str]]) -> Path:
+        """デッキをビルド（修正・翻訳・TTSを段ごとに並列化したパイプラインで実行）"""
+        if not data:
+            print("❌ 有効なデータがありません")
+            return None
+        print(f"\n📝 デッキ生成対象件数: {len(data)} 件")
+        return self._run_pipeline(data, self._note_stages())
 
     def cleanup(self):
-        """一時ファイルを削除"""
+        """一時ファイルを削除（ジャーナル有効時、未完了なら再開用に残す）"""
         import shutil
-        shutil.rmtree(self.temp_dir) 
\ No newline at end of file
+        if self.journal is not None:
+            if not self._completed:
+                print(f"💾 途中結果を保存しました。--resume で再開できます: job={self.journal.job_id}")
+                self.journal.close()
+                return
+            self.journal.clear()
+            self.journal.close()
+        if self._owns_temp_dir:
+            shutil.rmtree(self.temp_dir, ignore_errors=True) 
\ No newline at end of file
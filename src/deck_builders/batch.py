@@ -0,0 +1,194 @@
+import csv
+import json
+import time
+import pathlib
+import datetime
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from ..common.tts import get_tts_backend
+from ..common.audio import tts_limiter
+from ..common.journal import job_id_for
+from ..common.known_vocab import load_known_vocab
+
+REPORT_DIR = pathlib.Path("data/output/system/batch_reports")
+
+# マニフェストで指定できるジョブごとの設定と既定値
+JOB_DEFAULTS: Dict[str, Any] = {
+    "frame_interval": 5,
+    "ssim_threshold": 0.99,
+    "no_paiboon_correction": False,
+    "generate_media": False,
+    "incremental": False,
+    "audio_bitrate": None,
+}
+
+def load_manifest(path: pathlib.Path) -> List[Dict[str, Any]]:
+    """マニフェスト（YAML/TSV/CSV）からジョブ一覧を読み込む
+
+    YAML: `jobs:` のリスト（または直接リスト）。`defaults:` で共通設定を指定可能。
+    TSV/CSV: ヘッダ付きで `source` と `deck_name` 列が必須、その他の列は任意設定。
+    """
+    path = pathlib.Path(path)
+    defaults: Dict[str, Any] = {}
+    if path.suffix.lower() in (".yml", ".yaml"):
+        import yaml
+        with open(path, encoding="utf-8") as f:
+            data = yaml.safe_load(f) or []
+        if isinstance(data, dict):
+            defaults = data.get("defaults") or {}
+            entries = data.get("jobs") or []
+        else:
+            entries = data
+    else:
+        delimiter = "\t" if path.suffix.lower() == ".tsv" else ","
+        with open(path, encoding="utf-8") as f:
+            entries = [
+                {k: v for k, v in row.items() if v not in (None, "")}
+                for row in csv.DictReader(f, delimiter=delimiter)
+            ]
+    jobs = []
+    for idx, entry in enumerate(entries, 1):
+        job = dict(JOB_DEFAULTS)
+        job.update(defaults)
+        job.update(entry)
+        if not job.get("source") or not job.get("deck_name"):
+            raise ValueError(f"マニフェスト{idx}行目: source と deck_name は必須です: {entry}")
+        job["source"] = str(job["source"])
+        job["type"] = job.get("type") or ("youtube" if job["source"].startswith(("http://", "https://")) else "images")
+        for key in ("frame_interval",):
+            job[key] = int(job[key])
+        job["ssim_threshold"] = float(job["ssim_threshold"])
+        for key in ("no_paiboon_correction", "generate_media", "incremental"):
+            if isinstance(job[key], str):
+                job[key] = job[key].strip().lower() in ("1", "true", "yes", "y")
+        jobs.append(job)
+    return jobs
+
+class BatchRunner:
+    """複数ジョブを1つのワーカープールで実行し、クライアントやキャッシュを共有する"""
+
+    def __init__(self, workers: int = 2, output_dir: str = "data/output/decks",
+                 tts_backend: Optional[str] = None, tts_rate: Optional[float] = None,
+                 resume: bool = False, known_decks: Optional[List[pathlib.Path]] = None):
+        from openai import OpenAI
+        self.workers = max(1, workers)
+        self.output_dir = pathlib.Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.resume = resume
+        self.tts_backend = get_tts_backend(tts_backend)
+        # ジョブ間で共有するもの（起動・接続コストとレートリミットを一本化）
+        self.client = OpenAI()
+        self.tts_limiter = tts_limiter(self.tts_backend, tts_rate)
+        self.translation_cache: Dict[str, str] = {}
+        self.known_vocab = load_known_vocab(known_decks)
+        self.statuses: List[Dict[str, Any]] = []
+
+    def _run_youtube(self, job: Dict[str, Any]) -> Optional[pathlib.Path]:
+        from .youtube import YouTubeDeckBuilder, download_video
+        builder = YouTubeDeckBuilder(
+            output_dir=str(self.output_dir),
+            deck_name=job["deck_name"],
+            ssim_threshold=job["ssim_threshold"],
+            use_paiboon_correction=not job["no_paiboon_correction"],
+            tts_backend=self.tts_backend,
+            audio_bitrate=job["audio_bitrate"],
+            incremental=job["incremental"],
+            job_id=job_id_for(job["source"], job["deck_name"]),
+            resume=self.resume,
+            client=self.client,
+            shared_tts_limiter=self.tts_limiter,
+            translation_cache=self.translation_cache,
+            known_vocab=self.known_vocab,
+        )
+        try:
+            video_path = download_video(job["source"], self.output_dir)
+            return builder.build(video_path, job["frame_interval"])
+        finally:
+            builder.cleanup()
+
+    def _run_images(self, job: Dict[str, Any]) -> Optional[pathlib.Path]:
+        from .image_table import process_image_table
+        return process_image_table(
+            pathlib.Path(job["source"]),
+            job["deck_name"],
+            job["generate_media"],
+            tts_backend=self.tts_backend,
+            audio_bitrate=job["audio_bitrate"],
+            incremental=job["incremental"],
+            limiter=self.tts_limiter,
+            known_vocab=self.known_vocab,
+            output_dir=self.output_dir,
+            client=self.client,
+        )
+
+    def _run_job(self, status: Dict[str, Any]) -> None:
+        job = status["job"]
+        status["status"] = "running"
+        started = time.monotonic()
+        print(f"\n🚀 [{status['index']}/{len(self.statuses)}] ジョブ開始: {job['deck_name']} ({job['source']})")
+        try:
+            if job["type"] == "youtube":
+                output_path = self._run_youtube(job)
+            elif job["type"] == "images":
+                output_path = self._run_images(job)
+            else:
+                raise ValueError(f"未知のジョブ種別です: {job['type']}")
+            status["output"] = str(output_path) if output_path else None
+            status["status"] = "done" if output_path else "empty"
+        except Exception as e:
+            status["status"] = "failed"
+            status["error"] = str(e)
+            traceback.print_exc()
+        status["elapsed_seconds"] = round(time.monotonic() - started, 1)
+        print(f"🏁 [{status['index']}/{len(self.statuses)}] {status['status']}: {job['deck_name']} "
+              f"({status['elapsed_seconds']}秒)")
+
+    def run(self, jobs: List[Dict[str, Any]]) -> pathlib.Path:
+        """全ジョブを実行し、サマリーレポートのパスを返す"""
+        self.statuses = [
+            {"index": i, "job": job, "status": "pending", "output": None, "error": None, "elapsed_seconds": None}
+            for i, job in enumerate(jobs, 1)
+        ]
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            list(pool.map(self._run_job, self.statuses))
+        return self.write_report(time.monotonic() - started)
+
+    def write_report(self, elapsed: float) -> pathlib.Path:
+        """ジョブごとの状態をJSONに書き出し、表形式で表示"""
+        REPORT_DIR.mkdir(parents=True, exist_ok=True)
+        ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        report_path = REPORT_DIR / f"batch_{ts}.json"
+        counts: Dict[str, int] = {}
+        for status in self.statuses:
+            counts[status["status"]] = counts.get(status["status"], 0) + 1
+        report = {
+            "finished_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "elapsed_seconds": round(elapsed, 1),
+            "workers": self.workers,
+            "counts": counts,
+            "translation_cache_size": len(self.translation_cache),
+            "jobs": [
+                {
+                    "deck_name": s["job"]["deck_name"],
+                    "source": s["job"]["source"],
+                    "type": s["job"]["type"],
+                    "status": s["status"],
+                    "output": s["output"],
+                    "error": s["error"],
+                    "elapsed_seconds": s["elapsed_seconds"],
+                }
+                for s in self.statuses
+            ],
+        }
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n📋 バッチ結果 ({elapsed:.1f}秒, 並列{self.workers}): "
+              + ", ".join(f"{k}={v}" for k, v in sorted(counts.items())))
+        for s in self.statuses:
+            mark = {"done": "✅", "empty": "⚠️", "failed": "❌"}.get(s["status"], "⏸️")
+            detail = s["output"] or s["error"] or ""
+            print(f"  {mark} {s['job']['deck_name']} [{s['status']}, {s['elapsed_seconds']}秒] {detail}")
+        print(f"📝 レポート: {report_path}")
+        return report_path
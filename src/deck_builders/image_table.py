@@ -1,26 +1,38 @@
 import os
+import json
 import time
+import hashlib
 import pathlib
 import tempfile
-from typing import List, Tuple
-from genanki import Model, Note, Deck, Package
-from ..common.audio import gen_audio
-from ..common.ocr import ocr_and_process
+from typing import List, Optional, Tuple, Union
+from ..common.audio import gen_audio_batch, tts_limiter
+from ..common.tts import DEFAULT_TTS_BACKEND, TTSBackend, get_tts_backend
+from ..common.ratelimit import RateLimiter
+from ..common.audio_post import postprocess_audio_files
+from ..common.ocr import ocr_and_process, openai_client
+from ..common.image import list_image_files, iter_prepared_images
+from ..common.apkg import stable_deck_id, note_guid, media_refs, DeckState, write_apkg
+from ..common.known_vocab import KnownVocab
+from ..common.dedupe import VocabDeduper
+from ..common.ingest_manifest import IngestManifest, watch_directory
+from ..common.cassette import replaying
 
-def build_deck(rows: List[Tuple[str, str, str, str, str]], deck_name: str, media_dir: pathlib.Path) -> None:
-    """Ankiデッキを生成する"""
+DEFAULT_OUTPUT_DIR = pathlib.Path("data/output/decks")
+
+def deck_output_path(deck_name: str, output_dir: Union[str, pathlib.Path] = DEFAULT_OUTPUT_DIR) -> pathlib.Path:
+    return pathlib.Path(output_dir) / f"{deck_name.replace(' ', '_')}.apkg"
+
+def build_deck(rows: List[Tuple[str, str, str, str, str]], deck_name: str, media_dir: pathlib.Path,
+               incremental: bool = False,
+               output_dir: Union[str, pathlib.Path] = DEFAULT_OUTPUT_DIR) -> Optional[pathlib.Path]:
+    """Ankiデッキを生成する（書き出したapkgのパスを返す。失敗・書き出すノートなしの場合はNone）"""
+    from genanki import Model, Note, Deck
     if not rows:
         print("❌ 処理対象のデータがありません")
-        return
+        return None
 
     print(f"\n📦 デッキ生成開始: {deck_name}")
     print(f"📂 メディアディレクトリ: {media_dir}")
-    
-    # メディアファイルの存在確認
-    media_files = list(media_dir.iterdir())
-    print(f"📋 メディアファイル一覧:")
-    for f in media_files:
-        print(f"  - {f.name} ({f.stat().st_size:,} bytes)")
 
     model = Model(
         1607392319,
@@ -34,25 +46,45 @@ def build_deck(rows: List[Tuple[str, str, str, str, str]], deck_name: str, media
         }],
     )
 
-    # デッキIDを32ビット整数に収まるように生成
-    deck_id = abs(hash(deck_name)) % (2**31 - 1)
+    # デッキIDをデッキ名から決定的に生成（32ビット整数に収まる）
+    deck_id = stable_deck_id(deck_name)
     deck = Deck(deck_id, deck_name)
 
+    entries = []
+    seen_guids = set()
     for eng, thai, phonetic, audio, pic in rows:
+        if not phonetic:
+            print(f"⚠️ 声調付きローマ字変換に失敗しました: {thai}")
+        fields = [
+            thai,           # Thai
+            phonetic,       # Phonetic (声調付きローマ字)
+            eng,            # English
+            "",             # Extra (空文字)
+            f"[sound:{audio}]" if audio else "",
+            f"<img src=\"{pic}\">" if pic else "",
+        ]
+        guid = note_guid(thai)
+        if guid in seen_guids:
+            print(f"⚠️ 同じタイ語のノートが既にあるためスキップ: {thai}")
+            continue
+        seen_guids.add(guid)
+        entries.append((guid, fields, (guid, fields)))
+
+    selected = [value for _, _, value in entries]
+    state = None
+    if incremental:
+        state = DeckState(deck_name)
+        selected = state.filter_changed(entries)
+        print(f"🔁 インクリメンタル出力: {len(selected)}/{len(entries)} 件が新規または変更")
+        if not selected:
+            print("✅ 変更されたノートはありません")
+            return None
+
+    for guid, fields in selected:
         try:
-            if not phonetic:
-                print(f"⚠️ 声調付きローマ字変換に失敗しました: {thai}")
-            note = Note(model, [
-                thai,           # Thai
-                phonetic,       # Phonetic (声調付きローマ字)
-                eng,            # English
-                "",             # Extra (空文字)
-                f"[sound:{audio}]" if audio else "",
-                f"<img src=\"{pic}\">" if pic else "",
-            ])
-            deck.add_note(note)
+            deck.add_note(Note(model, fields, guid=guid))
         except Exception as e:
-            print(f"❌ ノートの作成に失敗しました: {thai}")
+            print(f"❌ ノートの作成に失敗しました: {fields[0]}")
             print(f"エラー: {str(e)}")
             continue
 
@@ -60,79 +92,148 @@ def build_deck(rows: List[Tuple[str, str, str, str, str]], deck_name: str, media
         print("\n📦 パッケージ生成開始")
         # メディアファイルのパスを絶対パスに変換
         media_files = [str(p.absolute()) for p in media_dir.iterdir()]
-        print(f"📋 パッケージに含めるメディアファイル:")
-        for f in media_files:
-            print(f"  - {f}")
-            if not pathlib.Path(f).exists():
-                print(f"  ❌ ファイルが存在しません: {f}")
-            else:
-                print(f"  ✅ ファイルサイズ: {pathlib.Path(f).stat().st_size:,} bytes")
+        if incremental:
+            # 書き出すノートが参照するメディアのみ含める
+            refs = media_refs(f for _, fields in selected for f in fields)
+            media_files = [f for f in media_files if pathlib.Path(f).name in refs]
+        # メディアファイルの件数と合計サイズ（statは1回だけ）
+        total_bytes = sum(os.path.getsize(f) for f in media_files)
+        print(f"📋 パッケージに含めるメディアファイル: {len(media_files)}件 ({total_bytes:,} bytes)")
 
         # 出力ディレクトリの作成
-        output_dir = pathlib.Path("data/output/decks")
-        output_dir.mkdir(parents=True, exist_ok=True)
-        fname = f"{deck_name.replace(' ', '_')}.apkg"
-        output_path = output_dir / fname
-
-        if media_files:
-            pkg = Package(deck, media_files=media_files)
-            pkg.write_to_file(str(output_path))
-            print(f"✅ 生成完了: {output_path}")
-        else:
+        output_path = deck_output_path(deck_name, output_dir)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+
+        if not media_files:
             print("⚠️ メディアファイルが見つかりません")
-            pkg = Package(deck)
-            pkg.write_to_file(str(output_path))
-            print(f"✅ 生成完了（メディアなし）: {output_path}")
+        write_apkg(deck, output_path, media_files)
+        print(f"✅ 生成完了: {output_path}")
+        if state is not None:
+            state.update(selected)
+            state.save()
+        return output_path
     except Exception as e:
         print("❌ デッキの生成に失敗しました")
         print(f"エラー: {str(e)}")
         import traceback
         traceback.print_exc()
+        return None
+
+def build_options_hash(deck_name: str, generate_media: bool = False,
+                       tts_backend: Union[str, TTSBackend, None] = None, audio_bitrate: Optional[str] = None,
+                       incremental: bool = False, known_vocab: Optional[KnownVocab] = None) -> str:
+    """デッキの中身を左右するオプションのハッシュ（画像が変わっていなくても、これが変われば作り直す）"""
+    if isinstance(tts_backend, TTSBackend):
+        tts_backend = tts_backend.name
+    options = {
+        "deck_name": deck_name,
+        "generate_media": generate_media,
+        "tts_backend": (tts_backend or DEFAULT_TTS_BACKEND) if generate_media else None,
+        "audio_bitrate": audio_bitrate,
+        "incremental": incremental,
+        "known_vocab": known_vocab.fingerprint() if known_vocab is not None else None,
+    }
+    return hashlib.sha1(json.dumps(options, sort_keys=True).encode("utf-8")).hexdigest()
+
+def process_image_table(input_dir: pathlib.Path, deck_name: str, generate_media: bool = False,
+                        tts_workers: Optional[int] = None, tts_rate: Optional[float] = None,
+                        tts_backend: Optional[str] = None, audio_bitrate: Optional[str] = None,
+                        incremental: bool = False, limiter: Optional[RateLimiter] = None,
+                        known_vocab: Optional[KnownVocab] = None,
+                        preprocess_workers: Optional[int] = None, use_manifest: bool = True,
+                        output_dir: Union[str, pathlib.Path] = DEFAULT_OUTPUT_DIR,
+                        tile: Optional[bool] = None, client=None) -> Optional[pathlib.Path]:
+    """画像表を処理してAnkiデッキを生成し、書き出したapkgのパスを返す（limiterを渡すと他ジョブとレートリミットを共有、known_vocabにある語は除外）
 
-def process_image_table(input_dir: pathlib.Path, deck_name: str, generate_media: bool = False) -> None:
-    """画像表を処理してAnkiデッキを生成する"""
-    image_files = []
-    pats = (".jpg", ".jpeg", ".png", ".JPG", ".JPEG", ".PNG")
-    image_files = sorted([
-        p for p in input_dir.iterdir()
-        if p.suffix.lower() in pats and not p.name.startswith("temp_")
-    ])
+    画像のデコード・向き補正・リサイズはプロセスプールでOCRと並行してメモリ上で行い、入力ディレクトリには書き込まない。
+    tileは行の帯への分割（Noneなら応答が途中で切れたときだけ、Trueなら縦に長い表は常に分割）。
+    clientはOCRに使うOpenAIクライアント（渡さなければ1回だけ作ってすべての画像で使う）。
+    use_manifestがTrueなら処理済みマニフェストを使い、新規・変更された画像だけをOCRして前回の行とまとめる。
+    画像に変化がなく、前回と同じオプションで書き出したデッキがあれば何もしない。
+    """
+    image_files = list_image_files(input_dir)
 
     if not image_files:
         print("❌ 処理対象の画像が見つかりません")
-        return
+        return None
+
+    # 常に帯に分けたOCRは行の取れ方が違うので、別のマニフェストに記録する
+    variant = "image_table_tiled" if tile else "image_table"
+    manifest = IngestManifest(input_dir, variant=variant) if use_manifest else None
+    output_path = deck_output_path(deck_name, output_dir)
+    options_hash = build_options_hash(deck_name, generate_media, tts_backend, audio_bitrate, incremental, known_vocab)
+    if manifest is not None:
+        cached, todo = manifest.plan(image_files)
+        removed = manifest.prune(image_files)
+        manifest.save()
+        print(f"🗂️ 処理済みマニフェスト: 再利用 {len(cached)}件 / 新規・変更 {len(todo)}件"
+              + (f" / 削除 {removed}件" if removed else ""))
+        if not todo and not removed and manifest.built_with(output_path, options_hash):
+            print("✅ 新規・変更された画像はありません")
+            return output_path
+    else:
+        cached, todo = {}, image_files
 
     media_dir = pathlib.Path(tempfile.mkdtemp())
     print(f"\n📂 メディアディレクトリ作成: {media_dir}")
-    all_rows = []
+    rows_by_file = dict(cached)
+    if todo and client is None:
+        client = openai_client()
 
-    for img in image_files:
+    for img, image_bytes, error in iter_prepared_images(todo, workers=preprocess_workers):
         print(f"\n📝 処理中: {img.name}")
-        rows = ocr_and_process(img, media_dir)
-        all_rows.extend(rows)
-        time.sleep(2.5)  # OpenAI Vision API対策
+        if error:
+            print(f"❌ 画像の前処理に失敗しました: {img}")
+            print(f"エラー: {error}")
+            continue
+        rows = ocr_and_process(img, media_dir, image_bytes=image_bytes, tile=tile, client=client)
+        rows_by_file[img] = rows
+        if manifest is not None:
+            manifest.record(img, rows)
+            manifest.save()
+        if not replaying():
+            time.sleep(2.5)  # OpenAI Vision API対策
 
-    # Paiboonで重複排除
+    # ファイル名順にまとめる（既知語彙の除外・重複排除はマニフェストの行にも毎回適用する）
+    deduper = VocabDeduper()
     unique_rows = []
-    seen_paiboon = set()
-    for eng, thai, paiboon in all_rows:
-        if not paiboon or paiboon in seen_paiboon:
-            continue
-        seen_paiboon.add(paiboon)
-        unique_rows.append((eng, thai, paiboon))
+    for img in image_files:
+        rows = [row for row in rows_by_file.get(img, []) if row[2]]
+        if known_vocab is not None:
+            rows = [row for row in rows if not known_vocab.seen(row[1])]
+        unique_rows.extend(deduper.filter_rows(rows))
+
+    if known_vocab is not None:
+        known_vocab.report()
+    deduper.report()
 
-    # 音声ファイル生成（重複排除後のみ）
+    # 音声ファイル生成（重複排除後のみ、レートリミット付きで並列実行）
+    if generate_media:
+        backend = get_tts_backend(tts_backend)
+        audio_files = gen_audio_batch(
+            [(eng, thai) for eng, thai, _ in unique_rows], media_dir,
+            backend=backend, workers=tts_workers, limiter=limiter or tts_limiter(backend, tts_rate)
+        )
+    else:
+        audio_files = [""] * len(unique_rows)
     final_rows = []
-    for eng, thai, paiboon in unique_rows:
-        audio_file = ""
-        if generate_media:
-            try:
-                audio_file = gen_audio(eng, thai, media_dir)
-                time.sleep(0.7)  # gTTS対策
-            except Exception as e:
-                print(f"⚠️ 音声生成に失敗しました: {eng}")
-                print(f"エラー: {str(e)}")
+    for (eng, thai, paiboon), audio_file in zip(unique_rows, audio_files):
         pic_file = ""  # 画像は使わない
         final_rows.append((eng, thai, paiboon, audio_file, pic_file))
 
-    build_deck(final_rows, deck_name, media_dir) 
\ No newline at end of file
+    # 音声の後処理（任意）
+    if audio_bitrate:
+        postprocess_audio_files(media_dir.iterdir(), bitrate=audio_bitrate)
+
+    written = build_deck(final_rows, deck_name, media_dir, incremental=incremental, output_dir=output_dir)
+    if manifest is not None and written is not None:
+        manifest.record_build(written, options_hash)
+        manifest.save()
+    return written
+
+def watch_image_table(input_dir: pathlib.Path, deck_name: str, interval: float = 10.0, **kwargs) -> None:
+    """一度処理した後、input_dirを監視して画像が追加・変更されるたびにデッキを作り直す"""
+    process_image_table(input_dir, deck_name, **kwargs)
+    watch_directory(lambda: list_image_files(input_dir),
+                    lambda: process_image_table(input_dir, deck_name, **kwargs),
+                    interval=interval)
@@ -0,0 +1,168 @@
+import re
+import csv
+import shutil
+import hashlib
+import pathlib
+import zipfile
+import tempfile
+from typing import Dict, Iterable, List, Optional, Tuple
+from ..common.apkg import (
+    stable_deck_id, note_guid, thai_vocab_model, write_apkg,
+    open_apkg_collection, read_apkg_media_map, iter_apkg_notes,
+)
+from ..common.dedupe import paiboon_vocab_key, thai_vocab_key
+
+SOUND_RE = re.compile(r"\[sound:([^\]]+)\]")
+
+def index_key(thai: str, paiboon: str) -> bytes:
+    """正規化したタイ語+Paiboonのハッシュ（重複判定インデックス用、8バイト）"""
+    key = f"{thai_vocab_key(thai)}\x1f{paiboon_vocab_key(paiboon)}"
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+
+def _split_fields(fields: List[str]) -> Tuple[str, str, str, str]:
+    """ノートのフィールドから (thai, paiboon, english, 音声ファイル名) を取り出す"""
+    thai = fields[0] if len(fields) > 0 else ""
+    paiboon = fields[1] if len(fields) > 1 else ""
+    english = fields[2] if len(fields) > 2 else ""
+    audio = ""
+    for f in fields:
+        m = SOUND_RE.search(f)
+        if m:
+            audio = m.group(1)
+            break
+    return thai, paiboon, english, audio
+
+class MediaStore:
+    """内容ハッシュでメディアを重複排除しながら一時ディレクトリに集める"""
+
+    def __init__(self, media_dir: pathlib.Path):
+        self.media_dir = media_dir
+        self.by_hash: Dict[str, str] = {}
+        self.bytes_deduped = 0
+
+    def add(self, fname: str, open_src) -> str:
+        """メディアを追加し、マージ後のファイル名を返す（同一内容は既存名を再利用）"""
+        tmp_path = self.media_dir / f".incoming_{len(self.by_hash)}"
+        sha1 = hashlib.sha1()
+        with open_src() as src, open(tmp_path, "wb") as dst:
+            for chunk in iter(lambda: src.read(1 << 16), b""):
+                sha1.update(chunk)
+                dst.write(chunk)
+        digest = sha1.hexdigest()
+        if digest in self.by_hash:
+            self.bytes_deduped += tmp_path.stat().st_size
+            tmp_path.unlink()
+            return self.by_hash[digest]
+        name = fname
+        if (self.media_dir / name).exists():
+            # 同名で内容が異なる場合はハッシュを付けて衝突を避ける
+            stem, ext = pathlib.Path(fname).stem, pathlib.Path(fname).suffix
+            name = f"{stem}_{digest[:8]}{ext}"
+        tmp_path.rename(self.media_dir / name)
+        self.by_hash[digest] = name
+        return name
+
+    @property
+    def paths(self) -> List[str]:
+        return [str(self.media_dir / name) for name in self.by_hash.values()]
+
+def _iter_apkg_rows(apkg_path: pathlib.Path, z: zipfile.ZipFile):
+    """apkgから (thai, paiboon, english, 音声ファイル名, メディアを開く関数) を返す"""
+    media_map = read_apkg_media_map(z)
+    entry_by_name = {name: entry for entry, name in media_map.items()}
+    conn = open_apkg_collection(z)
+    try:
+        for _, fields in iter_apkg_notes(conn):
+            thai, paiboon, english, audio = _split_fields(fields)
+            opener = None
+            if audio and audio in entry_by_name:
+                entry = entry_by_name[audio]
+                opener = lambda entry=entry: z.open(entry)
+            elif audio:
+                print(f"  ⚠️ 音声ファイルがパッケージ内に見つかりません: {audio} ({apkg_path.name})")
+            yield thai, paiboon, english, audio, opener
+    finally:
+        conn.close()
+
+def _iter_tsv_rows(tsv_path: pathlib.Path):
+    """中間行ファイル(TSV/CSV)から行を返す（音声ファイルはファイルからの相対パス）"""
+    delimiter = "\t" if tsv_path.suffix.lower() == ".tsv" else ","
+    with open(tsv_path, encoding="utf-8") as f:
+        reader = csv.DictReader(f, delimiter=delimiter)
+        for row in reader:
+            thai = row.get("thai") or row.get("Thai") or ""
+            paiboon = row.get("paiboon") or row.get("Phonetic") or row.get("phonetic") or ""
+            english = row.get("english") or row.get("English") or row.get("meaning") or ""
+            audio = row.get("audio") or row.get("Audio") or ""
+            m = SOUND_RE.search(audio)
+            if m:
+                audio = m.group(1)
+            opener = None
+            if audio:
+                audio_path = tsv_path.parent / audio
+                if audio_path.exists():
+                    opener = lambda p=audio_path: open(p, "rb")
+                    audio = audio_path.name
+            yield thai, paiboon, english, audio, opener
+
+def merge_decks(inputs: Iterable[pathlib.Path], deck_name: str,
+                output_path: Optional[pathlib.Path] = None) -> Optional[pathlib.Path]:
+    """複数のapkg/中間行ファイルを1つのマスターデッキに統合する（1パスで重複排除）"""
+    from genanki import Note, Deck
+    inputs = [pathlib.Path(p) for p in inputs]
+    if output_path is None:
+        output_path = pathlib.Path("data/output/decks") / f"{deck_name.replace(' ', '_')}.apkg"
+    model = thai_vocab_model()
+    deck = Deck(stable_deck_id(deck_name), deck_name)
+    seen_keys = set()
+    seen_guids = set()
+    total = duplicates = conflicts = 0
+    media_dir = pathlib.Path(tempfile.mkdtemp())
+    media = MediaStore(media_dir)
+    try:
+        for path in inputs:
+            print(f"\n📥 読み込み中: {path}")
+            before = len(deck.notes)
+            if path.suffix.lower() == ".apkg":
+                z = zipfile.ZipFile(path)
+                rows = _iter_apkg_rows(path, z)
+            else:
+                z = None
+                rows = _iter_tsv_rows(path)
+            try:
+                for thai, paiboon, english, audio, opener in rows:
+                    if not thai.strip() or not paiboon.strip():
+                        continue
+                    total += 1
+                    key = index_key(thai, paiboon)
+                    if key in seen_keys:
+                        duplicates += 1
+                        continue
+                    seen_keys.add(key)
+                    guid = note_guid(thai)
+                    if guid in seen_guids:
+                        # 同じタイ語で異なるPaiboonの場合はGUIDが衝突するため先勝ち
+                        print(f"  ⚠️ 同じタイ語のノートが既にあるためスキップ: {thai} ({paiboon})")
+                        conflicts += 1
+                        continue
+                    seen_guids.add(guid)
+                    audio_field = ""
+                    if opener is not None:
+                        audio_field = f"[sound:{media.add(audio, opener)}]"
+                    deck.add_note(Note(model, [thai, paiboon, english, audio_field], guid=guid))
+            finally:
+                if z is not None:
+                    z.close()
+            print(f"  ✅ 追加: {len(deck.notes) - before}件")
+
+        if not deck.notes:
+            print("❌ マージ対象のノートがありません")
+            return None
+        write_apkg(deck, output_path, media.paths)
+        print(f"\n✅ マージ完了: {output_path}")
+        print(f"  - 入力ノート: {total}件 / 出力ノート: {len(deck.notes)}件")
+        print(f"  - 重複除去: {duplicates}件 / タイ語衝突: {conflicts}件")
+        print(f"  - メディア: {len(media.by_hash)}件 (共有により {media.bytes_deduped:,} bytes 削減)")
+        return output_path
+    finally:
+        shutil.rmtree(media_dir)
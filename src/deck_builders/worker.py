@@ -0,0 +1,185 @@
+import os
+import time
+import socket
+import pathlib
+import threading
+import traceback
+import multiprocessing
+from typing import Any, Dict, Optional, Tuple
+from ..common.workqueue import WorkQueue, WORKQUEUE_PATH, DEFAULT_LEASE_SECONDS, DEFAULT_MAX_ATTEMPTS
+from ..common.known_vocab import load_known_vocab
+from ..common.text_gate import TextGate
+from ..common.frames import FrameScanner
+
+def frame_item_id(frame_count: int) -> str:
+    """フレーム番号順に並ぶアイテムID（結果はアイテムID順にパッケージ化される）"""
+    return f"{frame_count:08d}"
+
+def enqueue_video(queue: WorkQueue, video_path: pathlib.Path, deck_name: str, job_id: str,
+                  frame_interval: int = 5, ssim_threshold: float = 0.99,
+                  config: Optional[Dict[str, Any]] = None,
+                  text_gate_lines: Optional[int] = None) -> int:
+    """動画からフレーム抽出・重複除去までをローカルで行い、フレームごとの作業アイテムとして登録する
+
+    フレームは共有ディレクトリに保存し、ペイロードにはキューからの相対パスを入れる
+    （マシンごとにマウント先が違っても同じキューファイルを使えるように）。APIキーは不要。
+    """
+    config = dict(config or {})
+    config.setdefault("ssim_threshold", ssim_threshold)
+    frames_dir = queue.job_dir(job_id) / "frames"
+    frames_dir.mkdir(parents=True, exist_ok=True)
+    scanner = FrameScanner(frames_dir, ssim_threshold,
+                           TextGate(text_gate_lines) if text_gate_lines else None)
+    print(f"\n🎞️ フレーム抽出・重複除去: {video_path.name}")
+    items = [(frame_item_id(frame_count), {"frame": str(frame_path.relative_to(queue.root))})
+             for frame_count, frame_path in scanner.scan(video_path, frame_interval)]
+    if scanner.text_gate is not None:
+        scanner.text_gate.report()
+    count = queue.add_job(job_id, deck_name, config, items)
+    print(f"📮 キューに登録: job={job_id} ({count}フレーム) → {queue.path}")
+    return count
+
+class QueueWorker:
+    """共有キューからフレームを取得してOCR〜TTSを行い、終わったジョブをパッケージ化するワーカー"""
+
+    def __init__(self, queue_path: pathlib.Path = WORKQUEUE_PATH, worker_id: Optional[str] = None,
+                 threads: int = 1, lease_seconds: float = DEFAULT_LEASE_SECONDS,
+                 poll_interval: float = 2.0, exit_when_idle: bool = True,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.queue = WorkQueue(queue_path)
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.threads = max(1, threads)
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.exit_when_idle = exit_when_idle
+        self.max_attempts = max_attempts
+        self.processed = 0
+        self.failed = 0
+        self.finalized = 0
+        self._builders: Dict[str, Tuple[Any, list]] = {}
+        self._known: Dict[tuple, Any] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _known_vocab(self, paths: Optional[list]):
+        """既知語彙の索引（同じデッキ群はワーカー内で1回だけ読み込む、呼び出し側でロックを取る）"""
+        if not paths:
+            return None
+        key = tuple(paths)
+        if key not in self._known:
+            self._known[key] = load_known_vocab(paths)
+        return self._known[key]
+
+    def _builder(self, job_id: str, deck_name: str, config: Dict[str, Any]):
+        """ジョブごとのビルダーと段（Paiboon修正ルールの構築は1回だけ）を用意"""
+        from .youtube import YouTubeDeckBuilder
+        with self._lock:
+            if job_id not in self._builders:
+                builder = YouTubeDeckBuilder(
+                    output_dir=config.get("output_dir", "data/output/decks"),
+                    deck_name=deck_name,
+                    ssim_threshold=config.get("ssim_threshold", 0.99),
+                    use_paiboon_correction=config.get("use_paiboon_correction", True),
+                    tts_backend=config.get("tts_backend"),
+                    tts_rate=config.get("tts_rate"),
+                    audio_bitrate=config.get("audio_bitrate"),
+                    incremental=config.get("incremental", False),
+                    work_dir=self.queue.job_dir(job_id) / "media",
+                    known_vocab=self._known_vocab(config.get("known_decks")),
+                )
+                self._builders[job_id] = (builder, builder._note_stages(dedupe=False))
+            return self._builders[job_id]
+
+    def _process_item(self, job_id: str, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """1フレーム分のOCR→検証→Paiboon修正→翻訳→TTSを実行"""
+        deck_name, config = self.queue.job_config(job_id)
+        builder, stages = self._builder(job_id, deck_name, config)
+        value = builder._ocr_stage(self.queue.root / payload["frame"])
+        for stage in stages:
+            if value is None:
+                return None
+            value = stage.func(value)
+        if value is None:
+            return None
+        note, tts_path = value
+        return {"note": note, "audio": tts_path.name}
+
+    def _finalize(self, job_id: str, deck_name: str, config: Dict[str, Any]) -> None:
+        """全フレームの結果を集めて通常のパッケージ化処理に渡す"""
+        print(f"\n📦 パッケージ化を担当: job={job_id} ({deck_name})")
+        try:
+            builder, _ = self._builder(job_id, deck_name, config)
+            results = [r for r in self.queue.results(job_id) if r]
+            notes = [r["note"] for r in results]
+            media_files = [builder.temp_dir / r["audio"] for r in results]
+            output_path = builder._package(notes, media_files)
+            self.queue.finish_job(self.worker_id, job_id, str(output_path) if output_path else None,
+                                  None if output_path else "有効なノートがありません")
+            self.finalized += 1
+        except Exception as e:
+            traceback.print_exc()
+            self.queue.finish_job(self.worker_id, job_id, None, str(e))
+
+    def _heartbeat_loop(self) -> None:
+        """リース期限の1/3ごとに、このワーカーが持つリースを延長する"""
+        while not self._stop.wait(self.lease_seconds / 3):
+            try:
+                self.queue.heartbeat(self.worker_id, self.lease_seconds)
+            except Exception as e:
+                print(f"⚠️ ハートビートに失敗: {e}")
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            claimed = self.queue.claim(self.worker_id, self.lease_seconds, max_attempts=self.max_attempts)
+            if claimed:
+                job_id, item_id, payload = claimed[0]
+                try:
+                    result = self._process_item(job_id, payload)
+                    if not self.queue.complete(self.worker_id, job_id, item_id, result):
+                        print(f"⚠️ リースを失ったため結果を破棄: {job_id}/{item_id}")
+                    with self._lock:
+                        self.processed += 1
+                except Exception as e:
+                    print(f"⚠️ アイテム処理に失敗: {job_id}/{item_id} ({e})")
+                    self.queue.fail(self.worker_id, job_id, item_id, str(e), self.max_attempts)
+                    with self._lock:
+                        self.failed += 1
+                continue
+            job = self.queue.claim_finalize(self.worker_id, self.lease_seconds)
+            if job is not None:
+                self._finalize(*job)
+                continue
+            if self.exit_when_idle and not self.queue.has_open_work():
+                return
+            time.sleep(self.poll_interval)
+
+    def run(self) -> None:
+        print(f"👷 ワーカー開始: {self.worker_id} (スレッド{self.threads}, リース{self.lease_seconds:.0f}秒)")
+        heartbeat = threading.Thread(target=self._heartbeat_loop, name=f"{self.worker_id}-heartbeat", daemon=True)
+        heartbeat.start()
+        loops = [threading.Thread(target=self._loop, name=f"{self.worker_id}-{n}") for n in range(self.threads)]
+        try:
+            for t in loops:
+                t.start()
+            for t in loops:
+                t.join()
+        finally:
+            self._stop.set()
+            heartbeat.join()
+            self.queue.close()
+        print(f"👷 ワーカー終了: {self.worker_id} (処理 {self.processed}件, 失敗 {self.failed}件, "
+              f"パッケージ化 {self.finalized}件)")
+
+def _worker_main(kwargs: Dict[str, Any]) -> None:
+    QueueWorker(**kwargs).run()
+
+def run_local_workers(processes: int, **kwargs) -> None:
+    """同じマシン上で複数のワーカープロセスを起動する（複数ノード運用の動作確認用）"""
+    if processes <= 1:
+        QueueWorker(**kwargs).run()
+        return
+    procs = [multiprocessing.Process(target=_worker_main, args=(kwargs,)) for _ in range(processes)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
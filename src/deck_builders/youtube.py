@@ -2,29 +2,44 @@ import os
 import time
 import pathlib
 import tempfile
-from typing import List, Tuple, Set, Dict, Any
-import yt_dlp
-from moviepy.editor import VideoFileClip
-from PIL import Image
-import numpy as np
-import cv2
-from ..common.ocr import ocr_and_process, ocr_and_process_youtube_frame
-from ..common.audio import gen_audio
+from typing import TYPE_CHECKING, Callable, List, Optional, Sequence, Tuple, Set, Dict, Any
+from ..common.ocr import ocr_and_process, ocr_and_process_youtube_frame, openai_client
+from ..common.audio import gen_audio_batch, tts_limiter
+from ..common.tts import get_tts_backend
+from ..common.audio_post import postprocess_audio_files
 from .image_table import build_deck
-import openai
-from skimage.metrics import structural_similarity as ssim
-from deep_translator import MyMemoryTranslator
 from pathlib import Path
 from .base import BaseDeckBuilder
-import csv
+from ..common.pipeline import Stage
+from ..common.metrics import METRICS
+from ..common.cassette import chat_completion, replaying
+from ..common.exception_store import get_exception_store
+from ..common.known_vocab import KnownVocab
+from ..common.dedupe import VocabDeduper
+from ..common.subtitles import CueIndex, DEFAULT_SUBTITLE_LANGS, find_subtitles
+from ..common.text_gate import TextGate, text_line_boxes
+from ..common.frames import FrameScanner
+from ..common.estimate import estimate_frames_run, select_within_budget, print_estimate
 import base64
 import json
 import re
 import shutil
 import datetime
+import logging
 
-def download_video(url: str, output_dir: pathlib.Path) -> pathlib.Path:
-    """YouTube動画をダウンロードする"""
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def download_video(url: str, output_dir: pathlib.Path, subtitles: bool = False,
+                   subtitle_langs: Optional[List[str]] = None) -> pathlib.Path:
+    """YouTube動画をダウンロードする
+
+    subtitles=Trueならアップロードされた字幕（VTT、なければSRV）も動画の隣に <id>.<lang>.vtt などとして保存する
+    （find_subtitles(動画パス) で取得できる）。
+    """
+    import yt_dlp
     print(f"\n📥 動画のダウンロード開始: {url}")
     
     # 出力ディレクトリをdata/input/youtube/に変更
@@ -35,21 +50,36 @@ def download_video(url: str, output_dir: pathlib.Path) -> pathlib.Path:
         'format': 'best[height<=720]',  # 720p以下に制限
         'outtmpl': str(youtube_dir / '%(id)s.%(ext)s'),
     }
+    if subtitles:
+        ydl_opts.update({
+            'writesubtitles': True,
+            'writeautomaticsub': False,  # 自動生成字幕は語彙の抽出に使えない
+            'subtitleslangs': subtitle_langs or DEFAULT_SUBTITLE_LANGS,
+            'subtitlesformat': 'vtt/srv3/srv1/best',
+        })
     
     with yt_dlp.YoutubeDL(ydl_opts) as ydl:
         info = ydl.extract_info(url, download=True)
         video_path = youtube_dir / f"{info['id']}.{info['ext']}"
         print(f"✅ ダウンロード完了: {video_path}")
+        if subtitles:
+            found = find_subtitles(video_path)
+            print(f"💬 字幕: {len(found)}件" if found else "💬 アップロードされた字幕はありません（すべてのフレームをOCRします）")
         return video_path
 
-def extract_frames(video_path: pathlib.Path, output_dir: pathlib.Path, interval: int = 5) -> List[pathlib.Path]:
-    """動画から一定間隔でフレームを抽出する"""
+def extract_frames(video_path: pathlib.Path, output_dir: pathlib.Path, interval: int = 5,
+                   skip: Optional[Callable[[float], bool]] = None) -> List[pathlib.Path]:
+    """動画から一定間隔でフレームを抽出する（skip(秒)がTrueの時刻は抽出しない）"""
+    from moviepy.editor import VideoFileClip
+    from PIL import Image
     print(f"\n🎞️ フレーム抽出開始: {interval}秒間隔")
     
     clip = VideoFileClip(str(video_path))
     frame_paths = []
     
     for t in range(0, int(clip.duration), interval):
+        if skip is not None and skip(t):
+            continue
         frame = clip.get_frame(t)
         frame_path = output_dir / f"frame_{t:04d}.jpg"
         Image.fromarray(frame).save(frame_path)
@@ -62,6 +92,7 @@ def extract_frames(video_path: pathlib.Path, output_dir: pathlib.Path, interval:
 
 def translate_to_english(japanese_text: str) -> str:
     """日本語テキストを英語に翻訳する"""
+    import openai
     try:
         response = openai.ChatCompletion.create(
             model="gpt-3.5-turbo",
@@ -77,37 +108,23 @@ def translate_to_english(japanese_text: str) -> str:
         print(f"エラー: {str(e)}")
         return ""
 
-def detect_text_regions(frame: np.ndarray) -> List[np.ndarray]:
-    """フレームからテキスト領域を検出する"""
-    # グレースケール変換
+def detect_text_regions(frame: "np.ndarray") -> List["np.ndarray"]:
+    """フレームからテキスト領域（テキスト行らしき部分）を切り出す"""
+    import cv2
     gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
-    
-    # 二値化
-    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
-    
-    # ノイズ除去
-    kernel = np.ones((3,3), np.uint8)
-    binary = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel)
-    
-    # 輪郭検出
-    contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    
-    # テキスト領域の抽出
-    text_regions = []
-    for contour in contours:
-        x, y, w, h = cv2.boundingRect(contour)
-        if w > 50 and h > 20:  # 小さすぎる領域を除外
-            text_regions.append(frame[y:y+h, x:x+w])
-    
-    return text_regions
+    return [frame[y:y + h, x:x + w] for x, y, w, h in text_line_boxes(gray)]
 
-def is_similar_image(img1: np.ndarray, img2: np.ndarray, threshold: float = 0.95) -> bool:
+def is_similar_image(img1: "np.ndarray", img2: "np.ndarray", threshold: float = 0.95) -> bool:
+    import cv2
+    from skimage.metrics import structural_similarity as ssim
     img1 = cv2.cvtColor(cv2.resize(img1, (200, 200)), cv2.COLOR_RGB2GRAY)
     img2 = cv2.cvtColor(cv2.resize(img2, (200, 200)), cv2.COLOR_RGB2GRAY)
     score, _ = ssim(img1, img2, full=True)
     return score > threshold
 
 def filter_unique_images(image_paths, threshold=0.99):
+    import numpy as np
+    from PIL import Image
     unique = []
     unique_paths = []
     for path in image_paths:
@@ -117,9 +134,17 @@ def filter_unique_images(image_paths, threshold=0.99):
             unique_paths.append(path)
     return unique_paths
 
-def process_youtube_video(url: str, deck_name: str, generate_media: bool = False, frame_interval: int = 5, ssim_threshold: float = 0.99) -> None:
-    """YouTube動画を処理してAnkiデッキを生成する"""
+def process_youtube_video(url: str, deck_name: str, generate_media: bool = False, frame_interval: int = 5, ssim_threshold: float = 0.99,
+                          tts_workers: Optional[int] = None, tts_rate: Optional[float] = None,
+                          tts_backend: Optional[str] = None, audio_bitrate: Optional[str] = None,
+                          incremental: bool = False, known_vocab: Optional[KnownVocab] = None,
+                          subtitles: bool = False, text_gate_lines: Optional[int] = None) -> None:
+    """YouTube動画を処理してAnkiデッキを生成する（known_vocabにある語はOCR直後に除外）
+
+    subtitles=Trueならアップロード字幕から語彙を取り出し、字幕のない時間帯のフレームだけをOCRする。
+    """
     # 一時ディレクトリの作成
+    from deep_translator import MyMemoryTranslator
     temp_dir = pathlib.Path(tempfile.mkdtemp())
     video_dir = temp_dir / "video"
     frame_dir = temp_dir / "frames"
@@ -131,11 +156,14 @@ def process_youtube_video(url: str, deck_name: str, generate_media: bool = False
     
     try:
         # 動画のダウンロード
-        video_path = download_video(url, video_dir)
-        
+        video_path = download_video(url, video_dir, subtitles=subtitles)
+        subtitle_paths = find_subtitles(video_path) if subtitles else []
+        cue_index = CueIndex.load(subtitle_paths) if subtitle_paths else None
+
         # フレームの抽出
         print("\n🎞️ フレーム抽出開始")
-        frame_paths = extract_frames(video_path, frame_dir, frame_interval)
+        frame_paths = extract_frames(video_path, frame_dir, frame_interval,
+                                     skip=cue_index.covers if cue_index else None)
         print(f"✅ フレーム抽出完了: {len(frame_paths)}枚")
 
         # SSIMによる重複排除
@@ -143,14 +171,29 @@ def process_youtube_video(url: str, deck_name: str, generate_media: bool = False
         unique_paths = filter_unique_images(frame_paths, threshold=ssim_threshold)
         print(f"✅ 重複排除後: {len(unique_paths)}枚")
 
-        # テキスト領域の検出・OCR処理はユニーク画像のみ対象
+        # テキストが写っていないフレームはOCRに送らない（ユニーク画像のみ対象）
         processed_frames = unique_paths
+        if text_gate_lines:
+            gate = TextGate(text_gate_lines)
+            processed_frames = [p for p in unique_paths if gate.passes_file(p)]
+            gate.report()
 
-        # 各フレームをOCR処理
+        # 字幕の語彙→各フレームのOCR結果の順に処理（重複排除は翻訳・TTSの前に行う）
+        deduper = VocabDeduper()
         all_rows = []
-        for frame in processed_frames:
-            print(f"\n📝 処理中: {frame.name}")
-            rows = ocr_and_process_youtube_frame(frame, media_dir)
+        client = openai_client() if processed_frames else None
+        sources = [(None, [(i["meaning"], i["thai"], i["paiboon"]) for i in cue_index.items])] if cue_index else []
+        sources += [(frame, None) for frame in processed_frames]
+        for frame, subtitle_rows in sources:
+            if frame is None:
+                print(f"\n💬 字幕の語彙を処理中: {len(subtitle_rows)}件")
+                rows = subtitle_rows
+            else:
+                print(f"\n📝 処理中: {frame.name}")
+                rows = [row for row in ocr_and_process_youtube_frame(frame, media_dir, client=client) if row[2]]
+            if known_vocab is not None:
+                rows = [row for row in rows if not known_vocab.seen(row[1])]
+            rows = deduper.filter_rows(rows)
             translated_rows = []
             for meaning, thai, paiboon in rows:
                 # 意味（日本語）を英訳（deep-translatorを利用）
@@ -166,30 +209,32 @@ def process_youtube_video(url: str, deck_name: str, generate_media: bool = False
                     except Exception as e:
                         print(f"⚠️ MyMemory翻訳に失敗しました: {meaning}")
                         print(f"エラー: {str(e)}")
-                # タイ語音声ファイル生成（gTTSは無料なのでそのまま）
-                audio_file = ""
-                try:
-                    audio_file = gen_audio(eng, thai, media_dir)
-                    time.sleep(0.7)  # gTTS対策
-                except Exception as e:
-                    print(f"⚠️ 音声生成に失敗しました: {thai}")
-                    print(f"エラー: {str(e)}")
-                pic_file = ""  # 画像は使わない
-                translated_rows.append((eng, thai, paiboon, audio_file, pic_file))
+                translated_rows.append((eng, thai, paiboon))
             all_rows.extend(translated_rows)
-            time.sleep(2.5)  # OpenAI Vision API対策
+            if frame is not None and not replaying():
+                time.sleep(2.5)  # OpenAI Vision API対策
         
-        # Paiboonで重複排除
+        if known_vocab is not None:
+            known_vocab.report()
+        deduper.report()
+
+        # タイ語音声ファイル生成（重複排除後のみ、レートリミット付きで並列実行）
+        backend = get_tts_backend(tts_backend)
+        audio_files = gen_audio_batch(
+            [(eng, thai) for eng, thai, _ in all_rows], media_dir,
+            backend=backend, workers=tts_workers, limiter=tts_limiter(backend, tts_rate)
+        )
         unique_rows = []
-        seen_paiboon = set()
-        for eng, thai, paiboon, audio_file, pic_file in all_rows:
-            if not paiboon or paiboon in seen_paiboon:
-                continue
-            seen_paiboon.add(paiboon)
+        for (eng, thai, paiboon), audio_file in zip(all_rows, audio_files):
+            pic_file = ""  # 画像は使わない
             unique_rows.append((eng, thai, paiboon, audio_file, pic_file))
         
+        # 音声の後処理（任意）
+        if audio_bitrate:
+            postprocess_audio_files(media_dir.iterdir(), bitrate=audio_bitrate)
+
         # デッキの生成
-        build_deck(unique_rows, deck_name, media_dir)
+        build_deck(unique_rows, deck_name, media_dir, incremental=incremental)
         
     finally:
         # 一時ファイルの削除
@@ -198,50 +243,84 @@ def process_youtube_video(url: str, deck_name: str, generate_media: bool = False
         print(f"\n🧹 一時ファイルを削除しました: {temp_dir}")
 
 class YouTubeDeckBuilder(BaseDeckBuilder):
-    def __init__(self, output_dir: str, deck_name: str, ssim_threshold: float = 0.99, use_paiboon_correction: bool = True):
-        super().__init__(output_dir, deck_name, use_paiboon_correction=use_paiboon_correction)
+    def __init__(self, output_dir: str, deck_name: str, ssim_threshold: float = 0.99, use_paiboon_correction: bool = True,
+                 tts_workers: Optional[int] = None, tts_rate: Optional[float] = None,
+                 tts_backend: Optional[str] = None, audio_bitrate: Optional[str] = None,
+                 incremental: bool = False, stage_workers: Optional[Dict[str, int]] = None,
+                 job_id: Optional[str] = None, resume: bool = False,
+                 client=None, shared_tts_limiter=None, translation_cache: Optional[Dict[str, str]] = None,
+                 work_dir: Optional[Path] = None, known_vocab: Optional[KnownVocab] = None,
+                 text_gate_lines: Optional[int] = None, text_gate_tesseract: bool = False):
+        super().__init__(output_dir, deck_name, use_paiboon_correction=use_paiboon_correction,
+                         tts_workers=tts_workers, tts_rate=tts_rate, tts_backend=tts_backend,
+                         audio_bitrate=audio_bitrate, incremental=incremental, stage_workers=stage_workers,
+                         job_id=job_id, resume=resume, client=client,
+                         shared_tts_limiter=shared_tts_limiter, translation_cache=translation_cache,
+                         work_dir=work_dir, known_vocab=known_vocab)
         self.ssim_threshold = ssim_threshold
+        # フレーム読み出し・SSIMによる重複除去・テキスト判定（0かNoneで無効）はAPIを使わない前段にまとめる
+        text_gate = TextGate(text_gate_lines, use_tesseract=text_gate_tesseract) if text_gate_lines else None
+        self.frames = FrameScanner(self.temp_dir, ssim_threshold, text_gate)
 
-    def _extract_frames(self, video_path: Path, interval: int = 1) -> List[Path]:
-        """動画から一定間隔でフレームを抽出"""
-        frames = []
-        cap = cv2.VideoCapture(str(video_path))
-        frame_count = 0
-        
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-                
-            if frame_count % interval == 0:
-                frame_path = self.temp_dir / f"frame_{frame_count:04d}.jpg"
-                cv2.imwrite(str(frame_path), frame)
-                frames.append(frame_path)
-            
-            frame_count += 1
-        
-        cap.release()
-        return frames
+    def _scan_frames(self, video_path: Path, frame_interval: int = 1,
+                     skip: Optional[Callable[[float], bool]] = None) -> List[Tuple[Path, float]]:
+        """フレーム抽出と重複除去だけをローカルで実行（(フレーム, 新規性) のリストを返す）"""
+        self.frames.reset()
+        return [(path, self.frames.novelty[path]) for _, path in self.frames.scan(video_path, frame_interval, skip)]
 
-    def _remove_duplicates(self, frames: List[Path]) -> List[Path]:
-        """SSIMを使って重複フレームを除去"""
-        unique_frames = [frames[0]]
-        
-        for i in range(1, len(frames)):
-            current = cv2.imread(str(frames[i]))
-            prev = cv2.imread(str(unique_frames[-1]))
-            
-            # グレースケールに変換
-            current_gray = cv2.cvtColor(current, cv2.COLOR_BGR2GRAY)
-            prev_gray = cv2.cvtColor(prev, cv2.COLOR_BGR2GRAY)
-            
-            # SSIMを計算
-            score = ssim(current_gray, prev_gray)
-            
-            if score < self.ssim_threshold:
-                unique_frames.append(frames[i])
-        
-        return unique_frames
+    def estimate(self, frame_paths: List[Path], subtitle_items: int = 0) -> Dict[str, Any]:
+        """OCRに送るフレームと字幕の語彙数からAPI呼び出し数・トークン数・費用・所要時間を見積もる"""
+        from PIL import Image
+        sizes = []
+        for path in frame_paths:
+            with Image.open(path) as img:
+                sizes.append(img.size)
+        # 見積もりでは例外パターンストアに書き込まない
+        rows = self.preview_exception_rows()
+        rules = self._render_rules(rows) if self.use_paiboon_correction else None
+        interval = self.tts_limiter.interval
+        return estimate_frames_run(sizes, _render_ocr_prompt(rows), rules, self.stage_workers,
+                                   tts_rate=1.0 / interval if interval else 0.0, subtitle_items=subtitle_items)
+
+    def plan(self, video_path: Path, frame_interval: int = 1, budget: Optional[float] = None,
+             cues: Optional[CueIndex] = None) -> Tuple[List[Path], Dict[str, Any]]:
+        """抽出・重複除去を行い、予算指定時は新規性の低いフレームから落として見積もりを表示する"""
+        print("\n🔍 フレーム抽出と重複除去（ローカル）")
+        frames = self._scan_frames(video_path, frame_interval, cues.covers if cues else None)
+        self._report_skipped(cues)
+        selected = [path for path, _ in frames]
+        subtitle_items = len(cues) if cues else 0
+        est = self.estimate(selected, subtitle_items)
+        if budget is not None:
+            # 字幕の語彙は必ず処理するので、その費用を除いた残りでフレームを選ぶ
+            selected = select_within_budget(frames, est["cost_per_frame_usd"], budget - est["subtitle_cost_usd"])
+            if len(selected) < len(frames):
+                est = self.estimate(selected, subtitle_items)
+        print_estimate(est, budget=budget, dropped=len(frames) - len(selected))
+        return selected, est
+
+    def dry_run(self, video_path: Path, frame_interval: int = 1, budget: Optional[float] = None,
+                subtitles: Optional[Sequence[Path]] = None) -> Dict[str, Any]:
+        """APIを呼ばずに見積もりだけを行う"""
+        cues = CueIndex.load(subtitles) if subtitles else None
+        _, est = self.plan(video_path, frame_interval, budget, cues)
+        return est
+
+    def _report_skipped(self, cues: Optional[CueIndex]) -> None:
+        """字幕・テキスト判定でOCRを省いたフレーム数を表示"""
+        if cues is not None:
+            print(f"💬 字幕の語彙 {len(cues)}件を使用、字幕のある時間帯のフレーム {self.frames.subtitle_skipped}件はOCRしません")
+        if self.frames.text_gate is not None:
+            self.frames.text_gate.report()
+
+    @staticmethod
+    def _frames_only(func):
+        """字幕から作った項目（dict）はそのまま次段へ流し、フレームだけfuncに通す"""
+        return lambda item: item if isinstance(item, dict) else func(item)
+
+    def _ocr_stage(self, frame_path: Path) -> Optional[Dict[str, str]]:
+        """OCR段（結果が空の場合は破棄）"""
+        return self._ocr_frame(frame_path) or None
 
     def _ocr_frame(self, frame_path: Path) -> Dict[str, str]:
         """フレーム画像からOCRでテキストを抽出"""
@@ -252,29 +331,33 @@ class YouTubeDeckBuilder(BaseDeckBuilder):
         # OCRプロンプトを動的生成
         prompt = build_ocr_prompt()
         # OpenAI Vision APIでOCR
-        response = self.client.chat.completions.create(
-            model="gpt-4.1-mini",
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": prompt
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{b64_image}"
+        with METRICS.track_api("openai_vision", bytes_sent=len(b64_image)) as call:
+            response = chat_completion(
+                self.client,
+                model="gpt-4.1-mini",
+                messages=[
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "text",
+                                "text": prompt
+                            },
+                            {
+                                "type": "image_url",
+                                "image_url": {
+                                    "url": f"data:image/jpeg;base64,{b64_image}"
+                                }
                             }
-                        }
-                    ]
-                }
-            ],
-            max_tokens=300
-        )
+                        ]
+                    }
+                ],
+                max_tokens=300
+            )
+            call.usage(response)
         # レスポンスをパース
         result = response.choices[0].message.content
+        logger.debug("OpenAI応答: %s", result)
         # コードブロックを除去し、JSONとしてパース
         json_match = re.search(r'```json\n(.*?)\n```', result, re.DOTALL)
         if json_match:
@@ -310,47 +393,55 @@ class YouTubeDeckBuilder(BaseDeckBuilder):
             print(f"❌ JSONの解析に失敗しました: {str(e)}")
             return {}
 
-    def build(self, video_path: Path, frame_interval: int = 1) -> Path:
-        """動画からデッキをビルド"""
-        # フレームを抽出
-        frames = self._extract_frames(video_path, frame_interval)
-        
-        # 重複フレームを除去
-        unique_frames = self._remove_duplicates(frames)
-        
-        # OCRでテキストを抽出
-        ocr_data = []
-        for frame in unique_frames:
-            result = self._ocr_frame(frame)
-            if result:  # 有効な結果の場合のみ追加
-                ocr_data.append(result)
-        
-        if not ocr_data:
-            print("❌ 空の配列が返されました")
-            debug_dir = pathlib.Path("data/debug/invalid_frames")
-            debug_dir.mkdir(parents=True, exist_ok=True)
-            ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-            out_path = debug_dir / f"{frame_path.stem}__empty_result__{ts}{frame_path.suffix}"
-            shutil.copy(frame_path, out_path)
-            print(f"⚠️ 無効画像を保存: {out_path}")
-            return None
-            
-        # 親クラスのbuildメソッドを呼び出し（修正機能を含む）
-        return super().build(ocr_data)
+    def build(self, video_path: Path, frame_interval: int = 1, budget: Optional[float] = None,
+              subtitles: Optional[Sequence[Path]] = None) -> Path:
+        """動画からデッキをビルド
+
+        フレーム読み出し→重複除去→OCR→Paiboon修正→翻訳→TTS を有界キューでつないだ
+        パイプラインで実行し、各段を並行に動かす（全体時間は最も遅い段に近づく）。
+        予算（USD）指定時は先に抽出・重複除去を済ませ、予算内に収まるフレームだけをOCRに送る。
+        字幕ファイル（VTT/SRV）を渡すと、字幕から取り出した語彙をOCRを通さずに流し、
+        字幕のない時間帯のフレームだけをOCRする。
+        """
+        cues = CueIndex.load(subtitles) if subtitles else None
+        cue_items = [dict(item) for item in cues.items] if cues else []
+        METRICS.incr("subtitle_items_total", len(cue_items))
+        ocr = self._frames_only(self._journaled("ocr", lambda path: path.name, self._ocr_stage))
+        if budget is not None:
+            frames, _ = self.plan(video_path, frame_interval, budget, cues)
+            stages = [
+                Stage("ocr", ocr, workers=self.stage_workers["ocr"]),
+            ] + self._note_stages()
+            return self._run_pipeline(cue_items + frames, stages)
+        self.frames.reset()
+        stages = [
+            # フレーム画像はメモリを食うので入力キューを小さく保つ
+            Stage("dedupe", self._frames_only(self.frames.dedupe), queue_size=8),
+            Stage("ocr", ocr, workers=self.stage_workers["ocr"]),
+        ] + self._note_stages()
+
+        def source():
+            yield from cue_items
+            yield from self.frames.iter_frames(video_path, frame_interval, cues.covers if cues else None)
+
+        try:
+            return self._run_pipeline(source(), stages)
+        finally:
+            self._report_skipped(cues)
 
     def cleanup(self):
         """一時ファイルを削除"""
         super().cleanup()
 
-def build_ocr_prompt():
-    diff_path = "data/output/system/paiboon_diff.tsv"
+def build_ocr_prompt() -> str:
+    """OCRプロンプト（例外パターンストアが変わるまでキャッシュ）"""
+    return get_exception_store().derive("ocr_prompt", _render_ocr_prompt)
+
+def _render_ocr_prompt(rows: List[Dict[str, str]]) -> str:
     mis_list = []
-    if Path(diff_path).exists():
-        with open(diff_path, encoding="utf-8") as f:
-            reader = csv.DictReader(f, delimiter="\t")
-            for row in reader:
-                if row["type"] == "mismatch":
-                    mis_list.append(f"- タイ語: {row['thai']}, 正しいPaiboon: {row['gold_paiboon']}, 誤判定: {row['generated_paiboon']}")
+    for row in rows:
+        if row["type"] == "mismatch":
+            mis_list.append(f"- タイ語: {row['thai']}, 正しいPaiboon: {row['gold_paiboon']}, 誤判定: {row['generated_paiboon']}")
     mis_text = "\n".join(mis_list)
     prompt = (
         "この画像からタイ語、Paiboon式ローマ字、日本語の意味を抽出してください。\n"
@@ -0,0 +1,84 @@
+import json
+import sqlite3
+import zipfile
+
+import pytest
+
+genanki = pytest.importorskip("genanki")
+
+from src.common.apkg import DeckState, media_refs, note_guid, stable_deck_id, thai_vocab_model, write_apkg
+
+NOTES = [
+    ["ขอบคุณ", "khòp khun", "thank you", "[sound:khop.mp3]"],
+    ["ขอโทษ", "khǎw thôot", "sorry", "[sound:khaw.mp3]"],
+]
+
+def _deck():
+    deck = genanki.Deck(stable_deck_id("Round Trip"), "Round Trip")
+    for fields in NOTES:
+        deck.add_note(genanki.Note(thai_vocab_model(), fields, guid=note_guid(fields[0])))
+    return deck
+
+def _collection(z, tmp_path):
+    db_path = tmp_path / "collection.anki2"
+    db_path.write_bytes(z.read("collection.anki2"))
+    return sqlite3.connect(str(db_path))
+
+def test_write_apkg_round_trip(tmp_path):
+    media = []
+    for name in ("khop.mp3", "khaw.mp3"):
+        (tmp_path / name).write_bytes(b"ID3 " + name.encode("ascii"))
+        media.append(str(tmp_path / name))
+    out = write_apkg(_deck(), tmp_path / "out" / "Round_Trip.apkg", media)
+    assert not (tmp_path / "out" / "Round_Trip.apkg.part").exists()
+
+    with zipfile.ZipFile(out) as z:
+        infos = {info.filename: info for info in z.infolist()}
+        media_map = json.loads(z.read("media"))
+        assert media_map == {"0": "khop.mp3", "1": "khaw.mp3"}
+        # 音声はそのまま格納、collectionとmediaマップだけ圧縮
+        assert {infos[e].compress_type for e in media_map} == {zipfile.ZIP_STORED}
+        assert infos["collection.anki2"].compress_type == zipfile.ZIP_DEFLATED
+        assert z.read("1") == b"ID3 khaw.mp3"
+        conn = _collection(z, tmp_path)
+    try:
+        notes = conn.execute("SELECT guid, mid, flds FROM notes ORDER BY id").fetchall()
+        assert [(guid, flds.split("\x1f")) for guid, _, flds in notes] == [
+            (note_guid(fields[0]), fields) for fields in NOTES
+        ]
+        assert {mid for _, mid, _ in notes} == {thai_vocab_model().model_id}
+        decks = {did for (did,) in conn.execute("SELECT did FROM cards")}
+        assert decks == {stable_deck_id("Round Trip")}
+        cards = conn.execute("SELECT COUNT(*) FROM cards").fetchone()[0]
+        assert cards == len(NOTES) * len(thai_vocab_model().templates)
+        assert str(stable_deck_id("Round Trip")) in json.loads(conn.execute("SELECT decks FROM col").fetchone()[0])
+    finally:
+        conn.close()
+
+def test_write_apkg_matches_genanki_notes(tmp_path):
+    ours = write_apkg(_deck(), tmp_path / "ours.apkg")
+    genanki.Package(_deck()).write_to_file(str(tmp_path / "genanki.apkg"))
+    rows = []
+    for path in (ours, tmp_path / "genanki.apkg"):
+        with zipfile.ZipFile(path) as z:
+            conn = _collection(z, tmp_path)
+        try:
+            rows.append(conn.execute("SELECT guid, mid, flds, sfld FROM notes ORDER BY guid").fetchall())
+        finally:
+            conn.close()
+    assert rows[0] == rows[1]
+
+def test_deck_state_reports_only_new_or_changed_notes(tmp_path):
+    items = [(note_guid(fields[0]), fields, fields[0]) for fields in NOTES]
+    state = DeckState("Round Trip", state_dir=tmp_path)
+    assert state.filter_changed(items) == ["ขอบคุณ", "ขอโทษ"]
+    state.update((guid, fields) for guid, fields, _ in items)
+    state.save()
+
+    state = DeckState("Round Trip", state_dir=tmp_path)
+    # 音声ファイル名だけが変わったノートは変更なし
+    renamed = [(guid, fields[:3] + ["[sound:other.mp3]"], value) for guid, fields, value in items]
+    assert state.filter_changed(renamed) == []
+    edited = [(items[1][0], NOTES[1][:2] + ["I'm sorry", NOTES[1][3]], "ขอโทษ")]
+    assert state.filter_changed(edited) == ["ขอโทษ"]
+    assert media_refs(NOTES[0]) == {"khop.mp3"}
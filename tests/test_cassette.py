@@ -0,0 +1,84 @@
+import base64
+import unicodedata
+
+import pytest
+
+from src.common import cassette
+from src.common.cassette import Cassette, CassetteMiss, request_key, synthesize
+from src.common.tts import TTSBackend
+
+def _data_url(data: bytes) -> str:
+    return "data:image/png;base64," + base64.b64encode(data).decode("ascii")
+
+def test_request_key_ignores_normalization_form_and_key_order():
+    nfc = {"text": "khòp khun", "lang": "th"}
+    nfd = {"lang": "th", "text": unicodedata.normalize("NFD", "khòp khun")}
+    assert request_key("mymemory", nfc) == request_key("mymemory", nfd)
+    assert request_key("mymemory", nfc) != request_key("openai", nfc)
+    assert request_key("mymemory", nfc) != request_key("mymemory", {"text": "khòp", "lang": "th"})
+
+def test_request_key_hashes_image_data_urls_by_content():
+    def message(data):
+        return {"messages": [{"content": [{"type": "image_url", "image_url": {"url": _data_url(data)}}]}]}
+
+    assert request_key("openai", message(b"png")) == request_key("openai", message(b"png"))
+    assert request_key("openai", message(b"png")) != request_key("openai", message(b"other"))
+
+def test_record_then_replay_returns_the_recorded_response(tmp_path):
+    path = tmp_path / "cassette.sqlite3"
+    calls = []
+
+    def translate():
+        calls.append(1)
+        return {"translation": "thank you"}
+
+    recorder = Cassette(path, "record")
+    assert recorder.call("mymemory", {"text": "ありがとう"}, translate) == {"translation": "thank you"}
+    recorder.close()
+    assert recorder.recorded == 1
+
+    player = Cassette(path, "replay")
+    request = {"text": unicodedata.normalize("NFD", "ありがとう")}
+    assert player.call("mymemory", request, translate) == {"translation": "thank you"}
+    player.close()
+    assert calls == [1] and player.replayed == 1
+
+def test_replay_miss_raises_without_calling_the_api(tmp_path):
+    path = tmp_path / "cassette.sqlite3"
+    Cassette(path, "record").close()
+    player = Cassette(path, "replay")
+
+    def network():
+        raise AssertionError("リプレイ中にAPIを呼んだ")
+
+    with pytest.raises(CassetteMiss):
+        player.call("mymemory", {"text": "未記録"}, network)
+    player.close()
+
+def test_replay_requires_an_existing_cassette(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        Cassette(tmp_path / "missing.sqlite3", "replay")
+
+class _FakeBackend(TTSBackend):
+    name = "fake"
+
+    def __init__(self):
+        self.calls = 0
+
+    def synthesize(self, text, out_path):
+        self.calls += 1
+        out_path.write_bytes(text.encode("utf-8"))
+
+def test_tts_audio_is_replayed_into_the_output_file(tmp_path, monkeypatch):
+    path = tmp_path / "cassette.sqlite3"
+    backend = _FakeBackend()
+    monkeypatch.setattr(cassette, "_active", Cassette(path, "record"))
+    synthesize(backend, "ขอบคุณ", tmp_path / "recorded.mp3")
+    cassette._active.close()
+
+    monkeypatch.setattr(cassette, "_active", Cassette(path, "replay"))
+    synthesize(backend, "ขอบคุณ", tmp_path / "replayed.mp3")
+    cassette._active.close()
+    assert backend.calls == 1
+    assert (tmp_path / "replayed.mp3").read_bytes() == "ขอบคุณ".encode("utf-8")
+    assert not (tmp_path / "replayed.mp3.part").exists()
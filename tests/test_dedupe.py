@@ -0,0 +1,37 @@
+import unicodedata
+
+from src.common.dedupe import VocabDeduper, paiboon_vocab_key, thai_vocab_key, vocab_key
+
+def test_thai_key_normalizes_spelling_variants():
+    base = thai_vocab_key("\u0e17\u0e35\u0e48\u0e19\u0e35\u0e48")
+    assert thai_vocab_key(" \u0e17\u0e35\u0e48 \u0e19\u0e35\u0e48 ") == base
+    assert thai_vocab_key("\u0e17\u0e35\u0e48\u200b\u0e19\u0e35\u0e48") == base
+    # 声調記号が母音記号より前に入力されたもの・重複したもの
+    assert thai_vocab_key("\u0e17\u0e48\u0e35\u0e19\u0e48\u0e35") == base
+    assert thai_vocab_key("\u0e17\u0e35\u0e48\u0e48\u0e19\u0e35\u0e48") == base
+    # \u0e4d + \u0e32 は \u0e33（サラアム）
+    assert thai_vocab_key("\u0e19\u0e49\u0e4d\u0e32") == thai_vocab_key("\u0e19\u0e49\u0e33")
+    assert thai_vocab_key("ขอบคุณ") != thai_vocab_key("ขอโทษ")
+
+def test_paiboon_key_normalizes_marks_case_and_ue():
+    base = paiboon_vocab_key("chʉ̂ʉ")
+    assert paiboon_vocab_key(unicodedata.normalize("NFD", "chʉ̂ʉ")) == base
+    assert paiboon_vocab_key("Chʉ̂ʉ") == base
+    assert paiboon_vocab_key("chûeue") == paiboon_vocab_key("chuêue")
+    assert paiboon_vocab_key("  khòp   khun ") == paiboon_vocab_key("khòp khun")
+
+def test_vocab_key_falls_back_to_paiboon():
+    assert vocab_key("ขอบคุณ", "khòp khun") == vocab_key("ขอบคุณ", "kop kun")
+    assert vocab_key("", "khòp khun").startswith("pb:")
+    assert vocab_key("", "khòp khun") != vocab_key("", "khɔ̀ɔp khun")
+
+def test_deduper_keeps_the_first_row():
+    deduper = VocabDeduper()
+    rows = deduper.filter_rows([
+        ("thank you", "ขอบคุณ", "khòp khun"),
+        ("thanks", "ขอบ คุณ", "khòp khun"),
+        ("sorry", "ขอโทษ", "khǎw thôot"),
+    ])
+    assert rows == [("thank you", "ขอบคุณ", "khòp khun"), ("sorry", "ขอโทษ", "khǎw thôot")]
+    assert deduper.removed == 1
+    assert deduper.seen("ขอโทษ") and not deduper.seen("ไม่เป็นไร")
@@ -0,0 +1,37 @@
+from pathlib import Path
+
+import pytest
+
+from src.common.estimate import estimate_frames_run, estimate_image_tokens, select_within_budget
+
+FRAMES = [(Path("a.jpg"), 0.2), (Path("b.jpg"), 0.9), (Path("c.jpg"), 0.5), (Path("d.jpg"), 0.7)]
+
+def test_everything_fits_in_the_budget():
+    assert select_within_budget(FRAMES, cost_per_frame=0.01, budget=0.04) == [p for p, _ in FRAMES]
+    assert select_within_budget(FRAMES, cost_per_frame=0.0, budget=0.0) == [p for p, _ in FRAMES]
+
+def test_partial_fit_keeps_the_most_novel_frames_in_order():
+    assert select_within_budget(FRAMES, cost_per_frame=0.01, budget=0.025) == [Path("b.jpg"), Path("d.jpg")]
+
+def test_budget_smaller_than_one_frame_keeps_nothing():
+    assert select_within_budget(FRAMES, cost_per_frame=0.01, budget=0.005) == []
+    assert select_within_budget(FRAMES, cost_per_frame=0.01, budget=-1.0) == []
+
+def test_image_tokens_follow_the_model():
+    # gpt-4o: 短辺768pxに縮小 → 768x768 は512pxタイル4枚
+    assert estimate_image_tokens(1024, 1024, "gpt-4o") == 85 + 170 * 4
+    # gpt-4.1-mini: 32pxパッチ 40x23=920枚 × 1.62
+    assert estimate_image_tokens(1280, 720, "gpt-4.1-mini") == 1491
+    # パッチ数の上限は1536
+    assert estimate_image_tokens(1920, 1080, "gpt-4.1-mini") <= 1536 * 1.62 + 1
+
+def test_subtitle_items_are_charged_outside_the_frame_budget():
+    args = dict(frame_sizes=[(640, 480)] * 2, ocr_prompt="prompt", rules_prompt="rules",
+                stage_workers={}, tts_rate=0.0)
+    frames_only = estimate_frames_run(**args)
+    with_cues = estimate_frames_run(**args, subtitle_items=3)
+    assert with_cues["correct_calls"] == frames_only["correct_calls"] + 3
+    assert with_cues["tts_calls"] == 5
+    assert with_cues["subtitle_cost_usd"] > 0
+    assert with_cues["cost_per_frame_usd"] == pytest.approx(frames_only["cost_per_frame_usd"])
+    assert with_cues["cost_usd"] == pytest.approx(frames_only["cost_usd"] + with_cues["subtitle_cost_usd"])
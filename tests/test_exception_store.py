@@ -0,0 +1,86 @@
+import csv
+import sqlite3
+
+from src.common.exception_store import DIFF_FIELDS, ExceptionStore, peek_rows
+
+def _row(thai, gold, generated="", kind="mismatch"):
+    return {"thai": thai, "gold_paiboon": gold, "generated_paiboon": generated, "type": kind}
+
+def test_merge_replaces_by_generated_paiboon_and_lookup_normalizes(tmp_path):
+    store = ExceptionStore(tmp_path / "store.sqlite", legacy_tsv=None)
+    assert store.merge([("ขอบคุณ", "khòp khun", "khop khun", "mismatch"),
+                        ("ขอโทษ", "khǎw thôot", None, "not_generated")]) == 2
+    # 同じ生成Paiboonの定義は新しいもので置き換え、末尾に付け直す
+    assert store.merge([("ขอบคุณ", "khɔ̀ɔp khun", "khop khun", "mismatch")]) == 1
+    assert [r["thai"] for r in store.rows()] == ["ขอโทษ", "ขอบคุณ"]
+    assert store.lookup(" ขอบ คุณ ") == "khɔ̀ɔp khun"
+    # not_generatedは修正に使わない
+    assert store.lookup("ขอโทษ") is None
+    store.close()
+
+def test_ensure_only_adds_missing_rows(tmp_path):
+    store = ExceptionStore(tmp_path / "store.sqlite", legacy_tsv=None)
+    assert store.ensure([_row("ขอบคุณ", "khòp khun")]) == 1
+    assert store.ensure([_row("ขอบคุณ", "khòp khun"), _row("เรื่อย ๆ", "rʉ̂ay rʉ̂ay")]) == 1
+    assert store.ensure([_row("เรื่อยๆ", "rʉ̂ay rʉ̂ay")]) == 0
+    assert len(store.rows()) == 2
+    store.close()
+
+def test_derive_is_cached_until_the_store_changes(tmp_path):
+    store = ExceptionStore(tmp_path / "store.sqlite", legacy_tsv=None)
+    builds = []
+    build = lambda rows: builds.append(len(rows)) or len(rows)
+    assert store.derive("count", build) == 0
+    assert store.derive("count", build) == 0
+    store.ensure([_row("ขอบคุณ", "khòp khun")])
+    assert store.derive("count", build) == 1
+    assert builds == [0, 1]
+    store.close()
+
+def test_legacy_tsv_is_imported_once_and_exported(tmp_path):
+    tsv = tmp_path / "diff.tsv"
+    with open(tsv, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=DIFF_FIELDS, delimiter="\t")
+        writer.writeheader()
+        writer.writerow(_row("ขอบคุณ", "khòp khun", "khop khun"))
+    store = ExceptionStore(tmp_path / "store.sqlite", legacy_tsv=tsv)
+    assert store.rows() == [_row("ขอบคุณ", "khòp khun", "khop khun")]
+    out = tmp_path / "export.tsv"
+    assert store.export_tsv(out) == 1
+    with open(out, encoding="utf-8") as f:
+        assert list(csv.DictReader(f, delimiter="\t")) == store.rows()
+    store.close()
+
+def test_peek_rows_reads_without_writing(tmp_path):
+    path = tmp_path / "store.sqlite"
+    defaults = [_row("ขอบคุณ", "khòp khun")]
+    assert peek_rows(defaults, path=path, legacy_tsv=None) == defaults
+    assert not path.exists()
+
+    store = ExceptionStore(path, legacy_tsv=None)
+    store.merge([("ขอโทษ", "khǎw thôot", "kho thot", "mismatch")])
+    store.close()
+    mtime = path.stat().st_mtime_ns
+    rows = peek_rows(defaults, path=path, legacy_tsv=None)
+    assert [r["thai"] for r in rows] == ["ขอโทษ", "ขอบคุณ"]
+    assert path.stat().st_mtime_ns == mtime
+
+def test_old_keys_are_rekeyed_on_open(tmp_path):
+    path = tmp_path / "store.sqlite"
+    conn = sqlite3.connect(str(path))
+    conn.execute(
+        "CREATE TABLE exceptions ("
+        " seq INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL UNIQUE, thai TEXT NOT NULL,"
+        " thai_key TEXT NOT NULL, gold_paiboon TEXT NOT NULL, generated_paiboon TEXT NOT NULL,"
+        " type TEXT NOT NULL, updated_at REAL NOT NULL)"
+    )
+    # 旧キーでは別の行だった表記揺れ
+    for n, thai in enumerate(["เรื่อย ๆ", "เรื่อยๆ"]):
+        conn.execute("INSERT INTO exceptions (key, thai, thai_key, gold_paiboon, generated_paiboon, type, updated_at)"
+                     " VALUES (?, ?, ?, 'rʉ̂ay rʉ̂ay', '', 'mismatch', ?)", (f"{thai}\trʉ̂ay rʉ̂ay", thai, thai, n))
+    conn.commit()
+    conn.close()
+    store = ExceptionStore(path, legacy_tsv=None)
+    assert [r["thai"] for r in store.rows()] == ["เรื่อยๆ"]
+    assert store.ensure([_row("เรื่อย ๆ", "rʉ̂ay rʉ̂ay")]) == 0
+    store.close()
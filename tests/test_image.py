@@ -0,0 +1,42 @@
+import io
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+from src.common.image import MAX_IMAGE_SIZE, iter_prepared_images, list_image_files
+
+def _save(path, size, mode="RGB", fmt=None):
+    Image.new(mode, size, "white").save(path, fmt)
+    return path
+
+def test_prepared_images_come_back_in_input_order(tmp_path):
+    # 先頭は縮小が必要で時間がかかり、後ろの小さい画像のほうが先に終わる
+    paths = [_save(tmp_path / "00_large.png", (MAX_IMAGE_SIZE + 500, 600))]
+    paths += [_save(tmp_path / f"{n:02d}.png", (32, 32)) for n in range(1, 8)]
+    broken = tmp_path / "04_broken.jpg"
+    broken.write_bytes(b"not an image")
+    paths.insert(4, broken)
+
+    results = list(iter_prepared_images(paths, workers=3, max_in_flight=4))
+    assert [path for path, _, _ in results] == paths
+    errors = {path.name: error for path, _, error in results if error}
+    assert list(errors) == ["04_broken.jpg"]
+    with Image.open(io.BytesIO(results[0][1])) as img:
+        assert img.format == "JPEG" and max(img.size) == MAX_IMAGE_SIZE
+
+def test_unchanged_png_is_passed_through_and_others_become_jpeg(tmp_path):
+    png = _save(tmp_path / "a.png", (40, 20))
+    rgba = _save(tmp_path / "b.png", (40, 20), mode="RGBA")
+    bmp = _save(tmp_path / "c.bmp", (40, 20), fmt="BMP")
+    results = {path: data for path, data, _ in iter_prepared_images([png, rgba, bmp], workers=2)}
+    assert results[png] == png.read_bytes()
+    for path in (rgba, bmp):
+        with Image.open(io.BytesIO(results[path])) as img:
+            assert (img.format, img.mode, img.size) == ("JPEG", "RGB", (40, 20))
+
+def test_list_image_files_skips_old_temp_copies(tmp_path):
+    for name in ("b.JPG", "a.png", "temp_a.png", "notes.txt"):
+        (tmp_path / name).write_bytes(b"")
+    assert [p.name for p in list_image_files(tmp_path)] == ["a.png", "b.JPG"]
+    assert list(iter_prepared_images([])) == []
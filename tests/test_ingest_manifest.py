@@ -0,0 +1,76 @@
+import os
+
+from src.common.ingest_manifest import IngestManifest, dir_snapshot, manifest_path_for
+
+ROWS = [("thank you", "ขอบคุณ", "khòp khun")]
+
+def _image(path, content=b"image"):
+    path.write_bytes(content)
+    return path
+
+def test_manifest_path_is_per_input_dir(tmp_path):
+    a = manifest_path_for(tmp_path / "a", tmp_path / "ingest")
+    assert a == manifest_path_for(tmp_path / "a", tmp_path / "ingest")
+    assert a != manifest_path_for(tmp_path / "b", tmp_path / "ingest")
+    assert a.parent == tmp_path / "ingest" and a.name.startswith("a_")
+
+def test_manifest_path_is_per_variant(tmp_path):
+    image_table = manifest_path_for(tmp_path / "a", tmp_path / "ingest")
+    standalone = manifest_path_for(tmp_path / "a", tmp_path / "ingest", variant="build_thai_deck")
+    assert image_table != standalone
+    assert image_table.parent == standalone.parent
+
+def test_plan_reuses_unchanged_touched_and_renamed_files(tmp_path):
+    images = tmp_path / "images"
+    images.mkdir()
+    first = _image(images / "01.png")
+    manifest = IngestManifest(images, tmp_path / "manifest.json")
+    cached, todo = manifest.plan([first])
+    assert cached == {} and todo == [first]
+    manifest.record(first, ROWS)
+    manifest.save()
+
+    manifest = IngestManifest(images, tmp_path / "manifest.json")
+    assert manifest.plan([first]) == ({first: ROWS}, [])
+    # touchだけなら内容ハッシュが同じなので再利用
+    st = first.stat()
+    os.utime(first, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert manifest.plan([first]) == ({first: ROWS}, [])
+    # 名前を変えただけのファイルも前回の行を使う
+    renamed = first.rename(images / "02.png")
+    assert manifest.plan([renamed]) == ({renamed: ROWS}, [])
+    assert manifest.prune([renamed]) == 1
+    assert list(manifest.files) == ["02.png"]
+
+def test_changed_or_empty_results_are_processed_again(tmp_path):
+    images = tmp_path / "images"
+    images.mkdir()
+    first = _image(images / "01.png")
+    second = _image(images / "02.png", b"other")
+    manifest = IngestManifest(images, tmp_path / "manifest.json")
+    manifest.plan([first, second])
+    manifest.record(first, ROWS)
+    # 行が取れなかった画像は記録しない
+    manifest.record(second, [])
+    _image(first, b"edited image")
+    assert manifest.plan([first, second]) == ({}, [first, second])
+
+def test_build_options_are_recorded_per_output(tmp_path):
+    deck = tmp_path / "decks" / "Deck.apkg"
+    manifest = IngestManifest(tmp_path, tmp_path / "manifest.json")
+    assert not manifest.built_with(deck, "opts")
+    deck.parent.mkdir()
+    deck.write_bytes(b"apkg")
+    manifest.record_build(deck, "opts")
+    manifest.save()
+
+    manifest = IngestManifest(tmp_path, tmp_path / "manifest.json")
+    assert manifest.built_with(deck, "opts")
+    assert not manifest.built_with(deck, "other opts")
+    deck.unlink()
+    assert not manifest.built_with(deck, "opts")
+
+def test_dir_snapshot_skips_vanished_files(tmp_path):
+    present = _image(tmp_path / "a.png")
+    snapshot = dir_snapshot([present, tmp_path / "gone.png"])
+    assert list(snapshot) == ["a.png"]
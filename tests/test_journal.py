@@ -0,0 +1,68 @@
+import pytest
+
+from src.common.journal import MISSING, Journal, job_id_for
+
+def test_job_id_is_deterministic():
+    assert job_id_for("https://youtu.be/x", "Deck") == job_id_for("https://youtu.be/x", "Deck")
+    assert job_id_for("https://youtu.be/x", "Deck") != job_id_for("https://youtu.be/x", "Other")
+    assert len(job_id_for("a")) == 12
+
+def test_wrap_reuses_recorded_outputs_after_resume(tmp_path):
+    path = tmp_path / "journal.sqlite"
+    calls = []
+
+    def translate(text):
+        calls.append(text)
+        return [text, text.upper()]
+
+    journal = Journal("job1", path=path)
+    run = journal.wrap("translate", lambda text: text, translate, encode=list, decode=tuple)
+    assert run("a") == ["a", "A"]
+    journal.close()
+
+    journal = Journal("job1", resume=True, path=path)
+    run = journal.wrap("translate", lambda text: text, translate, encode=list, decode=tuple)
+    assert run("a") == ("a", "A")
+    assert run("b") == ["b", "B"]
+    assert calls == ["a", "b"]
+    assert journal.hits == 1
+    journal.close()
+
+def test_missing_decode_reruns_the_stage(tmp_path):
+    journal = Journal("job1", path=tmp_path / "journal.sqlite")
+    calls = []
+    run = journal.wrap("tts", lambda text: text, lambda text: calls.append(text) or text,
+                       decode=lambda stored: MISSING)
+    run("a")
+    run("a")
+    assert calls == ["a", "a"]
+    assert journal.hits == 0
+    journal.close()
+
+def test_failures_are_not_recorded(tmp_path):
+    journal = Journal("job1", path=tmp_path / "journal.sqlite")
+
+    def fail(text):
+        raise RuntimeError("api down")
+
+    run = journal.wrap("correct", lambda text: text, fail)
+    with pytest.raises(RuntimeError):
+        run("a")
+    assert journal.get("correct", "a") == (False, None)
+    journal.close()
+
+def test_new_run_without_resume_clears_only_its_job(tmp_path):
+    path = tmp_path / "journal.sqlite"
+    journal = Journal("job1", path=path)
+    journal.put("ocr", "frame_0001", {"thai": "ขอบคุณ"})
+    other = Journal("job2", path=path)
+    other.put("ocr", "frame_0001", {"thai": "ขอโทษ"})
+    other.close()
+    journal.close()
+
+    journal = Journal("job1", path=path)
+    assert journal.get("ocr", "frame_0001") == (False, None)
+    journal.close()
+    other = Journal("job2", resume=True, path=path)
+    assert other.get("ocr", "frame_0001") == (True, {"thai": "ขอโทษ"})
+    other.close()
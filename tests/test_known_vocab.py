@@ -0,0 +1,38 @@
+import zipfile
+
+import pytest
+
+from src.common.apkg import UnsupportedApkgError
+from src.common.known_vocab import KnownVocab, iter_known_thai
+
+def _write_deck(path, thai_words):
+    genanki = pytest.importorskip("genanki")
+    from src.common.apkg import note_guid, stable_deck_id, thai_vocab_model, write_apkg
+    deck = genanki.Deck(stable_deck_id("Known"), "Known")
+    for thai in thai_words:
+        deck.add_note(genanki.Note(thai_vocab_model(), [f"<b>{thai}</b>", "", "", ""], guid=note_guid(thai)))
+    return write_apkg(deck, path)
+
+def test_known_vocab_from_a_generated_package(tmp_path):
+    apkg = _write_deck(tmp_path / "known.apkg", ["ขอบคุณ", "ขอโทษ"])
+    vocab = KnownVocab.load([apkg])
+    assert len(vocab) == 2
+    assert "ขอบ คุณ" in vocab and "ไม่เป็นไร" not in vocab
+    assert vocab.seen("ขอโทษ") and vocab.skipped == 1
+
+def test_known_vocab_from_a_text_export(tmp_path):
+    export = tmp_path / "thai.txt"
+    export.write_text("#separator:tab\nขอบคุณ\tkhòp khun\nthank you\t\n", encoding="utf-8")
+    assert list(iter_known_thai(export)) == ["ขอบคุณ"]
+
+def test_anki21b_collections_are_rejected(tmp_path):
+    apkg = _write_deck(tmp_path / "legacy.apkg", ["ขอบคุณ"])
+    new = tmp_path / "new.colpkg"
+    with zipfile.ZipFile(apkg) as src, zipfile.ZipFile(new, "w") as z:
+        z.writestr("collection.anki2", src.read("collection.anki2"))
+        z.writestr("collection.anki21b", b"\x28\xb5\x2f\xfd")
+    with pytest.raises(UnsupportedApkgError):
+        KnownVocab.load([new])
+    (tmp_path / "collection.anki21b").write_bytes(b"\x28\xb5\x2f\xfd")
+    with pytest.raises(UnsupportedApkgError):
+        list(iter_known_thai(tmp_path / "collection.anki21b"))
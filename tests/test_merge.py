@@ -0,0 +1,72 @@
+import io
+import zipfile
+
+import pytest
+
+genanki = pytest.importorskip("genanki")
+
+from src.common.apkg import (
+    iter_apkg_notes, note_guid, open_apkg_collection, read_apkg_media_map, stable_deck_id, thai_vocab_model, write_apkg,
+)
+from src.deck_builders.merge import MediaStore, merge_decks
+
+def _write_deck(path, notes, media_dir):
+    """(thai, paiboon, english, 音声ファイル名, 音声の中身) のノートからapkgを作る"""
+    media_dir.mkdir()
+    deck = genanki.Deck(stable_deck_id(path.stem), path.stem)
+    media_paths = []
+    for thai, paiboon, english, audio, content in notes:
+        (media_dir / audio).write_bytes(content)
+        media_paths.append(str(media_dir / audio))
+        deck.add_note(genanki.Note(thai_vocab_model(), [thai, paiboon, english, f"[sound:{audio}]"],
+                                   guid=note_guid(thai)))
+    return write_apkg(deck, path, media_paths)
+
+def _read_deck(path):
+    with zipfile.ZipFile(path) as z:
+        media = {name: z.read(entry) for entry, name in read_apkg_media_map(z).items()}
+        conn = open_apkg_collection(z)
+        try:
+            notes = list(iter_apkg_notes(conn))
+        finally:
+            conn.close()
+    return notes, media
+
+def test_merge_dedupes_notes_across_decks(tmp_path):
+    a = _write_deck(tmp_path / "a.apkg", [
+        ("ขอบคุณ", "khòp khun", "thank you", "khop.mp3", b"khop"),
+        ("ขอโทษ", "khǎw thôot", "sorry", "khaw.mp3", b"khaw"),
+    ], tmp_path / "media_a")
+    b = _write_deck(tmp_path / "b.apkg", [
+        # 表記揺れだけが違う同じ語
+        ("ขอบ คุณ", "Khòp khun", "thanks", "khop2.mp3", b"khop"),
+        # 同じタイ語でPaiboonが違う（GUIDが衝突するので先勝ち）
+        ("ขอโทษ", "khɔ̌ɔ thôot", "excuse me", "khaw2.mp3", b"khaw2"),
+        ("ไม่เป็นไร", "mây pen ray", "never mind", "mai.mp3", b"mai"),
+    ], tmp_path / "media_b")
+
+    out = merge_decks([a, b], "Master", tmp_path / "master.apkg")
+    notes, media = _read_deck(out)
+    assert [fields[0] for _, fields in notes] == ["ขอบคุณ", "ขอโทษ", "ไม่เป็นไร"]
+    assert [guid for guid, _ in notes] == [note_guid(fields[0]) for _, fields in notes]
+    assert [fields[2] for _, fields in notes] == ["thank you", "sorry", "never mind"]
+    assert media == {"khop.mp3": b"khop", "khaw.mp3": b"khaw", "mai.mp3": b"mai"}
+
+def test_merge_renames_media_with_the_same_name_and_different_content(tmp_path):
+    a = _write_deck(tmp_path / "a.apkg", [("ขอบคุณ", "khòp khun", "thank you", "audio.mp3", b"khop")],
+                    tmp_path / "media_a")
+    b = _write_deck(tmp_path / "b.apkg", [("ขอโทษ", "khǎw thôot", "sorry", "audio.mp3", b"khaw")],
+                    tmp_path / "media_b")
+
+    notes, media = _read_deck(merge_decks([a, b], "Master", tmp_path / "master.apkg"))
+    assert len(media) == 2 and media["audio.mp3"] == b"khop"
+    renamed = notes[1][1][3][len("[sound:"):-1]
+    assert renamed != "audio.mp3" and renamed.startswith("audio_") and renamed.endswith(".mp3")
+    assert media[renamed] == b"khaw"
+
+def test_media_store_reuses_identical_content(tmp_path):
+    store = MediaStore(tmp_path)
+    assert store.add("a.mp3", lambda: io.BytesIO(b"same")) == "a.mp3"
+    assert store.add("b.mp3", lambda: io.BytesIO(b"same")) == "a.mp3"
+    assert store.bytes_deduped == 4
+    assert store.paths == [str(tmp_path / "a.mp3")]
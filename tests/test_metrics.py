@@ -0,0 +1,70 @@
+import pytest
+
+from src.common.metrics import Histogram, Metrics
+
+def test_histogram_quantile_uses_bucket_bounds():
+    hist = Histogram(buckets=(0.1, 0.5, 1.0))
+    assert hist.quantile(0.5) is None
+    for value in (0.05, 0.1, 0.3, 0.4, 0.9, 2.0):
+        hist.observe(value)
+    # 境界と同じ値はそのバケットに入る（le）
+    assert hist.counts == [2, 2, 1, 1]
+    assert hist.quantile(0.3) == 0.1
+    assert hist.quantile(0.5) == 0.5
+    assert hist.quantile(0.8) == 1.0
+    # 最後のバケット（+Inf）は観測した最大値
+    assert hist.quantile(1.0) == 2.0
+    assert (hist.min, hist.max, hist.count) == (0.05, 2.0, 6)
+    assert hist.to_dict()["buckets"] == {"0.1": 2, "0.5": 2, "1.0": 1, "+Inf": 1}
+
+def test_summary_reports_cache_hit_rate():
+    metrics = Metrics()
+    for hit in (True, True, False, True):
+        metrics.cache("translation", hit)
+    metrics.cache("ocr", False)
+    caches = metrics.summary()["caches"]
+    assert caches["translation"] == {"hit": 3, "miss": 1, "hit_rate": 0.75}
+    assert caches["ocr"] == {"hit": 0, "miss": 1, "hit_rate": 0.0}
+
+def test_track_api_counts_errors_and_tokens():
+    metrics = Metrics()
+
+    class Response:
+        class usage:
+            prompt_tokens = 120
+            completion_tokens = 30
+
+    with metrics.track_api("openai_vision", bytes_sent=2048) as call:
+        call.usage(Response())
+    with pytest.raises(RuntimeError):
+        with metrics.track_api("openai_vision"):
+            raise RuntimeError("rate limited")
+    counters = metrics.summary()["counters"]
+    assert counters["api_requests_total{service=openai_vision,status=ok}"] == 1
+    assert counters["api_requests_total{service=openai_vision,status=error}"] == 1
+    assert counters["api_prompt_tokens_total{service=openai_vision}"] == 120
+    assert counters["api_bytes_sent_total{service=openai_vision}"] == 2048
+    assert metrics.summary()["histograms"]["api_latency_seconds{service=openai_vision}"]["count"] == 2
+
+def test_prometheus_output_has_cumulative_buckets(tmp_path):
+    metrics = Metrics()
+    metrics.incr("ocr_bands_total", 3)
+    for value in (0.07, 0.2, 0.2, 120.0):
+        metrics.observe("stage_seconds", value, stage="ocr")
+    path = metrics.write_prometheus(tmp_path / "metrics" / "anki_ocr.prom")
+    assert not (tmp_path / "metrics" / "anki_ocr.prom.part").exists()
+    lines = path.read_text(encoding="utf-8").splitlines()
+
+    assert "# TYPE anki_ocr_ocr_bands_total counter" in lines
+    assert "anki_ocr_ocr_bands_total 3" in lines
+    assert lines.count("# TYPE anki_ocr_stage_seconds histogram") == 1
+    buckets = [line for line in lines if line.startswith("anki_ocr_stage_seconds_bucket")]
+    assert buckets[0] == 'anki_ocr_stage_seconds_bucket{stage="ocr",le="0.05"} 0'
+    assert 'anki_ocr_stage_seconds_bucket{stage="ocr",le="0.1"} 1' in buckets
+    assert 'anki_ocr_stage_seconds_bucket{stage="ocr",le="0.25"} 3' in buckets
+    assert 'anki_ocr_stage_seconds_bucket{stage="ocr",le="60.0"} 3' in buckets
+    assert buckets[-1] == 'anki_ocr_stage_seconds_bucket{stage="ocr",le="+Inf"} 4'
+    counts = [int(line.rsplit(" ", 1)[1]) for line in buckets]
+    assert counts == sorted(counts)
+    assert 'anki_ocr_stage_seconds_count{stage="ocr"} 4' in lines
+    assert 'anki_ocr_stage_seconds_sum{stage="ocr"} 120.47' in lines
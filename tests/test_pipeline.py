@@ -0,0 +1,51 @@
+import random
+import time
+
+import pytest
+
+from src.common.pipeline import Pipeline, Stage
+
+def _jitter(value):
+    time.sleep(random.random() * 0.005)
+    return value
+
+def test_results_come_back_in_input_order():
+    stages = [Stage("double", lambda x: _jitter(x * 2), workers=4),
+              Stage("inc", lambda x: _jitter(x + 1), workers=3)]
+    assert Pipeline(stages).run(range(50)) == [x * 2 + 1 for x in range(50)]
+
+def test_none_drops_and_flatten_expands():
+    stages = [Stage("split", lambda x: [f"{x}a", f"{x}b"] if x % 2 else [], workers=2, flatten=True),
+              Stage("drop", lambda s: None if s.endswith("b") else s.upper())]
+    pipeline = Pipeline(stages)
+    assert pipeline.run(range(6)) == ["1A", "3A", "5A"]
+    assert stages[0].processed == 6 and stages[0].emitted == 6 and stages[0].dropped == 3
+    assert stages[1].dropped == 3
+
+def test_errors_drop_only_the_failing_item():
+    def boom(x):
+        if x == 3:
+            raise ValueError("boom")
+        return x
+    stages = [Stage("boom", boom, workers=2)]
+    assert Pipeline(stages).run(range(5)) == [0, 1, 2, 4]
+    assert stages[0].errors == 1
+
+def test_ordered_stage_sees_items_in_input_order():
+    # 上流が並列でも、ordered=Trueの段には入力順（破棄・展開を含む）で届く
+    seen = []
+    stages = [Stage("split", lambda x: _jitter([x * 10 + i for i in range(x % 3)]), workers=4, flatten=True),
+              Stage("filter", lambda v: None if v % 4 == 0 else _jitter(v), workers=3),
+              Stage("ordered", lambda v: seen.append(v) or v, ordered=True),
+              Stage("after", _jitter, workers=2)]
+    results = Pipeline(stages).run(range(100))
+    expected = [x * 10 + i for x in range(100) for i in range(x % 3) if (x * 10 + i) % 4]
+    assert seen == expected
+    assert results == expected
+
+def test_source_errors_are_raised():
+    def source():
+        yield 1
+        raise RuntimeError("source failed")
+    with pytest.raises(RuntimeError, match="source failed"):
+        Pipeline([Stage("id", lambda x: x)]).run(source())
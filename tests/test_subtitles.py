@@ -0,0 +1,80 @@
+from src.common.subtitles import CueIndex, cue_to_triple, find_subtitles, load_cues, merge_tracks, parse_srv, parse_vtt
+
+VTT = """WEBVTT
+
+NOTE 字幕のテスト
+
+STYLE
+::cue { color: white }
+
+1
+00:00:01.000 --> 00:00:03.500 align:center
+<c.thai>ขอบคุณ</c>
+khòp khun
+
+00:01:02,250 --> 00:01:04.000
+ขอโทษ &amp; khǎw thôot
+
+00:00:05.000 --> 00:00:06.000
+
+"""
+
+def test_parse_vtt_skips_blocks_and_tags():
+    assert parse_vtt(VTT) == [
+        (1.0, 3.5, "ขอบคุณ\nkhòp khun"),
+        (62.25, 64.0, "ขอโทษ & khǎw thôot"),
+    ]
+
+def test_parse_srv_formats():
+    srv1 = '<transcript><text start="1.5" dur="2">ขอบคุณ\nkhòp khun</text></transcript>'
+    assert parse_srv(srv1) == [(1.5, 3.5, "ขอบคุณ\nkhòp khun")]
+    srv3 = '<timedtext><body><p t="1500" d="2000"><s>ขอบคุณ</s> | <s>khòp khun</s></p><p t="4000">\n</p></body></timedtext>'
+    assert parse_srv(srv3) == [(1.5, 3.5, "ขอบคุณ | khòp khun")]
+
+def test_load_cues_detects_the_format(tmp_path):
+    vtt = tmp_path / "video.th.txt"
+    vtt.write_text("\ufeffWEBVTT\n\n00:00:01.000 --> 00:00:02.000\nขอบคุณ\n", encoding="utf-8")
+    assert load_cues(vtt) == [(1.0, 2.0, "ขอบคุณ")]
+
+def test_cue_to_triple_lines_and_separators():
+    assert cue_to_triple("ขอบคุณ\nkhòp khun\nありがとう") == ("ありがとう", "ขอบคุณ", "khòp khun")
+    assert cue_to_triple("ありがとう / ขอบคุณ | khòp khun") == ("ありがとう", "ขอบคุณ", "khòp khun")
+    # Paiboon特有の文字だけで声調記号がなくてもよい
+    assert cue_to_triple("งาน\nŋaan") == ("", "งาน", "ŋaan")
+
+def test_cue_to_triple_does_not_take_english_as_paiboon():
+    assert cue_to_triple("ขอบคุณ\nThank you") is None
+    assert cue_to_triple("ขอบคุณ\nThank you\nkhòp khun") == ("Thank you", "ขอบคุณ", "khòp khun")
+    assert cue_to_triple("khòp khun\nありがとう") is None
+
+def test_merge_tracks_joins_cues_with_the_same_span():
+    thai = [(1.0, 3.0, "ขอบคุณ\nkhòp khun"), (5.0, 6.0, "ขอโทษ")]
+    japanese = [(1.02, 3.01, "ありがとう"), (8.0, 9.0, "こんにちは")]
+    assert merge_tracks([thai, japanese]) == [
+        (1.0, 3.0, "ขอบคุณ\nkhòp khun\nありがとう"),
+        (5.0, 6.0, "ขอโทษ"),
+        (8.0, 9.0, "こんにちは"),
+    ]
+
+def test_cue_index_covers_only_cues_with_vocabulary():
+    index = CueIndex([
+        (10.0, 12.0, "ขอบคุณ\nkhòp khun"),
+        (11.5, 14.0, "ขอโทษ\nkhǎw thôot"),
+        (20.0, 22.0, "Thank you"),
+        (30.0, 31.0, "ไม่เป็นไร\nmây pen ray"),
+    ])
+    assert len(index) == 3
+    assert [item["thai"] for item in index.items] == ["ขอบคุณ", "ขอโทษ", "ไม่เป็นไร"]
+    assert not index.covers(9.99)
+    assert index.covers(10.0) and index.covers(13.9)
+    assert not index.covers(14.0)
+    assert not index.covers(21.0)
+    assert index.covers(30.5) and not index.covers(31.0)
+    assert index.covered_seconds == 5.0
+
+def test_find_subtitles_next_to_the_video(tmp_path):
+    video = tmp_path / "abc.mp4"
+    video.write_bytes(b"")
+    for name in ("abc.th.vtt", "abc.ja.srv3", "abc.info.json", "other.th.vtt"):
+        (tmp_path / name).write_text("", encoding="utf-8")
+    assert find_subtitles(video) == [tmp_path / "abc.ja.srv3", tmp_path / "abc.th.vtt"]
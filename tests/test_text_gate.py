@@ -0,0 +1,36 @@
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+np = pytest.importorskip("numpy")
+
+from src.common.text_gate import TextGate, text_line_boxes
+
+def _frame(lines):
+    """白地に黒で、lines行の横書きテキストを描いた 640x480 のフレーム"""
+    frame = np.full((480, 640, 3), 255, np.uint8)
+    for n, text in enumerate(lines):
+        cv2.putText(frame, text, (40, 80 + n * 120), cv2.FONT_HERSHEY_SIMPLEX, 1.4, (0, 0, 0), 3)
+    return frame
+
+def _gray(frame):
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+def test_blank_frame_has_no_text_lines():
+    assert text_line_boxes(_gray(_frame([]))) == []
+
+def test_each_line_of_text_is_one_box():
+    assert len(text_line_boxes(_gray(_frame(["khop khun kha"])))) == 1
+    boxes = text_line_boxes(_gray(_frame(["khop khun kha", "thank you", "arigatou"])))
+    assert len(boxes) == 3
+    assert sorted(y for _, y, _, _ in boxes) == sorted({y for _, y, _, _ in boxes})
+
+def test_gate_drops_frames_with_too_few_lines():
+    gate = TextGate(min_lines=2)
+    assert not gate.passes(_frame([]))
+    assert not gate.passes(_frame(["khop khun kha"]))
+    assert gate.passes(_frame(["khop khun kha", "thank you", "arigatou"]))
+    assert (gate.checked, gate.skipped) == (3, 2)
+
+def test_large_frames_are_scaled_down_before_counting():
+    frame = cv2.resize(_frame(["khop khun kha", "thank you"]), (1920, 1440))
+    assert TextGate(min_lines=2).count_lines(frame) == 2
@@ -0,0 +1,44 @@
+import unicodedata
+
+from src.common.tiling import header_height, plan_bands, stitch_band_rows
+
+def test_short_image_is_one_band():
+    assert plan_bands(900, [300, 600], max_height=1200) == [(0, 900)]
+
+def test_bands_end_at_the_last_cut_within_the_limit():
+    assert plan_bands(3000, [500, 1100, 1300, 2000, 2300], max_height=1200) == [
+        (0, 1100), (1100, 2300), (2300, 3000)
+    ]
+
+def test_cuts_too_close_to_the_top_are_ignored():
+    # 帯の上端から max_height/3 以内の切れ目では切らない
+    bands = plan_bands(2500, [300, 2000], max_height=1200, overlap=80)
+    assert bands == [(0, 1200), (1120, 2000), (2000, 2500)]
+
+def test_fixed_cuts_overlap_the_next_band():
+    bands = plan_bands(2600, [], max_height=1000, overlap=100)
+    assert bands == [(0, 1000), (900, 1900), (1800, 2600)]
+    assert all(bottom - top <= 1000 for top, bottom in bands)
+
+def test_stitch_drops_rows_repeated_in_the_overlap():
+    nfd = unicodedata.normalize("NFD", "khòp khun")
+    bands = [
+        [("thank you", "ขอบคุณ", "khòp khun"), ("sorry", "ขอโทษ", "khǎw thôot")],
+        # 重なり部分の行（表記揺れは同じ行とみなす）
+        [("thank you", "ขอบ คุณ", nfd), ("never mind", "ไม่เป็นไร", "mây pen ray")],
+        # 隣り合わない帯の同じ語は残す
+        [("sorry", "ขอโทษ", "khǎw thôot")],
+    ]
+    rows, removed = stitch_band_rows(bands)
+    assert [row[1] for row in rows] == ["ขอบคุณ", "ขอโทษ", "ไม่เป็นไร", "ขอโทษ"]
+    assert removed == 1
+
+def test_header_is_the_first_row_when_short_enough():
+    assert header_height([150, 400, 700], max_height=1200) == 150
+    # 最初の切れ目が遠い（見出しらしくない）場合や切れ目がない場合は付けない
+    assert header_height([500, 900], max_height=1200) == 0
+    assert header_height([], max_height=1200) == 0
+
+def test_stitch_treats_paiboon_variants_in_the_overlap_as_the_same_row():
+    bands = [[("water", "น้ำ", "náam")], [("water", "น้ำ", "NÁAM")]]
+    assert stitch_band_rows(bands) == ([("water", "น้ำ", "náam")], 1)
@@ -0,0 +1,45 @@
+import json
+import zipfile
+
+import pytest
+
+genanki = pytest.importorskip("genanki")
+
+from src.common.apkg import UnsupportedApkgError, note_guid, stable_deck_id, thai_vocab_model, write_apkg
+from src.common.verify import select_notes, verify_apkg
+
+def _write_deck(path, media_dir, notes, audio=("khop.mp3",)):
+    media_dir.mkdir()
+    for name in audio:
+        (media_dir / name).write_bytes(b"audio " + name.encode("utf-8"))
+    deck = genanki.Deck(stable_deck_id("Verify"), "Verify")
+    for thai, paiboon, sound in notes:
+        deck.add_note(genanki.Note(thai_vocab_model(), [thai, paiboon, "", f"[sound:{sound}]"], guid=note_guid(thai)))
+    return write_apkg(deck, path, [str(media_dir / name) for name in audio])
+
+def test_generated_package_is_consistent(tmp_path):
+    apkg = _write_deck(tmp_path / "deck.apkg", tmp_path / "media", [("ขอบคุณ", "khòp khun", "khop.mp3")])
+    report = verify_apkg(apkg)
+    assert report["ok"]
+    assert (report["notes"], report["media"]) == (1, 1)
+    assert report["media_sha1"].keys() == {"khop.mp3"}
+    assert select_notes(apkg, match="khòp") == [(note_guid("ขอบคุณ"), ["ขอบคุณ", "khòp khun", "", "[sound:khop.mp3]"])]
+
+def test_missing_and_unreferenced_media_are_reported(tmp_path):
+    apkg = _write_deck(tmp_path / "deck.apkg", tmp_path / "media", [("ขอบคุณ", "khòp khun", "gone.mp3")],
+                       audio=("khop.mp3",))
+    report = verify_apkg(apkg, hash_media=False)
+    assert not report["ok"]
+    assert report["missing_media"] == ["gone.mp3"]
+    assert report["unreferenced_media"] == ["khop.mp3"]
+
+def test_anki21b_packages_are_rejected(tmp_path):
+    legacy = _write_deck(tmp_path / "legacy.apkg", tmp_path / "media", [("ขอบคุณ", "khòp khun", "khop.mp3")])
+    # 新形式: zstd圧縮のcollection.anki21bと、互換用の殻のcollection.anki2
+    apkg = tmp_path / "new.apkg"
+    with zipfile.ZipFile(legacy) as src, zipfile.ZipFile(apkg, "w") as z:
+        z.writestr("collection.anki2", src.read("collection.anki2"))
+        z.writestr("collection.anki21b", b"\x28\xb5\x2f\xfd")
+        z.writestr("media", json.dumps({}))
+    with pytest.raises(UnsupportedApkgError, match="anki21b"):
+        verify_apkg(apkg)
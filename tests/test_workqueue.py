@@ -0,0 +1,93 @@
+import multiprocessing
+import time
+
+from src.common.workqueue import WorkQueue
+from src.deck_builders.worker import QueueWorker, frame_item_id
+
+def _frame_items(job_id, count):
+    return [(frame_item_id(n), {"frame": f"{job_id}/frames/frame_{n:04d}.jpg"}) for n in range(count)]
+
+class EchoWorker(QueueWorker):
+    """OCR〜TTSの代わりにペイロードをそのまま結果にするワーカー（キューの動作確認用）"""
+
+    def _process_item(self, job_id, payload):
+        return {"note": {"Thai": payload["frame"]}, "audio": "", "worker": self.worker_id}
+
+    def _finalize(self, job_id, deck_name, config):
+        results = self.queue.results(job_id)
+        self.queue.finish_job(self.worker_id, job_id, f"{deck_name}:{len(results)}")
+        self.finalized += 1
+
+def _run_echo_worker(queue_path, worker_id):
+    EchoWorker(queue_path, worker_id=worker_id, threads=2, poll_interval=0.05).run()
+
+def test_claim_complete_and_finalize(tmp_path):
+    queue = WorkQueue(tmp_path / "queue.sqlite")
+    assert queue.add_job("job1", "Deck", {"output_dir": "out"}, _frame_items("job1", 3)) == 3
+    assert queue.job_config("job1") == ("Deck", {"output_dir": "out"})
+
+    claimed = queue.claim("w1", limit=10)
+    assert [item_id for _, item_id, _ in claimed] == ["00000000", "00000001", "00000002"]
+    assert claimed[0][2] == {"frame": "job1/frames/frame_0000.jpg"}
+    # 全アイテムが終わるまではパッケージ化できない
+    assert queue.claim_finalize("w1") is None
+    for job_id, item_id, payload in reversed(claimed):
+        assert queue.complete("w1", job_id, item_id, payload)
+
+    assert queue.claim_finalize("w1") == ("job1", "Deck", {"output_dir": "out"})
+    assert queue.claim_finalize("w2") is None
+    # 結果は完了順ではなくアイテムID順
+    assert [r["frame"] for r in queue.results("job1")] == [f"job1/frames/frame_{n:04d}.jpg" for n in range(3)]
+    queue.finish_job("w1", "job1", "out/Deck.apkg")
+    assert not queue.has_open_work()
+    assert queue.status()[0]["status"] == "done"
+    queue.close()
+
+def test_expired_lease_is_reclaimed_by_another_worker(tmp_path):
+    queue = WorkQueue(tmp_path / "queue.sqlite")
+    queue.add_job("job1", "Deck", {}, _frame_items("job1", 1))
+    assert queue.claim("w1", lease_seconds=0.01)
+    time.sleep(0.05)
+    claimed = queue.claim("w2")
+    assert [(job_id, item_id) for job_id, item_id, _ in claimed] == [("job1", "00000000")]
+    # リースを失ったワーカーの結果は記録されない
+    assert not queue.complete("w1", "job1", "00000000", {"late": True})
+    assert queue.complete("w2", "job1", "00000000", {"ok": True})
+    assert queue.results("job1") == [{"ok": True}]
+    queue.close()
+
+def test_failed_item_is_retried_until_max_attempts(tmp_path):
+    queue = WorkQueue(tmp_path / "queue.sqlite")
+    queue.add_job("job1", "Deck", {}, _frame_items("job1", 1))
+    for _ in range(2):
+        assert queue.claim("w1", max_attempts=2)
+        queue.fail("w1", "job1", "00000000", "boom", max_attempts=2)
+    assert queue.claim("w1", max_attempts=2) == []
+    assert queue.status()[0]["items"] == {"failed": 1}
+    # 失敗したアイテムがあってもジョブはパッケージ化に進む
+    assert queue.claim_finalize("w1") is not None
+    queue.close()
+
+def test_several_local_worker_processes_share_one_queue(tmp_path):
+    queue_path = tmp_path / "queue.sqlite"
+    queue = WorkQueue(queue_path)
+    queue.add_job("job1", "Deck A", {}, _frame_items("job1", 40))
+    queue.add_job("job2", "Deck B", {}, _frame_items("job2", 25))
+    queue.close()
+
+    procs = [multiprocessing.Process(target=_run_echo_worker, args=(queue_path, f"w{n}")) for n in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(timeout=120)
+        assert p.exitcode == 0
+
+    queue = WorkQueue(queue_path)
+    status = {job["job_id"]: job for job in queue.status()}
+    assert status["job1"]["status"] == "done" and status["job1"]["output"] == "Deck A:40"
+    assert status["job2"]["status"] == "done" and status["job2"]["output"] == "Deck B:25"
+    assert status["job1"]["items"] == {"done": 40}
+    # 各フレームがちょうど1回ずつ処理されている
+    frames = [r["note"]["Thai"] for r in queue.results("job1")]
+    assert frames == [f"job1/frames/frame_{n:04d}.jpg" for n in range(40)]
+    queue.close()